@@ -4,6 +4,7 @@ from bson import ObjectId
 from fastapi import Depends, HTTPException, status
 from fastapi.routing import APIRouter
 from fastapi.security import OAuth2PasswordRequestForm
+from pymongo.errors import DuplicateKeyError
 from config import ACCESS_TOKEN_EXPIRE
 from .dependencies import authenticate_user, create_access_token, create_user, get_user, hash_password
 from auth.models import Token, Users
@@ -25,7 +26,7 @@ async def sign_in(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) ->
         Token: The access token to use for further requests
     """
     
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -38,7 +39,10 @@ async def sign_in(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) ->
         data = {
             "sub": user.username,
             "email": user.email,
-            "id": str(user.id)
+            "id": str(user.id),
+            # lets stateless auth (STATELESS_AUTH) skip the user lookup
+            "is_active": user.is_active,
+            "role": user.role
         },
         expires_delta=access_token_expires
     )
@@ -54,7 +58,7 @@ async def sign_up(user: Signup) -> SignupResponse:
         User: The newly created user details.
     """
     # check if user already exists
-    already_exists = get_user(user.email)
+    already_exists = await get_user(user.email)
 
     if already_exists:
         raise HTTPException(
@@ -63,7 +67,7 @@ async def sign_up(user: Signup) -> SignupResponse:
         )
 
     # hash password
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
 
     # new user
     new_user = Users(
@@ -78,6 +82,13 @@ async def sign_up(user: Signup) -> SignupResponse:
         is_active=True,
     )
     
-    created_user = create_user(new_user)
+    try:
+        created_user = await create_user(new_user)
+    except DuplicateKeyError:
+        # a concurrent sign-up with the same email got past the check first
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User already exists"
+        )
 
     return created_user
\ No newline at end of file
@@ -1,40 +1,173 @@
-from config import mongodb_connection_string
-from pymongo.mongo_client import MongoClient
+import time
+from config import mongodb_connection_string, REDIS_HOST, REDIS_PORT, REDIS_PASSWORD
+from redis.asyncio import Redis
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.server_api import ServerApi
 from pymongo.errors import CollectionInvalid
+from pymongo.monitoring import CommandFailedEvent, CommandListener, CommandStartedEvent, CommandSucceededEvent
+from metrics import Counter, Histogram
+from timing import record
+from .indexes import reconcile_indexes
 
 
-client: MongoClient = MongoClient(mongodb_connection_string, server_api=ServerApi('1'))
+# async driver: every query is awaited so mongo round trips never block the event loop.
+# Created on first use, so importing the app needs no database (or DNS, for mongodb+srv).
+client: AsyncMongoClient | None = None
 
 
 
 # --------------------------------------------- redis connection ---------------------------------------------
-# REDIS_HOST = get_settings().redis_host
-# REDIS_PORT = get_settings().redis_port
-# REDIS_PASSWORD = get_settings().redis_password
-# REDIS_EXPIRE = timedelta(minutes=5)  # Cache expiration time
+redis_client: Redis | None = None
+redis_retry_at: float = 0.0
+REDIS_RETRY_AFTER = 30  # seconds to skip redis after a connection error
 
-# Initialize Redis client
-# def get_redis_client():
-#     try:
-#         # production cache
-#         # redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True, username="default", password=REDIS_PASSWORD)
 
-#         # local cache
-#         redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+def get_redis_client() -> Redis | None:
+    """
+    Return the shared async Redis client.
+
+    Returns None when Redis is not configured or failed recently, so callers
+    can fall back to their in-process state (caching is disabled, not broken).
+    """
+    global redis_client
+
+    if not REDIS_HOST or time.monotonic() < redis_retry_at:
+        return None
+
+    if redis_client is None:
+        redis_client = Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD or None,
+            decode_responses=True,
+            socket_timeout=1,
+            socket_connect_timeout=1,
+        )
+
+    return redis_client
+
+
+def mark_redis_unavailable(e: Exception) -> None:
+    global redis_retry_at
 
-#         redis_client.ping()  # Check connection
-#         print("Connected to Redis")
-#     except redis.exceptions.ConnectionError as e:
-#         print(f"Error connecting to Redis: {e}")
-#         redis_client = None  # Disable caching if Redis is not available
-    
-#     yield redis_client
+    print(f"Error connecting to Redis: {e}")
+    redis_retry_at = time.monotonic() + REDIS_RETRY_AFTER
+
+
+async def close_redis_client() -> None:
+    global redis_client
+
+    if redis_client:
+        await redis_client.aclose()
+        redis_client = None
 
 
 
 # --------------------------------------------- mongo connection ---------------------------------------------
-def get_db():
+DATABASE_NAME = 'vit'
+
+collection_names = [
+    'users',
+    'chats',
+    'messages',
+    'summaries',
+    'faqs',
+    'error_logs',
+]
+
+
+# ----------------------- COMMAND METRICS -----------------------
+mongo_command_seconds = Histogram(
+    "bizzbot_mongo_command_duration_seconds", "MongoDB command round trips", ("collection", "command"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+mongo_command_failures = Counter(
+    "bizzbot_mongo_command_failures_total", "MongoDB commands that failed", ("collection", "command"))
+
+
+class CommandMetrics(CommandListener):
+    """
+    Times every command the client sends, per collection and command name.
+    """
+
+    def __init__(self):
+        # the collection is only on the started event, keyed until the command finishes
+        self.collections: dict[tuple, str] = {}
+
+    def started(self, event: CommandStartedEvent) -> None:
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self.collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finished(self, event: CommandSucceededEvent | CommandFailedEvent) -> str:
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+        # the request that sent it, if any, see timing.py
+        record("mongo", event.duration_micros / 1e6)
+        return collection
+
+    def succeeded(self, event: CommandSucceededEvent) -> None:
+        self._finished(event)
+
+    def failed(self, event: CommandFailedEvent) -> None:
+        collection = self._finished(event)
+        mongo_command_failures.inc(collection=collection, command=event.command_name)
+
+
+def get_client() -> AsyncMongoClient:
+    """
+    Return the shared async Mongo client, creating it on first use.
+    """
+    global client
+
+    if client is None:
+        client = AsyncMongoClient(
+            mongodb_connection_string, server_api=ServerApi('1'), event_listeners=[CommandMetrics()])
+
+    return client
+
+
+def get_database() -> AsyncDatabase:
+    return get_client()[DATABASE_NAME]
+
+
+async def close_mongo_client() -> None:
+    global client
+
+    if client:
+        await client.close()
+        client = None
+
+
+class _LazyCollection:
+    """
+    Stands in for a collection until it is first used, so modules can import collections
+    at the top without creating the client at import time.
+    """
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        # only collection methods, not the lookups of copy, pickle or mock.patch, which
+        # would otherwise create the client
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(get_database()[self._name], attr)
+
+    def __repr__(self) -> str:
+        return f"_LazyCollection({self._name!r})"
+
+
+users_collection: AsyncCollection = _LazyCollection('users')
+chats_collection: AsyncCollection = _LazyCollection('chats')
+messages_collection: AsyncCollection = _LazyCollection('messages')
+summaries_collection: AsyncCollection = _LazyCollection('summaries')
+faqs_collection: AsyncCollection = _LazyCollection('faqs')
+error_logs_collection: AsyncCollection = _LazyCollection('error_logs')
+
+
+async def get_db() -> AsyncDatabase:
     """
     Establishes a connection to VIT MongoDB database.
 
@@ -43,44 +176,32 @@ def get_db():
     pinging it, and raises an exception if the connection fails.
 
     Returns:
-        Database: The 'VIT' MongoDB database instance.
+        AsyncDatabase: The 'VIT' MongoDB database instance.
 
     Raises:
         Exception: If there is an error connecting to MongoDB.
     """
     try:
         # ping the server to check connectivity
-        client.server_info()
-        client.admin.command('ping')
+        await get_client().admin.command('ping')
         print("\nPinged your deployment. You successfully connected to MongoDB!")
-        db = client['vit']
-        return db
+        return get_database()
     except Exception as e:
         print(f"Error connecting to MongoDB: {e}")
         raise e
 
 
-db = get_db()
+async def init_db() -> None:
+    """
+    Check connectivity, create any missing collections and reconcile indexes. Called from the app lifespan.
+    """
+    db = await get_db()
 
-collection_names = [
-    'users',
-    'chats',
-    'messages',
-    'summaries',
-    'faqs',
-    'error_logs',
-]
+    for collection_name in collection_names:
+        try:
+            await db.create_collection(collection_name, check_exists=True,)
+            print(f"{collection_name}'s collection created")
+        except CollectionInvalid:
+            print(f"{collection_name}'s collection already exists")
 
-for collection_name in collection_names:
-    try:
-        db.create_collection(collection_name, check_exists=True,)
-        print(f"{collection_name}'s collection created")
-    except CollectionInvalid:
-        print(f"{collection_name}'s collection already exists")
-
-users_collection = db['users']
-chats_collection = db['chats']
-messages_collection = db['messages']
-summaries_collection = db['summaries']
-faqs_collection = db['faqs']
-error_logs_collection = db['error_logs']
\ No newline at end of file
+    await reconcile_indexes(db)
@@ -3,34 +3,48 @@ from datetime import datetime, timezone
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 import jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from auth.schemas import GetUserResponse, SignupResponse
-from config import SECRET_KEY, ALGORITHM
+from auth.schemas import CachedUser, GetUserResponse, SignupResponse
+from cache import TwoTierCache
+from timing import span, start_profiler
+from pymongo import ReturnDocument
+from config import SECRET_KEY, ALGORITHM, REDIS_EXPIRE, USER_CACHE_MAX_SIZE, USER_CACHE_LOCAL_TTL, STATELESS_AUTH
 from .db_connection import users_collection
-from .models import TokenData, Users
+from .models import Users
+from .password_pool import hash_password_async, verify_and_update_password
+from .tokens import decode_token, is_revoked, revoke_user
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
 
+# authenticated user lookups, keyed by email (the users collection lookup key)
+user_cache = TwoTierCache(
+    namespace="user",
+    maxsize=USER_CACHE_MAX_SIZE,
+    local_ttl=USER_CACHE_LOCAL_TTL,
+    redis_ttl=REDIS_EXPIRE,
+    dumps=lambda user: user.model_dump_json(),
+    loads=CachedUser.model_validate_json,
+)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password(plain_password, hashed_password):
+    valid, _ = await verify_and_update_password(plain_password, hashed_password)
+    return valid
 
-def hash_password(password):
-    return pwd_context.hash(password)
 
+async def hash_password(password):
+    return await hash_password_async(password)
 
-def get_user(email: str) -> None | GetUserResponse:
+
+async def get_user(email: str) -> None | GetUserResponse:
     """
     Retrieve a user from the database by email.
 
     :param email: The email address of the user to retrieve.
     :return: The user as a dictionary, or None if the user does not exist.
     """
-    user: dict = users_collection.find_one({"email": email})
+    user: dict = await users_collection.find_one({"email": email})
 
     if not user:
         return None
@@ -42,24 +56,58 @@ def get_user(email: str) -> None | GetUserResponse:
         full_name=user["full_name"],
         phone_number=user.get("phone_number"),
         is_active=user["is_active"],
+        role=user.get("role", "user"),
         hashed_password=user["hashed_password"]
     )
 
     return user_in_db
 
 
-def authenticate_user(email: str, password: str):
+async def get_cached_user(email: str) -> None | CachedUser:
+    """
+    Retrieve a user through the user cache, falling back to the database on a miss.
+
+    :param email: The email address of the user to retrieve.
+    :return: What authentication needs of the user, or None if the user does not exist.
+    """
+    user = await user_cache.get(email)
+
+    if user is None:
+        user_in_db = await get_user(email)
+        if user_in_db:
+            user = CachedUser(
+                id=user_in_db.id,
+                email=user_in_db.email,
+                is_active=user_in_db.is_active,
+                role=user_in_db.role
+            )
+            await user_cache.set(email, user)
+
+    return user
+
+
+async def invalidate_user(email: str) -> None:
+    await user_cache.delete(email)
+
+
+async def authenticate_user(email: str, password: str):
     """
     Authenticate a user by email and password. Return the user if
     authentication is successful, and False otherwise.
     """
-    user = get_user(email)
+    user = await get_user(email)
 
     if not user:
         return False
     
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+
+    # transparently upgrade hashes made with an outdated bcrypt cost factor
+    if new_hash:
+        await update_user_password(user.email, new_hash)
+        user.hashed_password = new_hash
     
     return user
 
@@ -79,39 +127,69 @@ def create_access_token(data: dict, expires_delta: timedelta | None = timedelta(
     return encoded_jwt
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+async def authenticate_token(token: str) -> tuple[str, str]:
+    """
+    Resolve a bearer token to the user it was issued to.
+
+    :return: The user's id and role.
+
+    Raises:
+        HTTPException: 401 if the token is invalid or the user is gone or deactivated.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload: dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        email = payload.get("email")
-        id = payload.get("id")
+    with span("auth"):
+        try:
+            # verified tokens are cached until they expire
+            token_data = decode_token(token)
+        except jwt.InvalidTokenError:
+            raise credentials_exception
 
-        if email is None:
+        if token_data.email is None:
             raise credentials_exception
-        token_data = TokenData(
-            username=username,
-            email=email,
-            id=id
-        )
-    except jwt.InvalidTokenError:
-        raise credentials_exception
 
-    user = get_user(email=token_data.email)
+        # stateless mode: the signed claims are enough unless the user was revoked since.
+        # Tokens issued before the is_active claim existed still go through the lookup.
+        if STATELESS_AUTH and token_data.id and token_data.is_active is not None:
+            if not token_data.is_active or await is_revoked(token_data.id):
+                raise credentials_exception
+            return token_data.id, token_data.role or "user"
 
-    if user is None:
+    with span("get_user"):
+        user = await get_cached_user(email=token_data.email)
+
+    if user is None or not user.is_active:
         raise credentials_exception
     
-    return user.id
+    return user.id, user.role
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    user_id, role = await authenticate_token(token)
+
+    # admins can ask for a profile of their request, see timing.PROFILE_HEADER
+    if role == "admin":
+        start_profiler()
+
+    return user_id
+
+
+async def get_current_admin(token: Annotated[str, Depends(oauth2_scheme)]) -> str:
+    user_id, role = await authenticate_token(token)
+
+    if role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only")
+
+    return user_id
 
 
 # insert new user
-def create_user(user: Users) -> SignupResponse:
-    new_user = users_collection.insert_one(user.model_dump())
+async def create_user(user: Users) -> SignupResponse:
+    new_user = await users_collection.insert_one(user.model_dump())
+    await invalidate_user(user.email)
 
     new_user_response = SignupResponse(
         message="User created successfully",
@@ -124,4 +202,41 @@ def create_user(user: Users) -> SignupResponse:
     return new_user_response
 
 
-    
\ No newline at end of file
+# update user's password hash
+async def update_user_password(email: str, hashed_password: str) -> bool:
+    updated_user = await users_collection.update_one(
+        {"email": email},
+        {
+            "$set": {
+                "hashed_password": hashed_password,
+                "updated_at": datetime.now()
+            }
+        },
+        upsert=False
+    )
+    await invalidate_user(email)
+
+    return updated_user.modified_count == 1
+
+
+# deactivate user
+async def deactivate_user(email: str) -> bool:
+    deactivated_user = await users_collection.find_one_and_update(
+        {"email": email, "is_active": {"$ne": False}},
+        {
+            "$set": {
+                "is_active": False,
+                "updated_at": datetime.now()
+            }
+        },
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
+        upsert=False
+    )
+    await invalidate_user(email)
+
+    if deactivated_user:
+        # tokens already issued say is_active=True
+        await revoke_user(str(deactivated_user["_id"]))
+
+    return deactivated_user is not None
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+from pymongo import ASCENDING, DESCENDING
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import OperationFailure
+
+
+# Index specs for every collection, reconciled at startup by init_db or by hand with:
+#     uv run python -m auth.indexes [--prune]
+#
+# collection -> [(index name, keys, options)]
+INDEX_SPECS: dict[str, list[tuple[str, list[tuple[str, int]], dict]]] = {
+    "users": [
+        # sign in and get_current_user look users up by email
+        ("users_email_unique", [("email", ASCENDING)], {"unique": True}),
+    ],
+    "chats": [
+        # topic de-duplication
+        ("chats_user_topic", [("user_id", ASCENDING), ("topic", ASCENDING)], {}),
+        # /my-chats, most recently updated first
+        ("chats_user_last_updated", [("user_id", ASCENDING), ("last_updated", DESCENDING), ("_id", DESCENDING)], {}),
+        # the chat reaper's queue of deleted chats
+        ("chats_deleted", [("deleted_at", ASCENDING)],
+         {"partialFilterExpression": {"deleted_at": {"$exists": True}}}),
+    ],
+    "messages": [
+        # a chat's messages in conversation order: seq ranges for windows and pagination
+        ("messages_chat_seq", [("chat_id", ASCENDING), ("seq", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"seq": {"$exists": True}}}),
+        # legacy chats are numbered in this order when backfilled
+        ("messages_chat_timestamp", [("chat_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], {}),
+    ],
+    "summaries": [
+        # a chat's latest summary
+        ("summaries_chat_created", [("chat_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        # one summary per window, whichever worker writes it first
+        ("summaries_chat_window", [("chat_id", ASCENDING), ("from_msg", ASCENDING)], {"unique": True}),
+    ],
+}
+
+
+def _matches(existing: dict, keys: list[tuple[str, int]], options: dict) -> bool:
+    return (
+        [(field, int(direction)) for field, direction in existing["key"]] == keys
+        and all(existing.get(option) == value for option, value in options.items())
+    )
+
+
+async def reconcile_indexes(db: AsyncDatabase, prune: bool = False) -> dict[str, list[str]]:
+    """
+    Make every collection's indexes match INDEX_SPECS.
+
+    Missing indexes are created. An index whose name or keys match a spec but whose
+    definition differs is dropped and recreated. With prune=True, indexes not in the
+    specs are dropped too (never _id_). Safe to run any number of times.
+
+    :return: The names of the indexes created, recreated and dropped.
+    """
+    report = {"created": [], "recreated": [], "dropped": [], "failed": []}
+
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        wanted = {name for name, _, _ in specs}
+
+        for name, keys, options in specs:
+            current = existing.get(name)
+            # same keys under another name would make create_index fail
+            same_keys = next(
+                (other for other, info in existing.items()
+                 if other not in (name, "_id_") and other not in wanted and _matches(info, keys, {})),
+                None
+            )
+
+            if current and _matches(current, keys, options):
+                continue
+
+            try:
+                if current:
+                    await collection.drop_index(name)
+                if same_keys:
+                    await collection.drop_index(same_keys)
+                    existing.pop(same_keys)
+                await collection.create_index(keys, name=name, **options)
+                report["recreated" if current or same_keys else "created"].append(f"{collection_name}.{name}")
+            except OperationFailure as e:
+                # e.g. duplicate emails blocking the unique index; the app still starts
+                print(f"Could not create index {collection_name}.{name}: {e}")
+                report["failed"].append(f"{collection_name}.{name}")
+
+        if prune:
+            for name in existing:
+                if name != "_id_" and name not in wanted:
+                    await collection.drop_index(name)
+                    report["dropped"].append(f"{collection_name}.{name}")
+
+    return report
+
+
+async def _main(prune: bool) -> None:
+    from .db_connection import get_database, close_mongo_client
+
+    report = await reconcile_indexes(get_database(), prune=prune)
+    await close_mongo_client()
+    for action, names in report.items():
+        print(f"{action}: {', '.join(names) if names else '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and reconcile MongoDB indexes.")
+    parser.add_argument("--prune", action="store_true", help="drop indexes that are not in INDEX_SPECS")
+    asyncio.run(_main(parser.parse_args().prune))
@@ -12,6 +12,8 @@ class TokenData(BaseModel):
     username: str | None = None
     email: str | None = None
     id: str | None = None
+    is_active: bool | None = None  # None for tokens issued before the claim was added
+    role: str | None = None
 
 
 class BusinessInformation(BaseModel):
@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+
+# min/max pinned to the configured cost so hashes made with any other cost are rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+password_executor: Executor | None = None
+pending_jobs = 0
+
+
+# module level functions so they can be pickled for the process pool
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# ----------------------- POOL LIFECYCLE -----------------------
+def get_password_executor() -> Executor:
+    global password_executor
+
+    if password_executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            password_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            # bcrypt releases the GIL, so threads hash in parallel
+            password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+    return password_executor
+
+
+def shutdown_password_executor() -> None:
+    global password_executor
+
+    if password_executor:
+        password_executor.shutdown(wait=False, cancel_futures=True)
+        password_executor = None
+
+
+# ----------------------- RUN PASSWORD JOBS -----------------------
+async def run_password_job(func, *args):
+    """
+    Run a bcrypt job on the password pool without blocking the event loop.
+
+    Raises:
+        HTTPException: 503 when PASSWORD_HASH_MAX_PENDING jobs are already queued or running.
+    """
+    global pending_jobs
+
+    if pending_jobs >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    pending_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_password_executor(), func, *args)
+    finally:
+        pending_jobs -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await run_password_job(_hash, password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verify a password and return a fresh hash when the stored one uses an outdated cost factor.
+
+    :return: (is_valid, new_hash or None)
+    """
+    return await run_password_job(_verify_and_update, plain_password, hashed_password)
@@ -24,4 +24,13 @@ class GetUserResponse(BaseModel):
     full_name: str
     phone_number: str | None = None
     is_active: bool
-    hashed_password: str
\ No newline at end of file
+    role: str = "user"
+    hashed_password: str
+
+
+# what authenticating a request needs; cached, so no password hash
+class CachedUser(BaseModel):
+    id: str
+    email: str
+    is_active: bool
+    role: str = "user"
\ No newline at end of file
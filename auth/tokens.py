@@ -0,0 +1,105 @@
+import hashlib
+import time
+import jwt
+from redis.exceptions import RedisError
+from cache import TTLCache
+from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE, TOKEN_CACHE_MAX_SIZE, REVOCATION_SYNC_INTERVAL
+from .db_connection import get_redis_client, mark_redis_unavailable
+from .models import TokenData
+
+
+# Verified tokens, keyed by the sha256 of the token so raw tokens aren't kept in memory.
+# An entry expires together with the token's `exp`, so a cache hit is always a valid token.
+token_cache = TTLCache(maxsize=TOKEN_CACHE_MAX_SIZE, ttl=ACCESS_TOKEN_EXPIRE * 60)
+token_stats = {"hits": 0, "misses": 0}
+
+# Users whose tokens stateless auth must reject, user id -> revoked until (unix time).
+# A revocation only has to outlive the tokens issued before it, so entries expire after
+# the token lifetime. Shared between workers through a Redis sorted set scored the same way.
+REDIS_REVOKED_KEY = "auth:revoked"
+
+revoked_users: dict[str, float] = {}
+revocations_synced_at: float = 0.0
+
+
+# ----------------------- DECODE -----------------------
+def decode_token(token: str) -> TokenData:
+    """
+    Verify a token and return its claims, from the token cache when it was verified before.
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or expired.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()
+
+    token_data = token_cache.get(key)
+    if token_data is not None:
+        token_stats["hits"] += 1
+        return token_data
+
+    token_stats["misses"] += 1
+    payload: dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    token_data = TokenData(
+        username=payload.get("sub"),
+        email=payload.get("email"),
+        id=payload.get("id"),
+        is_active=payload.get("is_active"),
+        role=payload.get("role")
+    )
+
+    expires_in = payload["exp"] - time.time() if "exp" in payload else None
+    token_cache.set(key, token_data, ttl=expires_in)
+
+    return token_data
+
+
+# ----------------------- REVOCATION -----------------------
+async def revoke_user(user_id: str) -> None:
+    """
+    Make stateless auth reject every token issued to the user so far.
+    """
+    now = time.time()
+    until = now + ACCESS_TOKEN_EXPIRE * 60
+    revoked_users[user_id] = until
+
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            await redis_client.zadd(REDIS_REVOKED_KEY, {user_id: until})
+            await redis_client.zremrangebyscore(REDIS_REVOKED_KEY, "-inf", now)
+        except RedisError as e:
+            mark_redis_unavailable(e)
+
+
+async def _sync_revocations() -> None:
+    global revocations_synced_at
+
+    if time.monotonic() - revocations_synced_at < REVOCATION_SYNC_INTERVAL:
+        return
+    revocations_synced_at = time.monotonic()
+
+    now = time.time()
+    for user_id in [user_id for user_id, until in revoked_users.items() if until <= now]:
+        del revoked_users[user_id]
+
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            revoked = await redis_client.zrangebyscore(REDIS_REVOKED_KEY, now, "+inf", withscores=True)
+        except RedisError as e:
+            mark_redis_unavailable(e)
+            return
+
+        for user_id, until in revoked:
+            revoked_users[user_id] = max(until, revoked_users.get(user_id, 0.0))
+
+
+async def is_revoked(user_id: str) -> bool:
+    """
+    Whether the user's tokens were revoked. Reads a local set refreshed from Redis at most
+    every REVOCATION_SYNC_INTERVAL seconds, so it usually costs no I/O at all.
+    """
+    await _sync_revocations()
+
+    until = revoked_users.get(user_id)
+    return until is not None and until > time.time()
@@ -0,0 +1,102 @@
+"""
+Writing chat turns: the chat update and one insert_one per message (as
+insert_existing_chats used to), against the chat update and one insert_many, with and
+without a transaction. Reports the latency of turns written one at a time and the
+throughput of turns written concurrently, one chat each.
+
+    python -m benchmarks.chat_turn_writes [--turns 500] [--concurrency 50]
+
+Needs MongoDB at MONGODB_CONNECTION_STRING, and a replica set for the transaction run;
+the chats are written to a `vit_benchmark` database, which is dropped afterwards.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from benchmarks.stub import benchmark_database, report
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.asynchronous.database import AsyncDatabase
+from bizzbot import dependencies
+from bizzbot.models import Chats, Message
+from bizzbot.schemas import ClientChat, MessageModel
+
+RESPONSE = MessageModel(role="assistant", content="To register a business, start with a name search. " * 10)
+
+
+async def make_chats(db: AsyncDatabase, count: int) -> list[Chats]:
+    now = datetime.now(timezone.utc)
+    chats = [
+        Chats(id=ObjectId(), user_id=ObjectId(), topic=f"Chat {n}", message_seq=0, created_at=now, last_updated=now)
+        for n in range(count)
+    ]
+    await db.chats.insert_many([chat.model_dump(by_alias=True) for chat in chats])
+    return chats
+
+
+def prompt_for(chat: Chats) -> ClientChat:
+    return ClientChat(chat_id=str(chat.id), role="user", content="How do I register a business?")
+
+
+async def separate_inserts(chat: Chats) -> None:
+    # the turn as it used to be stored: three round trips and no way to tell a partial write
+    prompt = prompt_for(chat)
+    updated = await dependencies.chats_collection.find_one_and_update(
+        {"_id": chat.id},
+        {"$inc": {"message_seq": 2}, "$set": {"last_updated": datetime.now(timezone.utc)}},
+        projection={"message_seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    for seq, message in ((updated["message_seq"] - 1, prompt), (updated["message_seq"], RESPONSE)):
+        await dependencies.messages_collection.insert_one(Message(
+            id=ObjectId(), chat_id=chat.id, seq=seq, role=message.role, content=message.content,
+            timestamp=datetime.now(timezone.utc)
+        ).model_dump(by_alias=True))
+
+
+async def insert_many(chat: Chats) -> None:
+    result = await dependencies.insert_existing_chats(prompt_for(chat), RESPONSE, chat)
+    assert result, result.errors
+
+
+async def measure(name: str, write_turn, db: AsyncDatabase, turns: int, concurrency: int) -> None:
+    chat = (await make_chats(db, 1))[0]
+    timings = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        await write_turn(chat)
+        timings.append(time.perf_counter() - started)
+    report(f"{name}, one at a time", timings)
+
+    chats = await make_chats(db, concurrency)
+    started = time.perf_counter()
+    for _ in range(turns // concurrency):
+        await asyncio.gather(*(write_turn(chat) for chat in chats))
+    elapsed = time.perf_counter() - started
+    print(f"{name + f', {concurrency} at once':<40} {turns // concurrency * concurrency / elapsed:8.0f} turns/s")
+
+
+async def run(turns: int, concurrency: int) -> None:
+    async with benchmark_database() as db:
+        if db is None:
+            return
+
+        dependencies.MONGO_TRANSACTIONS = False
+        await measure("insert_one per message", separate_inserts, db, turns, concurrency)
+        await measure("insert_many", insert_many, db, turns, concurrency)
+
+        if "setName" in await db.client.admin.command("hello"):
+            dependencies.MONGO_TRANSACTIONS = True
+            await measure("insert_many in a transaction", insert_many, db, turns, concurrency)
+        else:
+            print("Not a replica set, skipping the transaction run")
+
+    print(f"{turns} turns per run")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.concurrency))
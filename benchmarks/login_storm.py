@@ -0,0 +1,99 @@
+"""
+A burst of concurrent sign-ins with bcrypt run inline on the event loop (as sign_in used
+to) and on the password pool, while a probe requests GET /ready every 10 ms to show how long
+every other request on the worker waits.
+
+    python -m benchmarks.login_storm [--logins 40] [--rounds 12]
+
+The user lookup is stubbed out, so only the password work takes time. Logins the pool
+sheds with a 503 (more than PASSWORD_HASH_MAX_PENDING at once) are counted, not timed.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--logins", type=int, default=40, help="concurrent sign-ins in the storm")
+parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+args = parser.parse_args()
+os.environ.setdefault("BCRYPT_ROUNDS", str(args.rounds))
+
+from benchmarks.stub import report
+import httpx
+import main
+from auth import dependencies, password_pool
+from auth.schemas import GetUserResponse
+from config import PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS
+
+PASSWORD = "correct horse battery staple"
+PROBE_INTERVAL = 0.01
+HASHED_PASSWORD = password_pool.pwd_context.hash(PASSWORD)
+
+
+async def get_user(email: str) -> GetUserResponse:
+    return GetUserResponse(
+        id="000000000000000000000001", email=email, full_name="Ada", is_active=True, hashed_password=HASHED_PASSWORD)
+
+
+async def verify_inline(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    # the old sign_in: bcrypt on the event loop
+    return password_pool._verify_and_update(plain_password, hashed_password)
+
+
+async def sign_in(client: httpx.AsyncClient, n: int) -> float | None:
+    started = time.perf_counter()
+    response = await client.post("/api/v1/auth/signin", data={"username": f"user{n}@example.com", "password": PASSWORD})
+    if response.status_code == 503:
+        return None
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, timings: list[float]) -> None:
+    while not stop.is_set():
+        # timed from when the request was due, so time spent waiting for a blocked loop counts
+        due = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        (await client.get("/ready")).raise_for_status()
+        timings.append(time.perf_counter() - due)
+
+
+async def storm(name: str, client: httpx.AsyncClient, logins: int) -> None:
+    stop = asyncio.Event()
+    probe_timings: list[float] = []
+    prober = asyncio.create_task(probe(client, stop, probe_timings))
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(sign_in(client, n) for n in range(logins)))
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    timings = [result for result in results if result is not None]
+    report(f"{name}: sign-in", timings)
+    report(f"{name}: GET /ready meanwhile", probe_timings)
+    print(f"{'':<40} {elapsed:.2f} s for the storm, {logins - len(timings)} shed with 503")
+
+
+async def run(logins: int) -> None:
+    dependencies.get_user = get_user
+    main.ready = True
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        verify_pooled = dependencies.verify_and_update_password
+        dependencies.verify_and_update_password = verify_inline
+        await storm("inline bcrypt", client, logins)
+
+        dependencies.verify_and_update_password = verify_pooled
+        await storm(f"{PASSWORD_HASH_EXECUTOR} pool of {PASSWORD_HASH_WORKERS}", client, logins)
+
+    password_pool.shutdown_password_executor()
+    print(f"{logins} concurrent sign-ins, bcrypt cost {password_pool.BCRYPT_ROUNDS}, {os.cpu_count()} CPUs")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(args.logins))
@@ -0,0 +1,90 @@
+"""
+Reading every page of a 10k-message chat, 40 messages a page, three ways: skip/limit on
+timestamp order (as get_chat_messages used to), the page_number mode (a seq range) and
+the cursor mode. The first and last pages are reported apart, deep pages are where
+skip/limit slows down.
+
+    python -m benchmarks.message_paging [--messages 10000] [--page-size 40]
+
+Needs MongoDB at MONGODB_CONNECTION_STRING; the chat is written to a `vit_benchmark`
+database, which is dropped afterwards.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from benchmarks.stub import benchmark_database, report
+from bson import ObjectId
+from pymongo.asynchronous.database import AsyncDatabase
+from bizzbot import dependencies
+
+
+async def seed(db: AsyncDatabase, messages: int) -> str:
+    chat_id = ObjectId()
+    started = datetime.now(timezone.utc)
+    await db.chats.insert_one({
+        "_id": chat_id, "user_id": ObjectId(), "topic": "Benchmark", "message_seq": messages,
+        "created_at": started, "last_updated": started,
+    })
+    await db.messages.insert_many([
+        {
+            "chat_id": chat_id, "seq": seq, "role": "user" if seq % 2 else "assistant",
+            "content": f"message {seq} " * 20, "timestamp": started + timedelta(milliseconds=seq),
+        }
+        for seq in range(1, messages + 1)
+    ])
+    return str(chat_id)
+
+
+async def skip_limit(chat_id: str, page: int, page_size: int) -> list[dict]:
+    messages = dependencies.messages_collection.find(
+        {"chat_id": ObjectId(chat_id)}, dependencies.MESSAGE_PROJECTION
+    ).sort("timestamp", 1).skip(page_size * page).limit(page_size)
+    return await messages.to_list()
+
+
+async def timed_pages(name: str, read_page, pages: int) -> None:
+    timings = []
+    for page in range(pages):
+        started = time.perf_counter()
+        rows = await read_page(page)
+        timings.append(time.perf_counter() - started)
+        assert rows, f"{name}: page {page} is empty"
+
+    report(f"{name}, all pages", timings)
+    report(f"{name}, first 10 pages", timings[:10])
+    report(f"{name}, last 10 pages", timings[-10:])
+
+
+async def run(messages: int, page_size: int) -> None:
+    async with benchmark_database() as db:
+        if db is None:
+            return
+
+        chat_id = await seed(db, messages)
+        pages = messages // page_size
+
+        await timed_pages("skip/limit", lambda page: skip_limit(chat_id, page, page_size), pages)
+        await timed_pages(
+            "page_number (seq range)",
+            lambda page: dependencies.get_chat_message_rows(chat_id, after_seq=page * page_size, limit=page_size),
+            pages)
+
+        cursor = None
+
+        async def next_page(page: int) -> list[dict]:
+            nonlocal cursor
+            rows, cursor, _ = await dependencies.get_chat_messages_page(chat_id, limit=page_size, cursor=cursor)
+            return rows
+
+        await timed_pages("cursor", next_page, pages)
+
+    print(f"{messages} messages, {page_size} a page")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=40)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.page_size))
@@ -0,0 +1,86 @@
+"""
+Time to the first answer of /new-chat against a slow RAG stub: the topic generated first
+and then the answer (as /new-chat used to), against both generated together.
+
+    python -m benchmarks.new_chat_latency [--delay 0.5] [--runs 10]
+
+The chat writes are stubbed out, so only the RAG calls take time.
+"""
+import os
+os.environ.setdefault("USER_RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("USER_MAX_CONCURRENT_REQUESTS", "0")
+os.environ.setdefault("RAG_CACHE_ENABLED", "false")
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from benchmarks.stub import report, stub_server
+import httpx
+import main
+from auth.dependencies import get_current_user
+from bizzbot import dependencies
+from bizzbot.http_client import close_rag_client, start_rag_client
+from bizzbot.schemas import ChatsResponse, ClientChat, MessageModel
+
+USER_ID = "000000000000000000000001"
+
+
+async def existing_topics(user_id: str, topics: list[str]) -> set[str]:
+    return set()
+
+
+async def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_response_text: str) -> ChatsResponse:
+    now = datetime.now(timezone.utc)
+    return ChatsResponse(id="000000000000000000000002", user_id=user_id, topic=topic, created_at=now, last_updated=now)
+
+
+def finish_chat_topic(topic_task: asyncio.Task, chat_id: str, placeholder: str) -> asyncio.Task:
+    async def finish():
+        return (await topic_task).topic
+    return asyncio.create_task(finish())
+
+
+async def sequential(n: int) -> float:
+    # the old flow: wait for the topic, then ask the question
+    started = time.perf_counter()
+    prompt = ClientChat(role="user", content=f"How do I register a business? ({n})")
+    await dependencies.get_chat_topic(prompt, USER_ID)
+    await dependencies.query_rag_api(MessageModel(role="user", content=prompt.content))
+    return time.perf_counter() - started
+
+
+async def concurrent(client: httpx.AsyncClient, n: int) -> float:
+    started = time.perf_counter()
+    response = await client.post(
+        "/api/v1/bizzbot/new-chat", json={"role": "user", "content": f"How do I register a business? ({n})"})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run(delay: float, runs: int) -> None:
+    dependencies.existing_topics = existing_topics
+    dependencies.create_new_chat = create_new_chat
+    dependencies.finish_chat_topic = finish_chat_topic
+    main.ready = True
+    main.app.dependency_overrides[get_current_user] = lambda: USER_ID
+
+    async with stub_server(delay=delay, content="Registering a business\nBusiness names"):
+        await start_rag_client()
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                report("topic, then answer", [await sequential(n) for n in range(runs)])
+                report("topic alongside answer (/new-chat)", [await concurrent(client, n) for n in range(runs)])
+        finally:
+            await close_rag_client()
+
+    print(f"RAG stub delay: {delay * 1000:.0f} ms per call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds the stub takes per call")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.delay, args.runs))
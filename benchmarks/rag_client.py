@@ -0,0 +1,70 @@
+"""
+RAG calls with a new client per call (as query_rag_api used to) against the shared pooled
+client, one at a time and in bursts of concurrent calls.
+
+    python -m benchmarks.rag_client [--delay 0.01] [--calls 200] [--concurrency 20]
+
+The stub counts the connections it accepted: per-call clients open one for every call,
+the pooled client reuses its keep-alive connections.
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.stub import report, stub_server
+import httpx
+from bizzbot import http_client
+from bizzbot.http_client import close_rag_client, start_rag_client
+from config import RAG_API_URL
+
+PAYLOAD = {"messages": [{"role": "user", "content": "How do I register a business?"}]}
+
+
+async def per_call() -> float:
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        response = await client.post(RAG_API_URL, json=PAYLOAD)
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def pooled() -> float:
+    started = time.perf_counter()
+    response = await http_client.get_rag_client().post(RAG_API_URL, json=PAYLOAD)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def measure(name: str, call, calls: int, concurrency: int, stub) -> None:
+    stub.connections = stub.requests = 0
+
+    timings = [await call() for _ in range(calls)]
+    report(f"{name}, sequential", timings)
+
+    timings = []
+    for _ in range(calls // concurrency):
+        timings += await asyncio.gather(*(call() for _ in range(concurrency)))
+    report(f"{name}, {concurrency} at once", timings)
+
+    print(f"{'':<40} {stub.requests} requests over {stub.connections} connections")
+
+
+async def run(delay: float, calls: int, concurrency: int) -> None:
+    async with stub_server(delay=delay) as stub:
+        await start_rag_client()
+        try:
+            await asyncio.sleep(0.1)  # let the startup warm-up ping finish
+            await measure("new client per call", per_call, calls, concurrency, stub)
+            await measure("pooled client", pooled, calls, concurrency, stub)
+        finally:
+            await close_rag_client()
+
+    print(f"RAG stub delay: {delay * 1000:.0f} ms per call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds the stub takes per call")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.delay, args.calls, args.concurrency))
@@ -0,0 +1,79 @@
+"""
+Serializing database rows into a response body: a model built per row, then validated and
+serialized again as the endpoint's return value (as get_chat_messages, chat_with_bizzbot
+and get_user_chats used to), against the rows encoded directly by fast_json.
+
+    python -m benchmarks.serialization [--runs 200]
+
+Pure CPU, nothing is sent anywhere.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from benchmarks.stub import report
+from bson import ObjectId
+from pydantic import TypeAdapter
+from bizzbot.dependencies import chat_row, message_row
+from bizzbot.schemas import ChatsResponse, MessageModel
+from fast_json import dumps
+
+
+def message_docs(count: int) -> list[dict]:
+    return [
+        {"seq": seq, "role": "user" if seq % 2 else "assistant", "content": f"How do I register a business? {seq} " * 15}
+        for seq in range(1, count + 1)
+    ]
+
+
+def chat_docs(count: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {"_id": ObjectId(), "user_id": ObjectId(), "topic": f"Chat {n}", "total_conversations": n,
+         "summarised_messages": 0, "created_at": now, "last_updated": now}
+        for n in range(count)
+    ]
+
+
+def validated(model, build):
+    # FastAPI's path for a list[model] return value: validate, serialize, json.dumps
+    adapter = TypeAdapter(list[model])
+
+    def serialize(docs: list[dict]) -> bytes:
+        content = adapter.dump_python(adapter.validate_python([build(doc) for doc in docs]), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    return serialize
+
+
+def timed(serialize, docs: list[dict], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        serialize(docs)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run(runs: int) -> None:
+    per_model_messages = validated(
+        MessageModel, lambda doc: MessageModel(summary=None, role=doc["role"], content=doc["content"]))
+    per_model_chats = validated(ChatsResponse, lambda doc: ChatsResponse(**chat_row(doc)))
+
+    for name, docs, per_model, row in (
+        ("40 messages", message_docs(40), per_model_messages, message_row),
+        ("1000 messages", message_docs(1000), per_model_messages, message_row),
+        ("200 chats", chat_docs(200), per_model_chats, chat_row),
+    ):
+        # both paths must produce the same body
+        assert json.loads(per_model(docs)) == json.loads(dumps([row(doc) for doc in docs]))
+
+        report(f"{name}, models", timed(per_model, docs, runs))
+        report(f"{name}, fast_json rows", timed(lambda docs: dumps([row(doc) for doc in docs]), docs, runs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    run(args.runs)
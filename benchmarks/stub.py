@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import PyMongoError
+
+# benchmarks run as `python -m benchmarks.<name>` from the repo root, with the settings
+# below unless they are already set; nothing needs MongoDB, Redis or the real RAG API
+os.environ.setdefault("MONGODB_CONNECTION_STRING", "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=500")
+os.environ.setdefault("RAG_API_URL", "http://127.0.0.1:8765/chat")
+os.environ.setdefault("RAG_WARMUP_INTERVAL_SECONDS", "0")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["REDIS_HOST"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STUB_PORT = 8765
+
+
+class StubServer:
+    """
+    A local stand-in for the RAG API: a bare HTTP/1.1 server with keep-alive that answers
+    every request with `content` after `delay` seconds. It counts the connections it
+    accepted, so a benchmark can show how many handshakes a client needed.
+    """
+
+    def __init__(self, delay: float = 0.0, content: str = "Stub answer"):
+        self.delay = delay
+        self.content = content
+        self.connections = 0
+        self.requests = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+
+                body = json.dumps({"message": {"role": "assistant", "content": self.content}}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@asynccontextmanager
+async def stub_server(delay: float = 0.0, content: str = "Stub answer") -> AsyncIterator[StubServer]:
+    stub = StubServer(delay, content)
+    server = await asyncio.start_server(stub._handle, "127.0.0.1", STUB_PORT)
+    try:
+        yield stub
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+@asynccontextmanager
+async def benchmark_database(name: str = "vit_benchmark") -> AsyncIterator[AsyncDatabase | None]:
+    """
+    Point the app's collections at an empty database with the app's indexes, dropped
+    afterwards. Yields None when no MongoDB is reachable at MONGODB_CONNECTION_STRING.
+    """
+    from auth import db_connection
+    from auth.indexes import reconcile_indexes
+
+    db_connection.DATABASE_NAME = name
+    client = db_connection.get_client()
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as e:
+        print(f"No MongoDB reachable at MONGODB_CONNECTION_STRING: {e}")
+        await db_connection.close_mongo_client()
+        yield None
+        return
+
+    try:
+        await client.drop_database(name)
+        await reconcile_indexes(db_connection.get_database())
+        yield db_connection.get_database()
+    finally:
+        await client.drop_database(name)
+        await db_connection.close_mongo_client()
+
+
+def report(name: str, timings: list[float]) -> None:
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<40} n={len(timings):<5} mean={mean * 1000:8.2f} ms  p95={p95 * 1000:8.2f} ms")
@@ -0,0 +1,236 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Awaitable, Callable
+from fastapi import Depends, HTTPException
+from redis.exceptions import RedisError
+from auth.db_connection import get_redis_client, mark_redis_unavailable
+from auth.dependencies import get_current_user
+from cache import TTLCache
+from config import (
+    USER_MAX_CONCURRENT_REQUESTS, USER_RATE_LIMIT_PER_MINUTE, USER_RATE_LIMIT_BURST, ADMISSION_QUEUE_TIMEOUT
+)
+
+
+# Per-user limits on the endpoints that call the bot: a token bucket on how often a user
+# may call, and a cap on how many of their calls can be in flight at once. A call over the
+# concurrency cap waits up to ADMISSION_QUEUE_TIMEOUT for a slot. Both are kept in Redis so
+# the limits hold across workers, with per-worker state as the fallback.
+REDIS_BUCKET_KEY = "admission:bucket"
+REDIS_INFLIGHT_KEY = "admission:inflight"
+INFLIGHT_TTL = 300  # a crashed worker's slots are freed after this much inactivity
+QUEUE_POLL_INTERVAL = 0.1
+
+# refill the bucket for the time since the last call and take a token, atomically.
+# Returns the seconds until a token is available, 0 when one was taken.
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated'))
+if tokens == nil then
+    tokens, updated = burst, now
+end
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry_after)
+"""
+
+# give an in-flight slot back. A plain DECR on a key whose TTL ran out would recreate it at
+# -1 with no TTL, handing the user an extra slot for good.
+RELEASE_SCRIPT = """
+local inflight = tonumber(redis.call('GET', KEYS[1]))
+if inflight == nil or inflight <= 0 then
+    return 0
+end
+return redis.call('DECR', KEYS[1])
+"""
+
+RATE = USER_RATE_LIMIT_PER_MINUTE / 60  # tokens per second
+
+local_buckets = TTLCache(maxsize=100000, ttl=USER_RATE_LIMIT_BURST / RATE + 1 if RATE else 1)
+local_inflight: dict[str, int] = {}
+
+stats = {
+    "admitted": 0,
+    "rejected_rate_limit": 0,
+    "rejected_concurrency": 0,
+    "queued": 0,
+    "total_queue_wait": 0.0,
+    "max_queue_wait": 0.0,
+}
+
+
+def _too_many_requests(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+# ----------------------- RATE LIMIT -----------------------
+async def _take_token(user_id: str) -> float:
+    """
+    :return: 0 if the user may call now, otherwise the seconds until they may.
+    """
+    now = time.time()
+
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            retry_after = await redis_client.eval(
+                TOKEN_BUCKET_SCRIPT, 1, f"{REDIS_BUCKET_KEY}:{user_id}", RATE, USER_RATE_LIMIT_BURST, now)
+            return float(retry_after)
+        except RedisError as e:
+            mark_redis_unavailable(e)
+
+    tokens, updated = local_buckets.get(user_id) or (USER_RATE_LIMIT_BURST, now)
+    tokens = min(USER_RATE_LIMIT_BURST, tokens + max(0.0, now - updated) * RATE)
+
+    retry_after = 0.0
+    if tokens >= 1:
+        tokens -= 1
+    else:
+        retry_after = (1 - tokens) / RATE
+
+    local_buckets.set(user_id, (tokens, now))
+    return retry_after
+
+
+# ----------------------- CONCURRENCY -----------------------
+async def _try_acquire(user_id: str) -> Callable[[], Awaitable[None]] | None:
+    """
+    Take one of the user's in-flight slots.
+
+    :return: A function giving the slot back, or None if all of the user's slots are taken.
+    """
+    redis_client = get_redis_client()
+    if redis_client:
+        key = f"{REDIS_INFLIGHT_KEY}:{user_id}"
+        try:
+            inflight = await redis_client.incr(key)
+            await redis_client.expire(key, INFLIGHT_TTL)
+            if inflight > USER_MAX_CONCURRENT_REQUESTS:
+                await redis_client.eval(RELEASE_SCRIPT, 1, key)
+                return None
+
+            async def release_redis() -> None:
+                try:
+                    await redis_client.eval(RELEASE_SCRIPT, 1, key)
+                except RedisError as e:
+                    mark_redis_unavailable(e)
+
+            return release_redis
+        except RedisError as e:
+            mark_redis_unavailable(e)
+
+    if local_inflight.get(user_id, 0) >= USER_MAX_CONCURRENT_REQUESTS:
+        return None
+    local_inflight[user_id] = local_inflight.get(user_id, 0) + 1
+
+    async def release_local() -> None:
+        local_inflight[user_id] -= 1
+        if not local_inflight[user_id]:
+            del local_inflight[user_id]
+
+    return release_local
+
+
+async def _acquire_slot(user_id: str) -> Callable[[], Awaitable[None]]:
+    release = await _try_acquire(user_id)
+    if release:
+        return release
+
+    # over the cap: wait a little for one of the user's other calls to finish
+    stats["queued"] += 1
+    started = time.monotonic()
+    deadline = started + ADMISSION_QUEUE_TIMEOUT
+    try:
+        while time.monotonic() < deadline:
+            await asyncio.sleep(QUEUE_POLL_INTERVAL)
+            release = await _try_acquire(user_id)
+            if release:
+                return release
+    finally:
+        waited = time.monotonic() - started
+        stats["total_queue_wait"] += waited
+        stats["max_queue_wait"] = max(stats["max_queue_wait"], waited)
+
+    stats["rejected_concurrency"] += 1
+    raise _too_many_requests(1, "Too many requests in progress, wait for the current ones to finish")
+
+
+# ----------------------- ADMISSION -----------------------
+async def admit(user_id: str) -> Callable[[], Awaitable[None]]:
+    """
+    Admit a call to the bot for the user, or refuse it.
+
+    :return: A function to call once the request is done, giving the user's slot back.
+        Calling it more than once is safe.
+
+    Raises:
+        HTTPException: 429 with Retry-After if the user is over their rate or concurrency limit.
+    """
+    if RATE:
+        retry_after = await _take_token(user_id)
+        if retry_after:
+            stats["rejected_rate_limit"] += 1
+            raise _too_many_requests(retry_after, "Rate limit exceeded, try again later")
+
+    give_back = await _acquire_slot(user_id) if USER_MAX_CONCURRENT_REQUESTS else None
+    released = False
+
+    async def release() -> None:
+        nonlocal released
+        # streaming endpoints release from both the stream and the response's cleanup
+        if released:
+            return
+        released = True
+        if give_back:
+            await give_back()
+
+    stats["admitted"] += 1
+    return release
+
+
+@asynccontextmanager
+async def admitted(user_id: str) -> AsyncIterator[None]:
+    """
+    admit() for the duration of a block.
+    """
+    release = await admit(user_id)
+    try:
+        yield
+    finally:
+        await release()
+
+
+async def admit_current_user(user_id: Annotated[str, Depends(get_current_user)]) -> AsyncIterator[str]:
+    """
+    Dependency: the current user's id, admitted until the endpoint returns.
+
+    Not for streaming endpoints, whose responses outlive the dependency; they call admit()
+    and release when the stream ends.
+    """
+    async with admitted(user_id):
+        yield user_id
+
+
+def admission_stats() -> dict[str, int | float]:
+    queued = stats["queued"]
+    return {
+        "admitted": stats["admitted"],
+        "rejected_rate_limit": stats["rejected_rate_limit"],
+        "rejected_concurrency": stats["rejected_concurrency"],
+        "queued": queued,
+        "avg_queue_wait": round(stats["total_queue_wait"] / queued, 3) if queued else 0.0,
+        "max_queue_wait": round(stats["max_queue_wait"], 3),
+    }
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+from redis.exceptions import RedisError
+from auth.db_connection import get_redis_client, mark_redis_unavailable
+
+
+# Identical calls that are in flight at the same time share one upstream call. Within a
+# worker the first caller starts the call as a task and later callers await the same task.
+# Across workers the leader holds a Redis lock naming its flight, and publishes the result
+# under a key of that flight before releasing the lock; the other workers poll for it.
+POLL_INTERVAL = 0.1
+RESULT_TTL = 30  # seconds a published result stays readable for the workers polling for it
+
+# delete the lock only if it still names our flight, not one that took over after it expired
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class FlightTimeoutError(Exception):
+    pass
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    Values are passed between workers as strings made by `dumps` and turned back into
+    objects with `loads`. Without Redis, calls are only coalesced within the worker.
+    A caller waits at most `timeout` seconds; if the leader fails, its error is raised in
+    the callers of its worker, while the other workers elect a new leader.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        timeout: float,
+        dumps: Callable[[Any], str],
+        loads: Callable[[str], Any],
+    ):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.dumps = dumps
+        self.loads = loads
+        self._flights: dict[str, asyncio.Task] = {}
+        self.upstream_calls = 0
+        self.coalesced_local = 0
+        self.coalesced_remote = 0
+        self.timeouts = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the result of `call`, or of the identical call already in flight.
+
+        Raises:
+            FlightTimeoutError: If no result arrived within `timeout` seconds.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            # a task of its own, so the call outlives the caller that started it
+            flight = asyncio.create_task(self._lead_or_follow(key, call))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._landed(key, done))
+        else:
+            self.coalesced_local += 1
+
+        try:
+            async with asyncio.timeout(self.timeout):
+                return await asyncio.shield(flight)
+        except TimeoutError:
+            self.timeouts += 1
+            raise FlightTimeoutError(f"no result within {self.timeout}s")
+
+    def _landed(self, key: str, flight: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception()  # retrieved here too, in case every caller gave up waiting
+
+    async def _call(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        self.upstream_calls += 1
+        return await call()
+
+    # ----------------------- ACROSS WORKERS -----------------------
+    async def _lead_or_follow(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        redis_client = get_redis_client()
+        if not redis_client:
+            return await self._call(call)
+
+        lock_key = f"{self.namespace}:lock:{key}"
+        flight_id = uuid.uuid4().hex
+        deadline = time.monotonic() + self.timeout
+        leader: str | None = None
+
+        try:
+            while True:
+                if leader:
+                    raw = await redis_client.get(f"{self.namespace}:result:{leader}")
+                    if raw is not None:
+                        self.coalesced_remote += 1
+                        return self.loads(raw)
+
+                if await redis_client.set(lock_key, flight_id, nx=True, ex=max(1, round(self.timeout))):
+                    break
+
+                # None when the leader just finished or failed: the next round either reads
+                # its result or takes the lock
+                leader = await redis_client.get(lock_key) or leader
+
+                if time.monotonic() >= deadline:
+                    raise FlightTimeoutError(f"no result from the leading worker within {self.timeout}s")
+                await asyncio.sleep(POLL_INTERVAL)
+        except RedisError as e:
+            mark_redis_unavailable(e)
+            return await self._call(call)
+
+        try:
+            value = await self._call(call)
+            try:
+                await redis_client.set(f"{self.namespace}:result:{flight_id}", self.dumps(value), ex=RESULT_TTL)
+            except RedisError as e:
+                mark_redis_unavailable(e)
+            return value
+        finally:
+            try:
+                await redis_client.eval(UNLOCK_SCRIPT, 1, lock_key, flight_id)
+            except RedisError as e:
+                mark_redis_unavailable(e)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced_local": self.coalesced_local,
+            "coalesced_remote": self.coalesced_remote,
+            "upstream_calls_saved": self.coalesced_local + self.coalesced_remote,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._flights),
+        }
@@ -1,49 +1,352 @@
-from datetime import datetime, timezone
-import time
-from typing import Literal
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Literal
 from bson import ObjectId
+from bson.errors import InvalidId
 from fastapi import HTTPException
-from config import RAG_API_URL
+from pymongo import ReturnDocument
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from cache import TwoTierCache
+from config import (
+    MONGO_TRANSACTIONS, RAG_API_URL, REDIS_EXPIRE, RAG_TIMEOUT, RAG_QUEUE_TIMEOUT,
+    RAG_CACHE_ENABLED, RAG_CACHE_MAX_SIZE, RAG_CACHE_MULTI_TURN, RAG_COALESCE_ENABLED
+)
 import httpx
+from bizzbot.http_client import get_rag_client
+from bizzbot.resilience import CircuitOpenError, call_rag
+from bizzbot.governor import Priority, ShedError, rag_governor
+from bizzbot.coalescing import FlightTimeoutError, SingleFlight
+from bizzbot.summarizer import enqueue_summary
+from bizzbot.reaper import wake_reaper
 from bizzbot.schemas import ChatsResponse, ClientChat, MessageModel, PromptTopic
-from bizzbot.models import Chats, Message, Summaries
-from auth.db_connection import chats_collection, messages_collection, summaries_collection
+from bizzbot.models import Chats, ChatTurn, Message, Summaries, TurnWriteResult
+from bizzbot.migrations import backfill_chat_seq
+from metrics import Histogram, SIZE_BUCKETS
+from timing import span
+from auth.db_connection import get_client, chats_collection, messages_collection, summaries_collection
+
+
+# deleted chats are tombstoned until the chat reaper removes them, see bizzbot.reaper
+NOT_DELETED = {"deleted_at": {"$exists": False}}
+
+
+# ----------------------- RAG RESPONSE CACHE -----------------------
+rag_cache = TwoTierCache(
+    namespace="rag",
+    maxsize=RAG_CACHE_MAX_SIZE,
+    local_ttl=REDIS_EXPIRE.total_seconds(),
+    redis_ttl=REDIS_EXPIRE,
+    dumps=lambda message: message.model_dump_json(),
+    loads=MessageModel.model_validate_json,
+)
+
+# identical prompts in flight at the same time, see bizzbot.coalescing
+rag_flights = SingleFlight(
+    namespace="rag:flight",
+    timeout=RAG_QUEUE_TIMEOUT + RAG_TIMEOUT,  # a call may queue in the governor, then run to its deadline
+    dumps=lambda message: message.model_dump_json(),
+    loads=MessageModel.model_validate_json,
+)
+
+
+def _normalize_text(text: str | list[str] | None) -> str | list[str] | None:
+    if isinstance(text, list):
+        return [" ".join(t.split()).casefold() for t in text]
+    if text is None:
+        return None
+    return " ".join(text.split()).casefold()
+
+
+def rag_cache_key(prompt: MessageModel | list[MessageModel]) -> str:
+    """
+    Canonical hash of a prompt: whitespace and case are normalized so trivially
+    different phrasings of the same question share one cache entry.
+    """
+    messages = prompt if isinstance(prompt, list) else [prompt]
+    normalized = [
+        {
+            "role": message.role.strip().lower(),
+            "content": _normalize_text(message.content),
+            "summary": _normalize_text(message.summary),
+        } for message in messages
+    ]
+    canonical = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def is_cacheable(prompt: MessageModel | list[MessageModel]) -> bool:
+    if not RAG_CACHE_ENABLED:
+        return False
+
+    # prompts carrying chat history or a summary are rarely repeated across users
+    multi_turn = isinstance(prompt, list) and len(prompt) > 1
+    has_summary = any(p.summary for p in (prompt if isinstance(prompt, list) else [prompt]))
+
+    return RAG_CACHE_MULTI_TURN or not (multi_turn or has_summary)
 
 
 # ----------------------- QUERY RAG API -----------------------
-async def query_rag_api(prompt: MessageModel | list[MessageModel]) -> MessageModel:
+rag_request_bytes = Histogram(
+    "bizzbot_rag_request_bytes", "Size of the prompts sent to the RAG API", ("mode",), buckets=SIZE_BUCKETS)
+rag_response_bytes = Histogram(
+    "bizzbot_rag_response_bytes", "Size of the RAG API's answers", ("mode",), buckets=SIZE_BUCKETS)
+
+
+async def query_rag_api(
+    prompt: MessageModel | list[MessageModel], use_cache: bool = True, priority: Priority = Priority.INTERACTIVE
+    ) -> MessageModel:
+    """
+    Query the RAG API, serving repeated prompts from the response cache. Identical prompts
+    that are in flight at the same time share one upstream call.
+
+    :param prompt: A single message or a conversation to send to the RAG API.
+    :param use_cache: Set to False to always query the upstream, e.g. when a fresh answer is needed.
+    :param priority: Queue position when the worker is at its RAG_MAX_IN_FLIGHT cap. Shared
+        calls keep the priority of the caller that started them.
+    :return: The assistant's response.
+    """
+    # topic calls run alongside the chat's own call, time them apart
+    with span("rag" if priority is Priority.INTERACTIVE else f"rag_{priority.name.lower()}"):
+        return await _query_rag_api(prompt, use_cache, priority)
+
+
+async def _query_rag_api(prompt: MessageModel | list[MessageModel], use_cache: bool, priority: Priority) -> MessageModel:
+    key = rag_cache_key(prompt)
+    cache_key = None
+    if use_cache and is_cacheable(prompt):
+        cache_key = key
+        cached = await rag_cache.get(cache_key)
+        if cached is not None:
+            return cached.model_copy()
+
+    async def fetch() -> MessageModel:
+        response = await _post_rag_api(prompt, priority)
+        if cache_key and response.content:
+            await rag_cache.set(cache_key, response)
+        return response
+
+    if not RAG_COALESCE_ENABLED:
+        return await fetch()
+
+    try:
+        response = await rag_flights.run(key, fetch)
+    except FlightTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Upstream API timed out: {e}")
+
+    # every caller of a shared call gets its own copy
+    return response.model_copy()
+
+
+def _upstream_unavailable(e: CircuitOpenError | ShedError) -> HTTPException:
+    # fail fast while the upstream is down or saturated instead of tying the worker up until it times out
+    retry_after = e.retry_after if isinstance(e, CircuitOpenError) else 1
+    return HTTPException(
+        status_code=503,
+        detail="Upstream API unavailable, try again later",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def _prompt_json(prompt: MessageModel | list[MessageModel]) -> dict:
     if isinstance(prompt, list):
-        prompt_json = {"messages": [p.model_dump() for p in prompt]}
-    else:
-        prompt_json = {"messages": prompt.model_dump()}
+        return {"messages": [p.model_dump() for p in prompt]}
+    return {"messages": prompt.model_dump()}
 
-    async with httpx.AsyncClient(timeout=90.0) as client:
-        try:
-            # Forward request to external RAG API
-            response = await client.post(
+
+async def _post_rag_api(prompt: MessageModel | list[MessageModel], priority: Priority = Priority.INTERACTIVE) -> MessageModel:
+    prompt_json = _prompt_json(prompt)
+
+    client = get_rag_client()
+    try:
+        # Forward request to external RAG API, retried and hedged by call_rag
+        async with rag_governor.slot(priority) as remaining:
+            response = await call_rag(lambda: client.post(
                 RAG_API_URL,
                 headers={"accept": "application/json", "Content-Type": "application/json"},
                 json=prompt_json
-            )
-            response.raise_for_status()
-        except httpx.HTTPError as e:
+            ), timeout=remaining)
+    except (CircuitOpenError, ShedError) as e:
+        raise _upstream_unavailable(e)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Upstream API error: {e}")
+
+    rag_request_bytes.observe(len(response.request.content), mode="json")
+    rag_response_bytes.observe(len(response.content), mode="json")
+
+    result: dict = response.json()
+    data: dict = result.get("message", {})
+
+    return MessageModel(
+        role=data.get("role", "assistant"),
+        content=data.get("content", "")
+    )
+
+
+# ----------------------- STREAM FROM RAG API -----------------------
+open_streams: set[httpx.Response] = set()  # streams holding a RAG_MAX_IN_FLIGHT slot
+
+
+async def open_rag_stream(prompt: MessageModel | list[MessageModel]) -> httpx.Response:
+    """
+    Send a streaming request to the RAG API and return once the response headers arrive,
+    so upstream errors still surface as a 502 before the client stream starts.
+    The caller owns the returned response and must consume it with iter_rag_stream or
+    close it with close_rag_stream, which also frees its RAG_MAX_IN_FLIGHT slot.
+    """
+    client = get_rag_client()
+    request = client.build_request(
+        "POST",
+        RAG_API_URL,
+        headers={
+            "accept": "text/event-stream, application/x-ndjson, application/json",
+            "Content-Type": "application/json"
+        },
+        json={**_prompt_json(prompt), "stream": True}
+    )
+
+    try:
+        # the slot is held until the stream is closed
+        remaining = await rag_governor.acquire(Priority.INTERACTIVE)
+    except ShedError as e:
+        raise _upstream_unavailable(e)
+
+    try:
+        # retried until the headers arrive; never hedged, a stream can't be duplicated
+        with span("rag"):
+            response = await call_rag(lambda: client.send(request, stream=True), hedge=False, timeout=remaining)
+    except BaseException as e:
+        rag_governor.release()
+        if isinstance(e, CircuitOpenError):
+            raise _upstream_unavailable(e)
+        if isinstance(e, httpx.HTTPError):
             raise HTTPException(status_code=502, detail=f"Upstream API error: {e}")
-        
-        result: dict = response.json()
-        data: dict = result.get("message", {})
+        raise
 
-        return MessageModel(
-            role=data.get("role", "assistant"),
-            content=data.get("content", "")
-        )
+    open_streams.add(response)
+    return response
+
+
+async def close_rag_stream(response: httpx.Response) -> None:
+    """
+    Close a response opened by open_rag_stream and free its slot. Safe to call more than once.
+    """
+    await response.aclose()
+    if response in open_streams:
+        open_streams.discard(response)
+        rag_governor.release()
+        rag_request_bytes.observe(len(response.request.content), mode="stream")
+        rag_response_bytes.observe(response.num_bytes_downloaded, mode="stream")
+
+
+def _chunk_content(chunk: dict | str) -> str:
+    # upstream chunks look like {"message": {"content": ...}}, {"content": ...} or {"delta": ...}
+    if isinstance(chunk, str):
+        return chunk
+    if not isinstance(chunk, dict):
+        return ""
+
+    message = chunk.get("message")
+    content = message.get("content", "") if isinstance(message, dict) else chunk.get("content", chunk.get("delta", ""))
+
+    return "".join(content) if isinstance(content, list) else str(content or "")
+
+
+def _parse_chunk(data: str) -> str:
+    try:
+        return _chunk_content(json.loads(data))
+    except ValueError:
+        return data
+
+
+async def iter_rag_stream(response: httpx.Response) -> AsyncIterator[str]:
+    """
+    Yield content deltas from a response opened by open_rag_stream.
+
+    Handles SSE, NDJSON and plain JSON (non-streaming upstreams yield one chunk).
+    The upstream connection is released when the iterator finishes, fails or is
+    closed early, e.g. because the client disconnected.
+    """
+    content_type = response.headers.get("content-type", "")
+    try:
+        if "text/event-stream" in content_type:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                if delta := _parse_chunk(data):
+                    yield delta
+        elif "ndjson" in content_type or "jsonl" in content_type:
+            async for line in response.aiter_lines():
+                if line.strip() and (delta := _parse_chunk(line)):
+                    yield delta
+        else:
+            if delta := _parse_chunk((await response.aread()).decode()):
+                yield delta
+    finally:
+        await close_rag_stream(response)
+
+
+def format_sse(event: str, data) -> str:
+    """
+    Format one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 # ----------------------- GET TOPIC FROM RAG API -----------------------
+TOPIC_CANDIDATES = 5
+MAX_TOPIC_ATTEMPTS = 10  # upstream calls the old one-topic-per-call retry loop could make
+
+topic_stats = {
+    "new_chats": 0,
+    "upstream_calls": 0,
+    "upstream_calls_saved": 0,
+    "suffixed": 0,
+}
+
+
+def parse_topic_candidates(content: str | list[str]) -> list[str]:
+    """
+    Split the bot's answer into distinct topics, dropping numbering, bullets and quotes.
+    """
+    lines = content if isinstance(content, list) else content.splitlines()
+    candidates = []
+
+    for line in lines:
+        topic = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip().strip('"\'').strip()
+        if topic and topic not in candidates:
+            candidates.append(topic)
+
+    return candidates[:TOPIC_CANDIDATES]
+
+
+async def existing_topics(user_id: str, topics: list[str]) -> set[str]:
+    """
+    Which of the given topics the user already has, in one query on the (user_id, topic) index.
+    """
+    chats = chats_collection.find(
+        {"user_id": ObjectId(user_id), "topic": {"$in": topics}, **NOT_DELETED},
+        {"_id": 0, "topic": 1}
+    )
+    return {chat["topic"] async for chat in chats}
+
+
 async def get_chat_topic(prompt: ClientChat, user_id: str | None = None) -> PromptTopic:
     if not prompt.topic:
         # prefix = "In one word or , give a topic for conversations that may arise from this prompt: \n"
-        prefix = """
-        Suggest short conversation topic for this message (just one topic).
+        prefix = f"""
+        Suggest {TOPIC_CANDIDATES} different short conversation topics for this message.
+        Write one topic per line, without numbering or any other text.
 
         Rules:
         - Avoid generic topics like "General", "Miscellaneous", or "Chat".
@@ -58,40 +361,119 @@ async def get_chat_topic(prompt: ClientChat, user_id: str | None = None) -> Prom
         \n
         """
         new_prompt = MessageModel(role="user", content=prefix + prompt.content)
-        topic_exists = True
-        attempts = 0
-        max_attempts = 10
-        result = None
-
-        while topic_exists and attempts < max_attempts:
-            attempts += 1
-
-            result = await query_rag_api(new_prompt)
-            topic_existing = chats_collection.find_one({
-                "user_id": ObjectId(user_id),
-                "topic": result.content
-                })
-
-            if topic_existing:
-                new_prompt.content += f"\nAvoid this topic: {result.content}"
-            else:
-                topic_exists = False
-            
-            print(f"Attempt {attempts}: Generated topic - {result.content}")
+
+        # one upstream call for all candidates instead of one call per collision
+        result = await query_rag_api(new_prompt, use_cache=False, priority=Priority.TOPIC)
+        candidates = parse_topic_candidates(result.content) or [placeholder_topic(prompt.content)]
+
+        taken = await existing_topics(user_id, candidates)
+        free = [candidate for candidate in candidates if candidate not in taken]
+
+        if free:
+            topic = free[0]
+            # the old loop paid one call per collision before reaching this candidate
+            would_have_called = min(candidates.index(topic) + 1, MAX_TOPIC_ATTEMPTS)
+        else:
+            # every candidate collides, suffix locally instead of asking again
+            suffixed = [f"{candidates[0]} ({n})" for n in range(2, 2 + MAX_TOPIC_ATTEMPTS)]
+            taken = await existing_topics(user_id, suffixed)
+            topic = next((t for t in suffixed if t not in taken), f"{candidates[0]} ({str(ObjectId())[-6:]})")
+            would_have_called = min(len(candidates) + 1, MAX_TOPIC_ATTEMPTS)
+            topic_stats["suffixed"] += 1
+
+        topic_stats["new_chats"] += 1
+        topic_stats["upstream_calls"] += 1
+        topic_stats["upstream_calls_saved"] += would_have_called - 1
+
+        print(f"Generated topic - {topic} ({len(candidates)} candidates, {would_have_called - 1} upstream calls saved)")
 
         return PromptTopic(
             prompt=prefix + prompt.content,
-            topic=result.content
+            topic=topic
         )
 
     return PromptTopic(
         prompt=prompt.content,
         topic=prompt.topic
     )
-    
+
+
+# ----------------------- GENERATE TOPIC CONCURRENTLY -----------------------
+# strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+background_tasks: set[asyncio.Task] = set()
+
+
+def placeholder_topic(prompt_text: str, max_words: int = 8) -> str:
+    """
+    Topic shown until the generated one is ready: the first few words of the prompt.
+    """
+    words = prompt_text.split()
+    topic = " ".join(words[:max_words])
+    return topic + "..." if len(words) > max_words else topic or "New chat"
+
+
+def start_chat_topic(prompt: ClientChat, user_id: str) -> asyncio.Task | None:
+    """
+    Start generating the chat's topic in the background so it runs alongside the first answer.
+    Returns None when the client already chose a topic.
+    """
+    if prompt.topic:
+        return None
+    return asyncio.create_task(get_chat_topic(prompt, user_id))
+
+
+def settle_chat_topic(prompt: ClientChat, topic_task: asyncio.Task | None) -> tuple[str, bool]:
+    """
+    Topic to store with the new chat right now, without waiting for topic generation.
+
+    :return: (topic, pending) where pending means the generated topic will replace a placeholder later.
+    """
+    if topic_task is None:
+        return prompt.topic, False
+
+    if topic_task.done():
+        if not topic_task.cancelled() and topic_task.exception() is None:
+            return topic_task.result().topic, False
+        # generation failed, keep the placeholder for good
+        return placeholder_topic(prompt.content), False
+
+    return placeholder_topic(prompt.content), True
+
+
+def finish_chat_topic(topic_task: asyncio.Task, chat_id: str, placeholder: str) -> asyncio.Task:
+    """
+    Replace a new chat's placeholder topic once generation completes.
+    The update only applies while the placeholder is still in place, so a topic edited
+    by the user in the meantime is kept. The returned task resolves to the new topic or None.
+    """
+    async def _finish() -> str | None:
+        try:
+            topic = (await topic_task).topic
+        except Exception as e:
+            print(f"Topic generation for chat {chat_id} failed: {e}")
+            return None
+
+        updated_chat = await chats_collection.update_one(
+            {"_id": ObjectId(chat_id), "topic": placeholder},
+            {
+                "$set": {
+                    "topic": topic,
+                    # bump so incremental sidebar refreshes pick the new topic up
+                    "last_updated": datetime.now(timezone.utc)
+                }
+            },
+            upsert=False
+        )
+        return topic if updated_chat.modified_count == 1 else None
+
+    task = asyncio.create_task(_finish())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 
 # ----------------------- CREATE NEW CHAT -----------------------
-def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_response_text: str) -> ChatsResponse | bool:
+async def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_response_text: str) -> ChatsResponse | bool:
     # new chat
     chat_details = Chats(
         id=ObjectId(),
@@ -99,6 +481,7 @@ def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_respons
         topic=topic,
         total_conversations=1,
         summarised_messages=0,
+        message_seq=2,
         created_at=datetime.now(timezone.utc),
         last_updated=datetime.now(timezone.utc)
     )
@@ -107,6 +490,7 @@ def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_respons
     user_prompt = Message(
         id=ObjectId(),
         chat_id=chat_details.id,
+        seq=1,
         role="user",
         content=user_prompt_text,
         timestamp=datetime.now(timezone.utc)
@@ -116,21 +500,28 @@ def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_respons
     bot_response = Message(
         id=ObjectId(),
         chat_id=chat_details.id,
+        seq=2,
         role="assistant",
         content=bot_response_text,
         timestamp=datetime.now(timezone.utc)
     )
 
-    # store chat in db
-    chat_insertion_id = chats_collection.insert_one(chat_details.model_dump(by_alias=True))
-    
-    # store message in db
-    user_prompt_insertion_id = messages_collection.insert_one(user_prompt.model_dump(by_alias=True))
-    # sleep 1 milisecond to achieve order by timestamp in query
-    time.sleep(0.001)
-    bot_response_insertion_id = messages_collection.insert_one(bot_response.model_dump(by_alias=True))
+    async def write(session: AsyncClientSession | None) -> TurnWriteResult:
+        result = TurnWriteResult(messages_expected=2)
+        try:
+            # store chat in db
+            await chats_collection.insert_one(chat_details.model_dump(by_alias=True), session=session)
+            result.chat_written = True
+
+            # store prompt and response in db
+            await _insert_messages([user_prompt, bot_response], result, session)
+        except PyMongoError as e:
+            _record_write_error(result, e, session)
+        return result
+
+    result = await persist_turn(write, f"new chat {chat_details.id}")
 
-    if chat_insertion_id.inserted_id and user_prompt_insertion_id.inserted_id and bot_response_insertion_id.inserted_id:
+    if result:
         return ChatsResponse(
             id=str(chat_details.id),
             user_id=str(chat_details.user_id),
@@ -144,23 +535,62 @@ def create_new_chat(user_id: str, topic: str, user_prompt_text: str, bot_respons
     return False
 
 
+# ----------------------- SAVE NEW CHAT -----------------------
+async def save_new_chat(
+    prompt: ClientChat, user_id: str, topic_task: asyncio.Task | None, bot_response_text: str
+    ) -> tuple[ChatsResponse | Literal[False], asyncio.Task | None]:
+    """
+    Store a new chat as soon as its first answer is ready, with a placeholder topic if the
+    generated one isn't ready yet.
+
+    :return: (new chat or False, task resolving to the generated topic when it is still pending)
+    """
+    topic, pending = settle_chat_topic(prompt, topic_task)
+
+    with span("chat_save"):
+        try:
+            new_chat = await create_new_chat(
+                user_id=user_id,
+                topic=topic,
+                user_prompt_text=prompt.content,
+                bot_response_text=bot_response_text
+            )
+        except BaseException:
+            if topic_task:
+                topic_task.cancel()
+            raise
+
+    if not new_chat:
+        if topic_task:
+            topic_task.cancel()
+        return new_chat, None
+
+    if pending:
+        return new_chat, finish_chat_topic(topic_task, new_chat.id, topic)
+
+    return new_chat, None
+
+
 # ----------------------- MODIFY CHAT TOPIC -----------------------
-def edit_chat_topic(chat_id: str, topic: str) -> ChatsResponse | Literal[False]:
+async def edit_chat_topic(chat_id: str, topic: str) -> ChatsResponse | Literal[False]:
     #get_chat_by_id
-    chat = get_chat_by_id(chat_id)
+    chat = await get_chat_by_id(chat_id)
 
-    # update chat
-    if chat:
-        updated_chat = chats_collection.update_one(
-            {"_id": ObjectId(chat_id)},
-            {
-                "$set": {
-                    "topic": topic,
-                    "last_updated": datetime.now(timezone.utc)
-                }
-            },
-            upsert=False
-        )
+    # missing or deleted
+    if not chat:
+        return False
+
+    # update chat, unless it was deleted since
+    updated_chat = await chats_collection.update_one(
+        {"_id": ObjectId(chat_id), **NOT_DELETED},
+        {
+            "$set": {
+                "topic": topic,
+                "last_updated": datetime.now(timezone.utc)
+            }
+        },
+        upsert=False
+    )
 
     if updated_chat.modified_count == 1:
         updated_data = ChatsResponse(
@@ -178,80 +608,689 @@ def edit_chat_topic(chat_id: str, topic: str) -> ChatsResponse | Literal[False]:
     return False
 
 
+# ----------------------- PERSIST CHAT TURN -----------------------
+async def persist_turn(
+    write: Callable[[AsyncClientSession | None], Awaitable[TurnWriteResult]], description: str
+    ) -> TurnWriteResult:
+    """
+    Run a turn's writes, in a multi-document transaction when MONGO_TRANSACTIONS is on.
+
+    Without a transaction `write` gets no session and records what it stored before
+    failing. In a transaction it raises instead, the transaction is rolled back (or retried
+    by pymongo for transient errors) and nothing of the turn is stored.
+    """
+    if MONGO_TRANSACTIONS:
+        try:
+            async with get_client().start_session() as session:
+                result = await session.with_transaction(write)
+        except PyMongoError as e:
+            result = TurnWriteResult(errors=[str(e)])
+    else:
+        result = await write(None)
+
+    if not result:
+        state = "partly stored" if result.partial else "not stored"
+        print(f"Turn of {description} {state}: {'; '.join(result.errors)}")
+
+    return result
+
+
+async def _insert_messages(messages: list[Message], result: TurnWriteResult, session: AsyncClientSession | None) -> None:
+    inserted = await messages_collection.insert_many(
+        [message.model_dump(by_alias=True) for message in messages], ordered=False, session=session)
+    result.messages_written += len(inserted.inserted_ids)
+
+
+def _record_write_error(result: TurnWriteResult, e: PyMongoError, session: AsyncClientSession | None) -> None:
+    # in a transaction the error has to reach with_transaction so it aborts
+    if session:
+        raise e
+
+    if isinstance(e, BulkWriteError):
+        result.messages_written += e.details.get("nInserted", 0)
+        result.errors.extend(error.get("errmsg", "") for error in e.details.get("writeErrors", []))
+    else:
+        result.errors.append(str(e))
+
+
 # ----------------------- INSERT EXISTING CHAT -----------------------
-def insert_existing_chats(new_prompt: ClientChat, response: MessageModel, updated_chat: Chats, summary: Summaries | None = None):
-    new_prompt = Message(
-        id=ObjectId(),
-        chat_id=ObjectId(new_prompt.chat_id),
-        role=new_prompt.role,
-        content=new_prompt.content,
-        timestamp=datetime.now(timezone.utc)
+async def insert_existing_chats(new_prompt: ClientChat, response: MessageModel, updated_chat: Chats) -> TurnWriteResult:
+    """
+    Store a turn of an existing chat: update the chat, then insert the prompt and the
+    response in one insert_many.
+
+    :return: What was stored, falsy unless the whole turn was.
+    """
+    async def write(session: AsyncClientSession | None) -> TurnWriteResult:
+        result = TurnWriteResult(messages_expected=2)
+        try:
+            # allocate the next two message numbers atomically while updating the chat
+            chat = await chats_collection.find_one_and_update(
+                {"_id": updated_chat.id, **NOT_DELETED},
+                {
+                    "$inc": {"message_seq": 2},
+                    "$set": {
+                        # summarised_messages is owned by the summary worker
+                        "total_conversations": updated_chat.total_conversations,
+                        "last_updated": updated_chat.last_updated
+                    }
+                },
+                projection={"message_seq": 1},
+                return_document=ReturnDocument.AFTER,
+                upsert=False,
+                session=session
+            )
+        except PyMongoError as e:
+            _record_write_error(result, e, session)
+            return result
+
+        if not chat:
+            result.errors.append("chat not found")
+            return result
+        result.chat_written = True
+
+        new_prompt_message = Message(
+            id=ObjectId(),
+            chat_id=updated_chat.id,
+            seq=chat["message_seq"] - 1,
+            role=new_prompt.role,
+            content=new_prompt.content,
+            timestamp=datetime.now(timezone.utc)
+        )
+
+        response_message = Message(
+            id=ObjectId(),
+            chat_id=updated_chat.id,
+            seq=chat["message_seq"],
+            role=response.role,
+            content=response.content,
+            timestamp=datetime.now(timezone.utc)
+        )
+
+        try:
+            await _insert_messages([new_prompt_message, response_message], result, session)
+        except PyMongoError as e:
+            _record_write_error(result, e, session)
+
+        return result
+
+    return await persist_turn(write, f"chat {updated_chat.id}")
+
+
+# ----------------------- PREPARE CHAT TURN -----------------------
+async def prepare_chat_turn(prompt: ClientChat) -> ChatTurn:
+    """
+    Load what a turn in an existing chat needs and build the messages to send to the bot:
+    the summary of very long conversations (if any), the recent messages and the latest user prompt.
+
+    Raises:
+        HTTPException: If the chat was not found.
+    """
+    # chat details, latest summary and recent messages in one round trip
+    with span("chat_load"):
+        loaded = await load_chat_turn(prompt.chat_id)
+
+    if not loaded:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    chat_details, last_summary, window = loaded
+
+    # --------------- EXISTING CHATS ---------------
+    # messages are numbered 1..message_seq: case study = 50 messages
+    # 50 messages div 20 = 2 summaries + 10 recent raw messages
+    total_messages_count = chat_details.message_seq
+    should_have_summarised = total_messages_count//20 # 20 messages makeup 1 summary
+
+    # summaries are written by the background worker, use the newest one available
+    last_summary_index = last_summary.to_msg if last_summary else 0
+
+    if total_messages_count - last_summary_index >= 20:
+        # summarised by the summary worker, off the request path
+        with span("summary"):
+            await enqueue_summary(prompt.chat_id)
+
+    # messages not covered by the summary, but no more than the last full window of 20 and
+    # the incomplete one: while the worker catches up, the prompt stays bounded
+    raw_after = max(last_summary_index, (should_have_summarised - 1) * 20)
+    recent_raw = [
+        MessageModel(role=message["role"], content=message["content"])
+        for message in window if message["seq"] > raw_after
+    ]
+
+    # summary + recent raw messages + latest prompt.
+    latest_bot_prompt = MessageModel(
+        summary=last_summary.summary if last_summary else None,
+        role="user",
+        content=prompt.content
     )
+    recent_raw.append(latest_bot_prompt)
 
-    response = Message(
-        id=ObjectId(),
-        chat_id=ObjectId(new_prompt.chat_id),
-        role=response.role,
-        content=response.content,
-        timestamp=datetime.now(timezone.utc)
+    return ChatTurn(
+        chat=chat_details,
+        prompt_messages=recent_raw,
+        should_have_summarised=should_have_summarised,
+        last_summary=last_summary,
+        # the messages already stored that the client gets back after this turn
+        recent_messages=[
+            message_row(message) for message in window if message["seq"] > should_have_summarised * 20
+        ]
     )
 
 
-    inserted_prompt_id = messages_collection.insert_one(new_prompt.model_dump(by_alias=True)).inserted_id
-    inserted_response_id = messages_collection.insert_one(response.model_dump(by_alias=True)).inserted_id
+# ----------------------- SAVE CHAT TURN -----------------------
+async def save_chat_turn(prompt: ClientChat, response: MessageModel, turn: ChatTurn) -> list[dict] | None:
+    """
+    Store the prompt and the bot's response of a chat turn.
 
-    if summary:
-        inserted_summary_id = summaries_collection.insert_one(summary.model_dump(by_alias=True)).inserted_id
-    
-    chats_update = chats_collection.update_one(
-        {"_id": updated_chat.id},
+    :return: The last 20 prompts and responses (that's 40 messages) as MessageModel-shaped rows,
+        or None if the chat was not updated.
+    """
+    chat_details = turn.chat
+
+    # -------- update chat model with details to store in db -------
+    updated_chat_details = Chats(
+        id=chat_details.id,
+        user_id=chat_details.user_id,
+        topic=chat_details.topic,
+        total_conversations=chat_details.total_conversations + 1,
+        summarised_messages=chat_details.summarised_messages,
+        created_at=chat_details.created_at,
+        last_updated=datetime.now(timezone.utc)
+    )
+
+    # store chat, message and response details in db
+    with span("chat_save"):
+        status = await insert_existing_chats(
+            new_prompt=prompt,
+            response=response,
+            updated_chat=updated_chat_details
+        )
+
+    # return last 20 prompts and responses to client (that's 40 messages),
+    # built from the window loaded for the turn instead of reading it again
+    if status:
+        return turn.recent_messages + [
+            {"summary": None, "role": "user", "content": prompt.content},
+            {"summary": None, "role": "assistant", "content": response.content}
+        ]
+    return None
+
+
+# ----------------------- SUMMARISE CHAT (BACKGROUND JOB) -----------------------
+# Summary workers of every process may be handed the same chat, so a worker claims the
+# chat's next window with a lease stored on the chat before asking the RAG API for it.
+SUMMARY_LEASE = timedelta(minutes=5)  # a crashed worker's claim expires after this, longer than a RAG call
+
+
+async def _claim_summary_window(chat_id: str, holder: str) -> bool:
+    """
+    Claim, or extend our claim on, summarising a chat.
+
+    :return: False if another worker holds the claim.
+    """
+    now = datetime.now(timezone.utc)
+    claimed = await chats_collection.update_one(
         {
-            "$set": {
-                "total_conversations": updated_chat.total_conversations,
-                "summarised_messages": updated_chat.summarised_messages,
-                "last_updated": updated_chat.last_updated
-            }
+            "_id": ObjectId(chat_id),
+            "$or": [
+                {"summary_lease": {"$exists": False}},
+                {"summary_lease.until": {"$lt": now}},
+                {"summary_lease.holder": holder},
+            ]
         },
-        upsert=False
+        {"$set": {"summary_lease": {"holder": holder, "until": now + SUMMARY_LEASE}}}
     )
-    
-    if inserted_prompt_id and inserted_response_id and chats_update.modified_count == 1:
-        return True
+    return claimed.matched_count == 1
+
+
+async def summarize_chat(chat_id: str) -> int:
+    """
+    Summarise every complete window of 20 messages not yet covered by a summary.
+    Run by the summary worker, never on the request path.
+
+    :param chat_id: The ID of the chat to summarise.
+    :return: The number of summaries written.
+    """
+    written = 0
+    chat_details = await get_chat_by_id(chat_id)
+    if not chat_details:
+        return written
+
+    holder = uuid.uuid4().hex
+    if not await _claim_summary_window(chat_id, holder):
+        return written
+
+    try:
+        return await _summarize_claimed_chat(chat_id, chat_details.message_seq, holder)
+    finally:
+        await chats_collection.update_one(
+            {"_id": ObjectId(chat_id), "summary_lease.holder": holder}, {"$unset": {"summary_lease": ""}})
+
+
+async def _summarize_claimed_chat(chat_id: str, total_messages_count: int, holder: str) -> int:
+    written = 0
+    # read once the chat is claimed, so a summary written meanwhile is seen
+    last_summary = await get_last_summary(chat_id)
+    last_summary_index = last_summary.to_msg if last_summary else 0
+    first_window_start = last_summary_index
+
+    while total_messages_count - last_summary_index >= 20:
+        # extend the claim for each further window
+        if last_summary_index != first_window_start and not await _claim_summary_window(chat_id, holder):
+            break
+
+        # get unsammarised messages and summarize
+        to_summarize = await get_chat_messages(chat_id, after_seq=last_summary_index, to_seq=last_summary_index + 20)
+        summary_prompt = MessageModel(
+            role="user",
+            content="Summarize the conversations above: \n\n"
+        )
+        to_summarize.append(summary_prompt)
+        summary = await query_rag_api(to_summarize, use_cache=False, priority=Priority.SUMMARY)
+
+        if not summary.content:
+            break
+
+        new_summary = Summaries(
+            id=ObjectId(),
+            chat_id=ObjectId(chat_id),
+            summary=summary.content,
+            from_msg=last_summary_index + 1,
+            to_msg=last_summary_index + 20,
+            created_at=datetime.now(timezone.utc)
+        )
+        try:
+            await summaries_collection.insert_one(new_summary.model_dump(by_alias=True))
+            written += 1
+        except DuplicateKeyError:
+            pass  # written by a worker whose claim had expired, the window is done all the same
+        await chats_collection.update_one(
+            {"_id": ObjectId(chat_id)},
+            {"$max": {"summarised_messages": new_summary.to_msg}},
+            upsert=False
+        )
+
+        last_summary_index = new_summary.to_msg
+
+    return written
 
-    return False
 
 # ----------------------- GET CHAT BY ID FROM DB -----------------------
-def get_chat_by_id(chat_id: str) -> Chats | None:
+def _chat_from_doc(chat_details: dict) -> Chats:
+    return Chats(
+        id=chat_details["_id"],
+        user_id=chat_details["user_id"],
+        topic=chat_details["topic"],
+        total_conversations=chat_details.get("total_conversations", 0),
+        summarised_messages=chat_details.get("summarised_messages", 0),
+        message_seq=chat_details.get("message_seq"),
+        created_at=chat_details["created_at"],
+        last_updated=chat_details["last_updated"]
+    )
+
+
+def _summary_from_doc(summary: dict) -> Summaries:
+    return Summaries(
+        id=summary["_id"],
+        chat_id=summary["chat_id"],
+        summary=summary["summary"],
+        from_msg=summary["from_msg"],
+        to_msg=summary["to_msg"],
+        created_at=summary["created_at"]
+    )
+
+
+async def get_chat_by_id(chat_id: str) -> Chats | None:
     """
     Retrieve a chat from the database by ID.
 
     :param chat_id: The ID of the chat to retrieve.
     :return: The chat as a dictionary, or None if the chat does not exist.
     """
-    chat_details: dict = chats_collection.find_one({"_id": ObjectId(chat_id)})
+    chat_details: dict = await chats_collection.find_one({"_id": ObjectId(chat_id), **NOT_DELETED})
 
     if chat_details:
-        chat = Chats(
-            id=chat_details["_id"],
-            user_id=chat_details["user_id"],
-            topic=chat_details["topic"],
-            total_conversations=chat_details.get("total_conversations", 0),
-            summarised_messages=chat_details.get("summarised_messages", 0),
-            created_at=chat_details["created_at"],
-            last_updated=chat_details["last_updated"]
-        )
+        chat = _chat_from_doc(chat_details)
+
+        # chats from before message sequence numbers
+        if chat.message_seq is None:
+            chat.message_seq = await backfill_chat_seq(chat.id)
 
         return chat
     return None
 
 
-def delete_chat(id: str) -> bool:
-    # delete chat if it exists
-    messages_deletion = messages_collection.delete_many({"chat_id": ObjectId(id)})
-    summaries_deletion = summaries_collection.delete_many({"chat_id": ObjectId(id)})
-    chat_deletion = chats_collection.delete_one({"_id": ObjectId(id)})
+# ----------------------- LOAD CHAT TURN FROM DB -----------------------
+async def load_chat_turn(chat_id: str) -> tuple[Chats, Summaries | None, list[dict]] | None:
+    """
+    Load everything a turn in an existing chat reads in a single aggregation: the chat,
+    its latest summary and its messages from the start of whichever comes first, the
+    messages the summary does not cover or the last (incomplete) window of 20. Messages
+    before the last full window of 20 are never read, however far the summary lags.
+
+    :param chat_id: The ID of the chat.
+    :return: (chat, last summary, messages as {"seq", "role", "content"} in seq order),
+        or None if the chat does not exist.
+    """
+    pipeline = [
+        {"$match": {"_id": ObjectId(chat_id), **NOT_DELETED}},
+        {"$lookup": {
+            "from": "summaries",
+            "let": {"chat_id": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$chat_id", "$$chat_id"]}}},
+                {"$sort": {"created_at": -1}},
+                {"$limit": 1},
+            ],
+            "as": "last_summary",
+        }},
+        {"$set": {"last_summary": {"$first": "$last_summary"}}},
+        {"$set": {"full_windows_end": {
+            "$multiply": [{"$floor": {"$divide": [{"$ifNull": ["$message_seq", 0]}, 20]}}, 20]
+        }}},
+        {"$set": {"window_start": {"$min": [
+            {"$max": [{"$ifNull": ["$last_summary.to_msg", 0]}, {"$subtract": ["$full_windows_end", 20]}]},
+            "$full_windows_end",
+        ]}}},
+        {"$lookup": {
+            "from": "messages",
+            "let": {"chat_id": "$_id", "after": "$window_start"},
+            "pipeline": [
+                # the plain $exists lets the partial messages_chat_seq index serve the lookup
+                {"$match": {"seq": {"$exists": True}, "$expr": {"$and": [
+                    {"$eq": ["$chat_id", "$$chat_id"]},
+                    {"$gt": ["$seq", "$$after"]},
+                ]}}},
+                {"$sort": {"seq": 1}},
+                {"$project": {"_id": 0, "seq": 1, "role": 1, "content": 1}},
+            ],
+            "as": "messages",
+        }},
+    ]
+
+    cursor = await chats_collection.aggregate(pipeline)
+    chat_details = await cursor.to_list(1)
+    if not chat_details:
+        return None
+    chat_details = chat_details[0]
+
+    # chats from before message sequence numbers have no seq to window by yet
+    if chat_details.get("message_seq") is None:
+        await backfill_chat_seq(chat_details["_id"])
+        return await load_chat_turn(chat_id)
+
+    last_summary = chat_details.get("last_summary")
+    return (
+        _chat_from_doc(chat_details),
+        _summary_from_doc(last_summary) if last_summary else None,
+        chat_details["messages"]
+    )
+
+
+# ----------------------- DELETE CHATS -----------------------
+async def delete_chat(id: str) -> bool:
+    """
+    Delete a chat. The chat is tombstoned and hidden at once, its messages and summaries
+    are removed in the background by the chat reaper.
+
+    :return: True if the chat existed and was not already deleted.
+    """
+    chat_deletion = await chats_collection.update_one(
+        {"_id": ObjectId(id), **NOT_DELETED},
+        {"$set": {"deleted_at": datetime.now(timezone.utc)}}
+    )
 
-    if chat_deletion.deleted_count == 1:
+    if chat_deletion.modified_count == 1:
+        wake_reaper()
         return True
 
     return False
+
+
+async def delete_user_chats(user_id: str) -> int:
+    """
+    Delete all chats of a user, the same way delete_chat deletes one.
+
+    :return: The number of chats deleted.
+    """
+    chats_deletion = await chats_collection.update_many(
+        {"user_id": ObjectId(user_id), **NOT_DELETED},
+        {"$set": {"deleted_at": datetime.now(timezone.utc)}}
+    )
+
+    if chats_deletion.modified_count:
+        wake_reaper()
+
+    return chats_deletion.modified_count
+
+
+async def get_chat_state(chat_id: str) -> Literal["live", "backfilled"] | None:
+    """
+    Whether a chat exists and has not been deleted; its messages outlive it until reaped.
+
+    A chat from before message sequence numbers is numbered here, so its messages can be
+    read by seq; "backfilled" tells the caller that messages it read alongside have to be
+    read again.
+
+    :return: None if the chat doesn't exist or was deleted.
+    """
+    chat = await chats_collection.find_one({"_id": ObjectId(chat_id), **NOT_DELETED}, {"message_seq": 1})
+    if chat is None:
+        return None
+
+    if chat.get("message_seq") is None:
+        await backfill_chat_seq(chat["_id"])
+        return "backfilled"
+
+    return "live"
+
+
+# ----------------------- GET USER'S CHATS FROM DB -----------------------
+# only what ChatsResponse needs, not whatever else accumulates on a chat document
+CHAT_LIST_PROJECTION = {
+    "user_id": 1, "topic": 1, "total_conversations": 1, "summarised_messages": 1,
+    "created_at": 1, "last_updated": 1
+}
+
+
+def chat_row(chat: dict) -> dict:
+    """
+    A chat document as a ChatsResponse-shaped row, for responses served without validation.
+    """
+    return {
+        "id": str(chat["_id"]),
+        "user_id": str(chat["user_id"]),
+        "topic": chat["topic"],
+        "total_conversations": chat.get("total_conversations", 0),
+        "summarised_messages": chat.get("summarised_messages", 0),
+        "created_at": chat["created_at"],
+        "last_updated": chat["last_updated"]
+    }
+
+
+def _user_chats_query(user_id: str, since: datetime | None) -> dict:
+    query = {"user_id": ObjectId(user_id), **NOT_DELETED}
+    if since:
+        query["last_updated"] = {"$gt": since}
+    return query
+
+
+async def get_user_chats(user_id: str, since: datetime | None = None) -> list[dict]:
+    """
+    Retrieve all chats of a user from the database, most recently updated first.
+
+    :param user_id: The ID of the user whose chats to retrieve.
+    :param since: Only chats updated after this, for refreshing a list the client already has.
+    :return: A list of the user's chats as ChatsResponse-shaped rows.
+    """
+    user_chats = chats_collection.find(
+        _user_chats_query(user_id, since), CHAT_LIST_PROJECTION).sort([("last_updated", -1), ("_id", -1)])
+
+    return [chat_row(chat) async for chat in user_chats]
+
+
+# ----------------------- GET USER'S CHATS BY CURSOR -----------------------
+def encode_chat_cursor(chat: dict) -> str:
+    position = {"last_updated": chat["last_updated"].isoformat(), "id": str(chat["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_chat_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position["last_updated"]), ObjectId(position["id"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_user_chats_page(
+    user_id: str, limit: int, cursor: str | None = None, since: datetime | None = None
+    ) -> tuple[list[dict], str | None]:
+    """
+    Retrieve a page of a user's chats, most recently updated first, by keyset on
+    (last_updated, _id) so deep pages cost the same as the first one.
+
+    :param user_id: The ID of the user whose chats to retrieve.
+    :param limit: The maximum number of chats to return.
+    :param cursor: Position to page from, None for the most recently updated chats.
+    :param since: Only chats updated after this.
+    :return: (chats as ChatsResponse-shaped rows, next_cursor), where next_cursor is None on the last page.
+    """
+    query = _user_chats_query(user_id, since)
+
+    if cursor:
+        last_updated, chat_id = decode_chat_cursor(cursor)
+        query["$or"] = [
+            {"last_updated": {"$lt": last_updated}},
+            {"last_updated": last_updated, "_id": {"$lt": chat_id}}
+        ]
+
+    # one extra row tells whether there is another page
+    rows = await chats_collection.find(query, CHAT_LIST_PROJECTION).sort(
+        [("last_updated", -1), ("_id", -1)]).limit(limit + 1).to_list()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # rows can be empty with has_more only for a limit below 1
+    next_cursor = encode_chat_cursor(rows[-1]) if has_more and rows else None
+
+    return [chat_row(row) for row in rows], next_cursor
+
+
+# ----------------------- GET CHAT MESSAGES FROM DB -----------------------
+MESSAGE_PROJECTION = {"_id": 0, "seq": 1, "role": 1, "content": 1}
+
+
+def message_row(message: dict) -> dict:
+    """
+    A message document as a MessageModel-shaped row, for responses served without validation.
+    """
+    return {"summary": None, "role": message["role"], "content": message["content"]}
+
+
+async def get_chat_message_rows(chat_id: str, after_seq: int = 0, limit: int = 0, to_seq: int | None = None) -> list[dict]:
+    """
+    Retrieve the messages of a chat in conversation order, by a range of their sequence numbers.
+
+    :param chat_id: The ID of the chat.
+    :param after_seq: Only messages numbered after this, 0 means from the start of the chat.
+    :param limit: The maximum number of messages to return, 0 means no limit.
+    :param to_seq: Only messages numbered up to and including this.
+    :return: A list of the chat's messages as MessageModel-shaped rows.
+    """
+    seq_range = {"$gt": after_seq}
+    if to_seq is not None:
+        seq_range["$lte"] = to_seq
+
+    messages = messages_collection.find(
+        {"chat_id": ObjectId(chat_id), "seq": seq_range}, MESSAGE_PROJECTION).sort("seq", 1).limit(limit)
+
+    return [message_row(message) async for message in messages]
+
+
+async def get_chat_messages(chat_id: str, after_seq: int = 0, limit: int = 0, to_seq: int | None = None) -> list[MessageModel]:
+    """
+    Like get_chat_message_rows, as MessageModel objects.
+    """
+    rows = await get_chat_message_rows(chat_id, after_seq=after_seq, limit=limit, to_seq=to_seq)
+    return [MessageModel.model_construct(**row) for row in rows]
+
+
+# ----------------------- GET CHAT MESSAGES BY CURSOR -----------------------
+def encode_message_cursor(message: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"seq": message["seq"]}).encode()).decode()
+
+
+def decode_message_cursor(cursor: str) -> int:
+    """
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["seq"])
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_chat_messages_page(
+    chat_id: str, limit: int, cursor: str | None = None, direction: Literal["older", "newer"] = "newer"
+    ) -> tuple[list[dict], str | None, str | None]:
+    """
+    Retrieve a page of a chat's messages by keyset on their sequence numbers, so deep pages cost
+    the same as the first one. Messages are always returned in conversation order.
+
+    :param chat_id: The ID of the chat.
+    :param limit: The maximum number of messages to return.
+    :param cursor: Position to page from. Without one, "newer" starts at the first message
+        of the chat and "older" at the latest.
+    :param direction: "newer" for messages after the cursor, "older" for messages before it.
+    :return: (messages as MessageModel-shaped rows, next_cursor, prev_cursor), where next_cursor loads newer messages and
+        prev_cursor loads older ones. A cursor is None when there is nothing more that way.
+    """
+    older = direction == "older"
+    query = {"chat_id": ObjectId(chat_id), "seq": {"$exists": True}}
+
+    if cursor:
+        query["seq"] = {"$lt" if older else "$gt": decode_message_cursor(cursor)}
+
+    # one extra row tells whether there is another page in this direction
+    rows = await messages_collection.find(query, MESSAGE_PROJECTION).sort("seq", -1 if older else 1).limit(limit + 1).to_list()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if older:
+        rows.reverse()
+
+    if not rows:
+        return [], None, None
+
+    # paging from a cursor means there are messages on its other side
+    has_newer = has_more if not older else bool(cursor)
+    has_older = has_more if older else bool(cursor)
+
+    return (
+        [message_row(row) for row in rows],
+        encode_message_cursor(rows[-1]) if has_newer else None,
+        encode_message_cursor(rows[0]) if has_older else None,
+    )
+
+
+# ----------------------- GET LATEST SUMMARY FROM DB -----------------------
+async def get_last_summary(chat_id: str) -> Summaries | None:
+    """
+    Retrieve the most recent summary of a chat.
+
+    :param chat_id: The ID of the chat.
+    :return: The latest summary, or None if the chat has not been summarised yet.
+    """
+    last_summary: dict = await summaries_collection.find_one(
+        {"chat_id": ObjectId(chat_id)}, sort=[("created_at", -1)])
+
+    if last_summary:
+        return _summary_from_doc(last_summary)
+    return None
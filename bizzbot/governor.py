@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator
+from config import RAG_MAX_IN_FLIGHT, RAG_QUEUE_TIMEOUT, RAG_TIMEOUT
+from bizzbot import resilience
+from metrics import Histogram
+
+
+# Caps the RAG calls a worker has in flight. Calls over the cap wait in a priority queue,
+# so a user waiting on an answer goes ahead of topic suggestions and background summaries.
+# A call's RAG_TIMEOUT deadline starts when it asks for a slot, so time in the queue counts
+# against it. A call is shed instead of sent when it waited RAG_QUEUE_TIMEOUT, or when what
+# is left of its deadline is shorter than a typical (median) call takes.
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    TOPIC = 1
+    SUMMARY = 2
+
+
+class ShedError(Exception):
+    def __init__(self, priority: Priority, reason: str):
+        super().__init__(f"RAG call ({priority.name.lower()}) shed: {reason}")
+        self.priority = priority
+
+
+rag_queue_wait_seconds = Histogram(
+    "bizzbot_rag_queue_wait_seconds", "Time RAG calls waited for a slot, by priority", ("priority",))
+
+
+class Governor:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self.stats = {
+            priority.name.lower(): {"queued": 0, "shed": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for priority in Priority
+        }
+
+    def _grant_next(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._grant_next()
+
+    async def acquire(self, priority: Priority) -> float:
+        """
+        Take a slot, waiting in the queue when the worker is at its cap.
+
+        :return: The seconds left of the call's RAG_TIMEOUT deadline, to pass to call_rag.
+
+        Raises:
+            ShedError: If the call is shed instead of sent.
+        """
+        if self.limit <= 0 or (self.in_flight < self.limit and not self._waiters):
+            self.in_flight += 1
+            rag_queue_wait_seconds.observe(0, priority=priority.name.lower())
+            return RAG_TIMEOUT
+
+        stats = self.stats[priority.name.lower()]
+        stats["queued"] += 1
+        queued_at = time.monotonic()
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        try:
+            async with asyncio.timeout(RAG_QUEUE_TIMEOUT):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # granted right as we gave up, pass the slot on
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, TimeoutError):
+                stats["shed"] += 1
+                raise ShedError(priority, f"waited {RAG_QUEUE_TIMEOUT}s in the queue")
+            raise
+        finally:
+            waited = time.monotonic() - queued_at
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            rag_queue_wait_seconds.observe(waited, priority=priority.name.lower())
+
+        remaining = RAG_TIMEOUT - waited
+        typical = resilience.rag_latency.percentile(50)
+        if remaining <= 0 or (typical is not None and remaining < typical):
+            self.release()
+            stats["shed"] += 1
+            raise ShedError(priority, "not enough of its deadline left")
+        return remaining
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[float]:
+        """
+        Hold a slot for the block, which gets the seconds left of the call's deadline.
+        """
+        remaining = await self.acquire(priority)
+        try:
+            yield remaining
+        finally:
+            self.release()
+
+    def queue_stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": sum(not waiter.done() for _, _, waiter in self._waiters),
+            **{
+                name: {
+                    "queued": stats["queued"],
+                    "shed": stats["shed"],
+                    "avg_wait": round(stats["total_wait"] / stats["queued"], 3) if stats["queued"] else 0.0,
+                    "max_wait": round(stats["max_wait"], 3),
+                }
+                for name, stats in self.stats.items()
+            },
+        }
+
+
+rag_governor = Governor(RAG_MAX_IN_FLIGHT)
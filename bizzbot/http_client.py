@@ -0,0 +1,114 @@
+import asyncio
+from importlib.util import find_spec
+from urllib.parse import urlsplit
+import httpx
+from config import (
+    RAG_API_URL, RAG_TIMEOUT, RAG_CONNECT_TIMEOUT, RAG_READ_TIMEOUT, RAG_MAX_CONNECTIONS, RAG_MAX_KEEPALIVE_CONNECTIONS,
+    RAG_KEEPALIVE_EXPIRY, RAG_HTTP2, RAG_WARMUP_URL, RAG_WARMUP_INTERVAL
+)
+
+
+# one pooled client per worker process, owned by the app lifespan in main.py
+rag_client: httpx.AsyncClient | None = None
+warmup_task: asyncio.Task | None = None
+
+
+def _timeout() -> httpx.Timeout:
+    # per-phase limits; the total deadline of a call is enforced by bizzbot.resilience
+    return httpx.Timeout(RAG_TIMEOUT, connect=RAG_CONNECT_TIMEOUT, read=RAG_READ_TIMEOUT)
+
+
+def _warmup_url() -> str:
+    """
+    URL pinged to wake the RAG upstream. Defaults to the origin of RAG_API_URL.
+    """
+    if RAG_WARMUP_URL:
+        return RAG_WARMUP_URL
+
+    url = urlsplit(RAG_API_URL)
+    return f"{url.scheme}://{url.netloc}/"
+
+
+# ----------------------- CLIENT LIFECYCLE -----------------------
+async def start_rag_client() -> httpx.AsyncClient:
+    """
+    Create the shared RAG client, warm the upstream up and start the periodic warm-up.
+    """
+    global rag_client, warmup_task
+
+    http2 = RAG_HTTP2
+    if http2 and find_spec("h2") is None:
+        print("RAG_HTTP2 is enabled but the 'h2' package is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    rag_client = httpx.AsyncClient(
+        timeout=_timeout(),
+        limits=httpx.Limits(
+            max_connections=RAG_MAX_CONNECTIONS,
+            max_keepalive_connections=RAG_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=RAG_KEEPALIVE_EXPIRY,
+        ),
+        http2=http2,
+    )
+
+    if RAG_API_URL:
+        # don't hold up startup on a cold upstream
+        warmup_task = asyncio.create_task(_warmup_loop())
+
+    return rag_client
+
+
+async def close_rag_client() -> None:
+    """
+    Stop the warm-up loop and close the shared RAG client.
+    """
+    global rag_client, warmup_task
+
+    if warmup_task:
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+        warmup_task = None
+
+    if rag_client:
+        await rag_client.aclose()
+        rag_client = None
+
+
+def get_rag_client() -> httpx.AsyncClient:
+    """
+    Return the shared RAG client, creating one lazily when running outside the app lifespan.
+    """
+    global rag_client
+
+    if rag_client is None:
+        rag_client = httpx.AsyncClient(timeout=_timeout())
+
+    return rag_client
+
+
+# ----------------------- WARM-UP -----------------------
+async def warm_up_rag_api() -> bool:
+    """
+    Ping the RAG upstream so it is awake before real traffic arrives.
+    Any HTTP response counts as warm, only transport errors are failures.
+    """
+    try:
+        await get_rag_client().get(_warmup_url())
+        return True
+    except httpx.HTTPError as e:
+        print(f"RAG warm-up ping failed: {e}")
+        return False
+
+
+async def _warmup_loop() -> None:
+    await warm_up_rag_api()
+
+    if RAG_WARMUP_INTERVAL <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(RAG_WARMUP_INTERVAL)
+        await warm_up_rag_api()
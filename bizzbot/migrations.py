@@ -0,0 +1,66 @@
+import asyncio
+from bson import ObjectId
+from pymongo import UpdateOne
+from auth.db_connection import chats_collection, messages_collection
+
+
+# Chats created before per-chat message sequence numbers have no `message_seq` and
+# their messages no `seq`. Such a chat is backfilled the first time its messages are
+# read or it gets a new message, and the whole collection can be migrated ahead of time with:
+#     uv run python -m bizzbot.migrations
+BACKFILL_BATCH_SIZE = 500
+
+
+async def backfill_chat_seq(chat_id: ObjectId) -> int:
+    """
+    Number a legacy chat's messages 1..n in (timestamp, _id) order and store n as the
+    chat's message_seq. Chats that already have a message_seq are left alone.
+
+    :param chat_id: The ID of the chat to backfill.
+    :return: The chat's message_seq.
+    """
+    chat = await chats_collection.find_one({"_id": chat_id}, {"message_seq": 1})
+    if chat and chat.get("message_seq") is not None:
+        return chat["message_seq"]
+
+    seq = 0
+    batch = []
+    messages = messages_collection.find({"chat_id": chat_id}, {"_id": 1}).sort([("timestamp", 1), ("_id", 1)])
+
+    async for message in messages:
+        seq += 1
+        batch.append(UpdateOne({"_id": message["_id"]}, {"$set": {"seq": seq}}))
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            await messages_collection.bulk_write(batch, ordered=False)
+            batch = []
+
+    if batch:
+        await messages_collection.bulk_write(batch, ordered=False)
+
+    # only set if still missing, in case another worker backfilled the chat meanwhile
+    await chats_collection.update_one(
+        {"_id": chat_id, "message_seq": {"$exists": False}},
+        {"$set": {"message_seq": seq}}
+    )
+
+    return seq
+
+
+async def backfill_all_chats() -> int:
+    """
+    Backfill every chat that has no message_seq yet.
+
+    :return: The number of chats backfilled.
+    """
+    backfilled = 0
+    chats = chats_collection.find({"message_seq": {"$exists": False}}, {"_id": 1})
+
+    async for chat in chats:
+        await backfill_chat_seq(chat["_id"])
+        backfilled += 1
+
+    return backfilled
+
+
+if __name__ == "__main__":
+    print(f"Backfilled message sequence numbers for {asyncio.run(backfill_all_chats())} chats")
@@ -1,11 +1,13 @@
 from datetime import datetime
 from bson import ObjectId
 from pydantic import BaseModel, Field
+from bizzbot.schemas import MessageModel
 
 
 class Message(BaseModel):
     id: ObjectId = Field(alias="_id")
     chat_id: ObjectId
+    seq: int  # position in the chat, allocated from Chats.message_seq
     role: str
     content: str
     timestamp: datetime
@@ -22,6 +24,7 @@ class Chats(BaseModel):
     topic: str
     total_conversations: int = 0
     summarised_messages: int = 0
+    message_seq: int | None = None  # last allocated message seq, None until a legacy chat is backfilled
     created_at: datetime
     last_updated: datetime
 
@@ -43,3 +46,38 @@ class Summaries(BaseModel):
             "arbitrary_types_allowed": True,
             "populate_by_name": True
         }
+
+
+# everything one chat turn needs, loaded before the RAG query and saved after it
+class ChatTurn(BaseModel):
+    chat: Chats
+    prompt_messages: list[MessageModel]
+    should_have_summarised: int
+    last_summary: Summaries | None = None
+    recent_messages: list[dict] = []  # MessageModel-shaped rows, returned to the client after the turn
+
+    model_config = {
+            "arbitrary_types_allowed": True
+        }
+
+
+class TurnWriteResult(BaseModel):
+    """
+    What a chat turn write stored. Without transactions a failure part-way through leaves
+    the turn partly stored; with them the turn is stored in full or not at all.
+    """
+    chat_written: bool = False
+    messages_expected: int = 0
+    messages_written: int = 0
+    errors: list[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return self.chat_written and self.messages_written == self.messages_expected
+
+    @property
+    def partial(self) -> bool:
+        return not self.ok and (self.chat_written or self.messages_written > 0)
+
+    def __bool__(self) -> bool:
+        return self.ok
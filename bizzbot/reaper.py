@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import PyMongoError
+from auth.db_connection import chats_collection, messages_collection, summaries_collection
+from config import CHAT_REAPER_BATCH_SIZE, CHAT_REAPER_BATCH_DELAY, CHAT_REAPER_INTERVAL
+
+
+# Deleting a chat only tombstones it (sets `deleted_at`), which hides it straight away.
+# The reaper started from the app lifespan removes its messages and summaries later in
+# small batches, then the chat itself. Chats are claimed with a lease stored on the chat,
+# so every worker can run a reaper without two of them reaping the same chat.
+REAP_LEASE = timedelta(minutes=5)  # a crashed worker's chat is picked up again after this
+
+reaper_task: asyncio.Task | None = None
+wake = asyncio.Event()
+
+stats = {
+    "chats_reaped": 0,
+    "messages_deleted": 0,
+    "summaries_deleted": 0,
+    "failed": 0,
+}
+
+
+def wake_reaper() -> None:
+    """
+    Start reaping now instead of at the next poll.
+    """
+    wake.set()
+
+
+# ----------------------- REAP -----------------------
+async def _claim_chat() -> dict | None:
+    now = datetime.now(timezone.utc)
+    return await chats_collection.find_one_and_update(
+        {
+            "deleted_at": {"$exists": True},
+            "$or": [{"reap_lease": {"$exists": False}}, {"reap_lease": {"$lt": now}}]
+        },
+        {"$set": {"reap_lease": now + REAP_LEASE}},
+        projection={"_id": 1}
+    )
+
+
+async def _delete_in_batches(collection: AsyncCollection, chat_id: ObjectId) -> int:
+    deleted = 0
+    while True:
+        batch = await collection.find({"chat_id": chat_id}, {"_id": 1}).limit(CHAT_REAPER_BATCH_SIZE).to_list()
+        if not batch:
+            return deleted
+
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        deleted += result.deleted_count
+        await asyncio.sleep(CHAT_REAPER_BATCH_DELAY)
+
+
+async def reap_chat(chat_id: ObjectId) -> None:
+    """
+    Delete a tombstoned chat's messages and summaries, then the chat.
+    """
+    stats["messages_deleted"] += await _delete_in_batches(messages_collection, chat_id)
+    stats["summaries_deleted"] += await _delete_in_batches(summaries_collection, chat_id)
+
+    # the tombstone goes last so an interrupted reap is picked up again
+    await chats_collection.delete_one({"_id": chat_id, "deleted_at": {"$exists": True}})
+    stats["chats_reaped"] += 1
+
+
+async def _reaper() -> None:
+    while True:
+        wake.clear()
+        try:
+            while chat := await _claim_chat():
+                await reap_chat(chat["_id"])
+        except PyMongoError as e:
+            stats["failed"] += 1
+            print(f"Chat reaper failed: {e}")
+
+        try:
+            await asyncio.wait_for(wake.wait(), CHAT_REAPER_INTERVAL)
+        except TimeoutError:
+            pass
+
+
+def start_chat_reaper() -> None:
+    global reaper_task
+
+    reaper_task = asyncio.create_task(_reaper())
+
+
+async def stop_chat_reaper() -> None:
+    global reaper_task
+
+    if reaper_task:
+        reaper_task.cancel()
+        await asyncio.gather(reaper_task, return_exceptions=True)
+        reaper_task = None
@@ -0,0 +1,266 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable
+import httpx
+from config import (
+    RAG_TIMEOUT, RAG_RETRY_ATTEMPTS, RAG_RETRY_BASE_DELAY, RAG_RETRY_MAX_DELAY, RAG_HEDGE_PERCENTILE,
+    RAG_BREAKER_FAILURE_THRESHOLD, RAG_BREAKER_RESET
+)
+from metrics import Counter, Histogram
+
+
+# Every call to the RAG upstream goes through call_rag, which adds bounded retries with
+# jittered backoff, optional hedged requests, a circuit breaker and a total deadline on
+# top of the client's connect and read timeouts (see bizzbot.http_client). The breaker
+# and latency window are per worker.
+RETRYABLE_STATUS = {429, 502, 503, 504}
+HEDGE_MIN_SAMPLES = 20  # latencies needed before hedging starts
+LATENCY_WINDOW = 200
+
+stats = {
+    "calls": 0,
+    "attempts": 0,
+    "retries": 0,
+    "hedges": 0,
+    "hedge_wins": 0,
+    "failures": 0,
+    "deadline_exceeded": 0,
+    "rejected_open": 0,
+}
+
+rag_call_seconds = Histogram(
+    "bizzbot_rag_call_duration_seconds", "RAG API calls, retries and hedges included", ("outcome",))
+rag_errors = Counter("bizzbot_rag_errors_total", "Failed RAG API attempts, by status code or error", ("reason",))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("RAG API circuit breaker is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed, calls go through. After `failure_threshold` consecutive failed calls it opens
+    and rejects calls for `reset_timeout` seconds, then lets a single trial call through:
+    success closes it again, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: If calls are being rejected.
+        """
+        if self.failure_threshold <= 0:
+            return
+
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(self.opened_at + self.reset_timeout - time.monotonic())
+        if state == "half_open":
+            if self.trial_in_flight:
+                raise CircuitOpenError(1)
+            self.trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def record_abandoned(self) -> None:
+        # a cancelled call says nothing about the upstream, let the next one be the trial
+        self.trial_in_flight = False
+
+
+class LatencyWindow:
+    """
+    The latencies of the last `size` successful requests.
+    """
+
+    def __init__(self, size: int):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def add(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def percentile(self, p: float) -> float | None:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+rag_breaker = CircuitBreaker(RAG_BREAKER_FAILURE_THRESHOLD, RAG_BREAKER_RESET)
+rag_latency = LatencyWindow(LATENCY_WINDOW)
+
+
+def is_retryable(e: httpx.HTTPError) -> bool:
+    # the RAG call has no side effects, so resending it after a lost connection is safe
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in RETRYABLE_STATUS
+    return isinstance(e, httpx.TransportError)
+
+
+def is_upstream_failure(e: httpx.HTTPError) -> bool:
+    # what counts against the breaker: a 4xx means the upstream is up and refused the
+    # request, any 5xx means it is failing even when resending wouldn't help
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or is_retryable(e)
+    return is_retryable(e)
+
+
+def backoff_delay(retry: int) -> float:
+    # "full jitter": spreads retries from many workers instead of synchronising them
+    return random.uniform(0, min(RAG_RETRY_MAX_DELAY, RAG_RETRY_BASE_DELAY * 2 ** retry))
+
+
+# ----------------------- ATTEMPTS -----------------------
+async def _attempt(send: Callable[[], Awaitable[httpx.Response]], track_latency: bool) -> httpx.Response:
+    stats["attempts"] += 1
+    started = time.monotonic()
+
+    try:
+        response = await send()
+    except httpx.HTTPError as e:
+        rag_errors.inc(reason=type(e).__name__)
+        raise
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        rag_errors.inc(reason=response.status_code)
+        await response.aclose()
+        raise
+
+    if track_latency:
+        rag_latency.add(time.monotonic() - started)
+    return response
+
+
+async def _hedged_attempt(send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """
+    One attempt, plus a duplicate request if the first is still running after the
+    RAG_HEDGE_PERCENTILE latency. The first to succeed wins, the other is cancelled.
+    """
+    delay = rag_latency.percentile(RAG_HEDGE_PERCENTILE) if RAG_HEDGE_PERCENTILE else None
+    if delay is None:
+        return await _attempt(send, track_latency=True)
+
+    first = asyncio.create_task(_attempt(send, track_latency=True))
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        stats["hedges"] += 1
+        hedge = asyncio.create_task(_attempt(send, track_latency=True))
+        pending.add(hedge)
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# ----------------------- CALL -----------------------
+async def call_rag(
+    send: Callable[[], Awaitable[httpx.Response]], hedge: bool = True, timeout: float | None = None
+    ) -> httpx.Response:
+    """
+    Send a request to the RAG upstream with retries, hedging, the circuit breaker and the
+    total RAG_TIMEOUT deadline. `send` makes one request and is called once per attempt.
+
+    :param hedge: False for requests that can't be duplicated, e.g. streams; they are
+        retried but never hedged and their latency isn't tracked.
+    :param timeout: What is left of the deadline, e.g. after waiting for a slot of
+        bizzbot.governor; RAG_TIMEOUT when not given.
+    :return: A successful (2xx) response.
+
+    Raises:
+        CircuitOpenError: If the breaker is open.
+        httpx.HTTPError: The last error once retries are exhausted, or TimeoutException
+            when the total deadline passes.
+    """
+    stats["calls"] += 1
+    try:
+        rag_breaker.before_call()
+    except CircuitOpenError:
+        stats["rejected_open"] += 1
+        raise
+
+    timeout = RAG_TIMEOUT if timeout is None else timeout
+    started = time.monotonic()
+    try:
+        async with asyncio.timeout(timeout):
+            for retry in range(RAG_RETRY_ATTEMPTS + 1):
+                try:
+                    response = await (_hedged_attempt(send) if hedge else _attempt(send, track_latency=False))
+                    rag_breaker.record_success()
+                    rag_call_seconds.observe(time.monotonic() - started, outcome="ok")
+                    return response
+                except httpx.HTTPError as e:
+                    if not is_retryable(e):
+                        if not is_upstream_failure(e):
+                            # the upstream is up, it refused this request
+                            rag_breaker.record_success()
+                        raise
+                    if retry == RAG_RETRY_ATTEMPTS:
+                        raise
+                    stats["retries"] += 1
+                    await asyncio.sleep(backoff_delay(retry))
+    except TimeoutError:
+        stats["deadline_exceeded"] += 1
+        stats["failures"] += 1
+        rag_breaker.record_failure()
+        rag_call_seconds.observe(time.monotonic() - started, outcome="timeout")
+        raise httpx.TimeoutException(f"RAG API call exceeded its {RAG_TIMEOUT}s deadline")
+    except httpx.HTTPError as e:
+        if is_upstream_failure(e):
+            stats["failures"] += 1
+            rag_breaker.record_failure()
+        rag_call_seconds.observe(time.monotonic() - started, outcome="error")
+        raise
+    except BaseException:
+        rag_breaker.record_abandoned()
+        raise
+
+
+def resilience_stats() -> dict[str, int | float | str | None]:
+    return {
+        **stats,
+        "breaker": rag_breaker.state,
+        "hedge_after": rag_latency.percentile(RAG_HEDGE_PERCENTILE) if RAG_HEDGE_PERCENTILE else None,
+    }
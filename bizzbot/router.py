@@ -1,20 +1,30 @@
-from datetime import datetime, timezone
+import asyncio
+from datetime import datetime
 from typing import Annotated, Literal
-from bson import ObjectId
 from fastapi import Depends, HTTPException, Query
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import httpx
 from auth.dependencies import get_current_user
-from auth.db_connection import messages_collection, summaries_collection, chats_collection
 from bizzbot.dependencies import (
-    create_new_chat, edit_chat_topic as edit_topic,
-    get_chat_by_id, get_chat_topic, insert_existing_chats, query_rag_api,
-    delete_chat as delete_chat_by_id
+    edit_chat_topic as edit_topic, query_rag_api,
+    start_chat_topic, save_new_chat,
+    delete_chat as delete_chat_by_id, delete_user_chats, get_chat_state,
+    get_user_chats as fetch_user_chats, get_user_chats_page as fetch_user_chats_page,
+    get_chat_message_rows as fetch_chat_message_rows, get_chat_messages_page as fetch_chat_messages_page,
+    prepare_chat_turn, save_chat_turn,
+    open_rag_stream, iter_rag_stream, close_rag_stream, format_sse
     )
-from bizzbot.models import Chats, Summaries
+from bizzbot.admission import admit, admit_current_user
 from bizzbot.schemas import MessageModel, ChatsResponse, ClientChat
-from config import RAG_API_URL
+from fast_json import fast_json_response
 
 
+TOPIC_EVENT_TIMEOUT = 30  # seconds a stream stays open waiting for a pending topic
+CHATS_PAGE_SIZE = 20  # /my-chats page size when paging by cursor without a page_size
+MAX_MESSAGES_PAGE_SIZE = 200  # largest page of messages one request can ask for
+
 bizzbot = APIRouter(
     prefix="/api/v1/bizzbot",
     tags=["bizzbot"],
@@ -23,30 +33,39 @@ bizzbot = APIRouter(
 
 # ----------------------- GET USER'S CHATS -----------------------
 @bizzbot.get("/my-chats")
-async def get_user_chats(user_id: Annotated[str, Depends(get_current_user)]) -> list[ChatsResponse]:
+async def get_user_chats(
+    user_id: Annotated[str, Depends(get_current_user)],
+    page_size: int | None = Query(None, ge=1, description="Page size/maximum number of results, all chats when not given"),
+    cursor: str | None = Query(None, description="Cursor from X-Next-Cursor of a previous page"),
+    since: datetime | None = Query(None, description="Only chats updated after this time"),
+    ) -> list[ChatsResponse]:
     """
-    Get all chats of a user.
+    Get the chats of a user, most recently updated first.
+
+    Returns all chats by default. Passing a page_size or a cursor pages by cursor instead:
+    the cursor for the next page is returned in the X-Next-Cursor header, and is left out
+    on the last page. `since` limits the chats to those updated after it, so a client can
+    refresh the list it already has.
 
     Args:
         user_id (str): user id
+        page_size (int, optional): Page size/maximum number of results.
+        cursor (str, optional): Position to page from.
+        since (datetime, optional): Only chats updated after this time.
 
     Returns:
         list[ChatsResponse]: a list of ChatsResponse objects
     """
-    user_chats = chats_collection.find({"user_id": ObjectId(user_id)})
-    user_chats = [
-        ChatsResponse(
-            id=str(chat["_id"]),
-            user_id=str(chat["user_id"]),
-            topic=chat["topic"],
-            total_conversations=chat["total_conversations"],
-            summarised_messages=chat["summarised_messages"],
-            created_at=chat["created_at"],
-            last_updated=chat["last_updated"]
-        ) for chat in user_chats
-    ]
+    if page_size or cursor:
+        user_chats, next_cursor = await fetch_user_chats_page(
+            user_id, limit=page_size or CHATS_PAGE_SIZE, cursor=cursor, since=since)
 
-    return user_chats
+        # rows straight from the db, served without per-item validation
+        return fast_json_response(user_chats, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+    user_chats = await fetch_user_chats(user_id, since=since)
+
+    return fast_json_response(user_chats)
 
 
 # ----------------------- GET USER'S CONVERSATIONS -----------------------
@@ -54,44 +73,84 @@ async def get_user_chats(user_id: Annotated[str, Depends(get_current_user)]) ->
 async def get_chat_messages(
     chat_id: str,
     user_id: Annotated[str, Depends(get_current_user)],
-    page_size: int = Query(40, description="Page size/maximum number of results"),
-    page_number: int = Query(1, description="Page number"),
+    page_size: int = Query(40, ge=1, le=MAX_MESSAGES_PAGE_SIZE, description="Page size/maximum number of results"),
+    page_number: int = Query(1, ge=1, description="Page number"),
+    cursor: str | None = Query(None, description="Cursor from X-Next-Cursor or X-Prev-Cursor of a previous page"),
+    direction: Literal["older", "newer"] | None = Query(None, description="Page by cursor: 'newer' or 'older' messages"),
     ) -> list[MessageModel]:
     """
     Get paginated messages of a chat.
 
+    Pages by page_number by default. Passing a cursor or a direction pages by cursor instead,
+    which stays fast on long chats: without a cursor, direction "newer" starts at the first
+    message and "older" at the latest. The cursors for the next pages are returned in the
+    X-Next-Cursor (newer messages) and X-Prev-Cursor (older messages) headers, and are left
+    out when there is nothing more that way.
+
     Args:
         chat_id (str): chat id
         user_id (str): user id
         page_size (int, optional): Page size/maximum number of results. Defaults to 40.
         page_number (int, optional): Page number. Defaults to 1.
+        cursor (str, optional): Position to page from.
+        direction (str, optional): "newer" or "older". Defaults to "newer" when a cursor is given.
 
     Returns:
         list[MessageModel]: a list of MessageModel objects
     """
+    if cursor or direction:
+        def read_page():
+            return fetch_chat_messages_page(chat_id, limit=page_size, cursor=cursor, direction=direction or "newer")
+
+        # a deleted chat's messages stay until reaped, check the chat alongside the read
+        state, (messages, next_cursor, prev_cursor) = await asyncio.gather(get_chat_state(chat_id), read_page())
+
+        if not state:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        if state == "backfilled":
+            # a legacy chat, numbered after the read ran
+            messages, next_cursor, prev_cursor = await read_page()
+
+        headers = {}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        if prev_cursor:
+            headers["X-Prev-Cursor"] = prev_cursor
+
+        # rows straight from the db, served without per-item validation
+        return fast_json_response(messages, headers=headers)
+
     skip = page_size * (page_number - 1)
-    messages = messages_collection.find({"chat_id": ObjectId(chat_id)}).sort("timestamp", 1).skip(skip).limit(page_size)
-    messages = [MessageModel(role=message["role"], content=message["content"]) for message in messages]
+    state, messages = await asyncio.gather(
+        get_chat_state(chat_id),
+        fetch_chat_message_rows(chat_id, after_seq=skip, limit=page_size)
+    )
+
+    if not state:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    if state == "backfilled":
+        messages = await fetch_chat_message_rows(chat_id, after_seq=skip, limit=page_size)
 
-    return messages
+    return fast_json_response(messages)
 
 
 # ----------------------- CHAT WITH BIZZBOT (NEW CHAT) -----------------------
 @bizzbot.post("/new-chat")
-async def start_new_chat(prompt: ClientChat, user_id: Annotated[str, Depends(get_current_user)]) -> list[bool | ChatsResponse | MessageModel] | None:
+async def start_new_chat(prompt: ClientChat, user_id: Annotated[str, Depends(admit_current_user)]) -> list[bool | ChatsResponse | MessageModel] | None:
     """
     Handles new chats with Bizzbot.
-    1. It gets the topic from the bot based on the prompt.
-    2. It queries the bot with the prompt.
-    3. It stores the chat and conversation details in DB.
+    1. It starts getting the topic from the bot based on the prompt.
+    2. At the same time, it queries the bot with the prompt.
+    3. It stores the chat and conversation details in DB as soon as the response is ready.
+       If the topic is still being generated, the chat is stored with the first words of the
+       prompt as its topic and updated once the topic is ready (visible in /my-chats).
     4. It returns the prompt and response to client.
 
     Response:
         A list of new chat details and MessageModel objects containing the prompt and response.
     """
-    # get topic for new chats
-    topic = await get_chat_topic(prompt, user_id)
-    topic = topic.topic
+    # get topic for new chats alongside the response
+    topic_task = start_chat_topic(prompt, user_id)
 
     # query bot with prompt
     bot_prompt = MessageModel(
@@ -99,15 +158,16 @@ async def start_new_chat(prompt: ClientChat, user_id: Annotated[str, Depends(get
         content=prompt.content
     )
 
-    response = await query_rag_api(bot_prompt)
+    try:
+        response = await query_rag_api(bot_prompt)
+    except BaseException:
+        # nothing is stored when the bot fails or the request is cancelled
+        if topic_task:
+            topic_task.cancel()
+        raise
 
     # store chat and message details in db
-    new_chat = create_new_chat(
-        user_id=user_id,
-        topic=topic,
-        user_prompt_text=prompt.content,
-        bot_response_text=response.content
-    )
+    new_chat, _ = await save_new_chat(prompt, user_id, topic_task, response.content)
 
     # return prompt and response to client
     client_response = [
@@ -119,6 +179,93 @@ async def start_new_chat(prompt: ClientChat, user_id: Annotated[str, Depends(get
     return client_response
 
 
+# ----------------------- CHAT WITH BIZZBOT (NEW CHAT, STREAMING) -----------------------
+@bizzbot.post("/new-chat/stream")
+async def stream_new_chat(prompt: ClientChat, user_id: Annotated[str, Depends(get_current_user)]) -> StreamingResponse:
+    """
+    Streaming variant of /new-chat using Server-Sent Events.
+
+    Events:
+        token: {"content": "..."} for every chunk of the response as it arrives from the bot.
+        done: the same list /new-chat returns, sent once the chat has been stored in DB.
+        topic: {"chat_id": "...", "topic": "..."} if the topic was still being generated when
+            the chat was stored, sent once it is ready.
+        error: {"detail": "..."} if the bot fails mid-stream, nothing is stored.
+
+    If the client disconnects before the response completes, the upstream request is closed and nothing is stored.
+    """
+    # per-user rate and concurrency limits, 429 when over them; the slot is held until the stream ends
+    release = await admit(user_id)
+
+    # get topic for new chats alongside the response
+    topic_task = start_chat_topic(prompt, user_id)
+
+    try:
+        upstream = await open_rag_stream(MessageModel(role="user", content=prompt.content))
+    except BaseException:
+        if topic_task:
+            topic_task.cancel()
+        await release()
+        raise
+
+    saving = False
+
+    async def save(response_text: str):
+        nonlocal saving
+        # set inside the shielded write: from here on save_new_chat owns topic_task and
+        # cancels it itself if the chat isn't stored, even when the client is gone
+        saving = True
+        return await save_new_chat(prompt, user_id, topic_task, response_text)
+
+    # idempotent: runs when the stream ends, and again from the response's background
+    # task, which Starlette skips when the stream fails and which alone runs when the
+    # client is gone before the stream starts
+    async def cleanup():
+        await close_rag_stream(upstream)
+        # the topic is only wanted if the chat it belongs to gets stored
+        if topic_task and not saving:
+            topic_task.cancel()
+        await release()
+
+    async def events():
+        try:
+            chunks = []
+            try:
+                async for delta in iter_rag_stream(upstream):
+                    chunks.append(delta)
+                    yield format_sse("token", {"content": delta})
+            except httpx.HTTPError as e:
+                yield format_sse("error", {"detail": f"Upstream API error: {e}"})
+                return
+
+            response_text = "".join(chunks)
+            # shielded so a disconnect right at the end can't interrupt the write
+            new_chat, pending_topic = await asyncio.shield(save(response_text))
+
+            yield format_sse("done", [
+                new_chat.model_dump(mode="json") if new_chat else False,
+                MessageModel(role="user", content=prompt.content).model_dump(),
+                MessageModel(role="assistant", content=response_text).model_dump()
+            ])
+
+            if pending_topic:
+                try:
+                    topic = await asyncio.wait_for(asyncio.shield(pending_topic), TOPIC_EVENT_TIMEOUT)
+                except TimeoutError:
+                    topic = None
+                if topic:
+                    yield format_sse("topic", {"chat_id": new_chat.id, "topic": topic})
+        finally:
+            await cleanup()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(cleanup)
+    )
+
+
 # ----------------------- EDIT CHAT TOPIC -----------------------
 @bizzbot.put("/edit-topic")
 async def edit_chat_topic(chat_id: str, topic: str, user_id: Annotated[str, Depends(get_current_user)]) -> ChatsResponse | Literal[True]:
@@ -136,7 +283,7 @@ async def edit_chat_topic(chat_id: str, topic: str, user_id: Annotated[str, Depe
     Raises:
         HTTPException: If the chat was not found.
     """
-    updated_chat = edit_topic(chat_id, topic)
+    updated_chat = await edit_topic(chat_id, topic)
 
     if not updated_chat:
         raise HTTPException(status_code=404, detail="Chat not found")
@@ -148,7 +295,8 @@ async def edit_chat_topic(chat_id: str, topic: str, user_id: Annotated[str, Depe
 @bizzbot.post("/")
 async def chat_with_bizzbot(
     prompt: ClientChat,
-    user_id: Annotated[str, Depends(get_current_user)],
+    # per-user rate and concurrency limits, 429 when over them
+    user_id: Annotated[str, Depends(admit_current_user)],
     # page_size: int = Query(40, description="Page size/maximum number of results"),
     # page_number: int = Query(1, description="Page number"),
     ) -> list[MessageModel] | None:
@@ -167,108 +315,73 @@ async def chat_with_bizzbot(
     """
     # skip = page_size * (page_number - 1)
 
-    # --------------- EXISTING CHATS ---------------
-    # retrieve all messages with chat_id: case study = 50 messages
-    # 50 messages div 20 = 2 summaries + 10 recent raw messages
-    total_messages_count = messages_collection.count_documents({"chat_id": ObjectId(prompt.chat_id)})
-    should_have_summarised = total_messages_count//20 # 20 messages makeup 1 summary
+    # load chat, summary and recent messages; summarise long chats
+    turn = await prepare_chat_turn(prompt)
 
-    # get chat details from db
-    chat_details = get_chat_by_id(prompt.chat_id)
+    # query bot with summary + recent raw messages + latest prompt.
+    response = await query_rag_api(turn.prompt_messages)
 
-    # initialised necessary variables to prevent UnboundLocalError
-    summary = MessageModel(role="user", content="")
-    recent_raw = []
-    try:
-        last_summary = summaries_collection.find(
-            {"chat_id": ObjectId(prompt.chat_id)}).sort("created_at", -1).limit(1)[0]
-    except IndexError:
-        last_summary = None
-    
-    if last_summary:
-        last_summary = Summaries(
-            id=last_summary["_id"],
-            chat_id=last_summary["chat_id"],
-            summary=last_summary["summary"],
-            from_msg=last_summary["from_msg"],
-            to_msg=last_summary["to_msg"],
-            created_at=last_summary["created_at"]
-        )
-
-    # check if chat's summary is updated
-    if chat_details.summarised_messages != should_have_summarised * 20:
-        last_summary_index = last_summary.to_msg if last_summary else 0
-
-        # get unsammarised messages and summarize
-        to_summarize = messages_collection.find(
-            {"chat_id": ObjectId(prompt.chat_id)}).sort("timestamp", 1).skip(last_summary_index).limit(20)
-        
-        to_summarize = [MessageModel(role=msg["role"], content=msg["content"]) for msg in to_summarize]
-        summary_prompt = MessageModel(
-            role="user",
-            content="Summarize the conversations above: \n\n"
-            # content="\n".join([msg.content for msg in to_summarize])
-        )
-        to_summarize.append(summary_prompt)
-        summary = await query_rag_api(to_summarize)
-    else:
-        # get recent raw messages
-        recent_raw = messages_collection.find(
-            {"chat_id": ObjectId(prompt.chat_id)}).sort("timestamp", 1).skip(should_have_summarised * 20)
-        
-        recent_raw = [MessageModel(
-            role=msg["role"], content=msg["content"]
-        ) for msg in recent_raw]
+    # store chat, message, response and summary details in db, and
+    # return last 20 prompts and responses to client (that's 40 messages)
+    last_messages = await save_chat_turn(prompt, response, turn)
 
-    # query bot with summary + recent raw messages + latest prompt.
-    latest_bot_prompt = MessageModel(
-        summary=summary.content if len(summary.content) > 0 else None,
-        role="user",
-        content=prompt.content
-    )
+    # rows built from the db window, served without per-item validation
+    return fast_json_response(last_messages)
 
-    recent_raw.append(latest_bot_prompt)
-    response = await query_rag_api(recent_raw)
-
-    # -------- update chat model with details to store in db -------
-    updated_chat_details = Chats(
-        id=chat_details.id,
-        user_id=chat_details.user_id,
-        topic=chat_details.topic,
-        total_conversations=chat_details.total_conversations + 1,
-        summarised_messages=should_have_summarised * 20,
-        created_at=chat_details.created_at,
-        last_updated=datetime.now(timezone.utc)
-    )
 
-    new_summary = None
-    if summary.content:
-        new_summary = Summaries(
-            id=ObjectId(),
-            chat_id=chat_details.id,
-            summary=summary.content,
-            from_msg=1 if not last_summary else last_summary.to_msg + 1,
-            to_msg=20 if not last_summary else last_summary.to_msg + 20,
-            created_at=datetime.now(timezone.utc)
-        )
-
-    # store chat, message, response and summary details in db
-    status = insert_existing_chats(
-        new_prompt=prompt,
-        response=response,
-        updated_chat=updated_chat_details,
-        summary=new_summary
-    )
+# ----------------------- CHAT WITH BIZZBOT (EXISTING CHATS, STREAMING) -----------------------
+@bizzbot.post("/stream")
+async def stream_chat_with_bizzbot(prompt: ClientChat, user_id: Annotated[str, Depends(get_current_user)]) -> StreamingResponse:
+    """
+    Streaming variant of the existing chats endpoint using Server-Sent Events.
 
-    # return last 20 prompts and responses to client (that's 40 messages)
-    last_messages = messages_collection.find({"chat_id": ObjectId(prompt.chat_id)}).sort("timestamp", 1).skip(should_have_summarised * 20)
+    Events:
+        token: {"content": "..."} for every chunk of the response as it arrives from the bot.
+        done: the last 20 prompts and responses (that's 40 messages), sent once the turn has been stored in DB.
+        error: {"detail": "..."} if the bot fails mid-stream, nothing is stored.
 
-    client_response = [
-        MessageModel(role=msg["role"], content=msg["content"]) for msg in last_messages
-    ]
+    If the client disconnects before the response completes, the upstream request is closed and nothing is stored.
+    """
+    # per-user rate and concurrency limits, 429 when over them; the slot is held until the stream ends
+    release = await admit(user_id)
 
-    if status:
-        return client_response
+    try:
+        turn = await prepare_chat_turn(prompt)
+        upstream = await open_rag_stream(turn.prompt_messages)
+    except BaseException:
+        await release()
+        raise
+
+    # idempotent, see stream_new_chat
+    async def cleanup():
+        await close_rag_stream(upstream)
+        await release()
+
+    async def events():
+        try:
+            chunks = []
+            try:
+                async for delta in iter_rag_stream(upstream):
+                    chunks.append(delta)
+                    yield format_sse("token", {"content": delta})
+            except httpx.HTTPError as e:
+                yield format_sse("error", {"detail": f"Upstream API error: {e}"})
+                return
+
+            response = MessageModel(role="assistant", content="".join(chunks))
+            # shielded so a disconnect right at the end can't interrupt the write
+            last_messages = await asyncio.shield(save_chat_turn(prompt, response, turn))
+
+            yield format_sse("done", last_messages or [])
+        finally:
+            await cleanup()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(cleanup)
+    )
 
 
 # ----------------------- DELETE CHAT -----------------------
@@ -288,10 +401,28 @@ async def delete_chat(chat_id: str, user_id: Annotated[str, Depends(get_current_
         HTTPException: If the chat is not found.
     """
     
-    chat_deletion = delete_chat_by_id(chat_id)
+    chat_deletion = await delete_chat_by_id(chat_id)
 
     if chat_deletion:
         return {"message": f"Chat with id {chat_id}, deleted successfully"}
 
     raise HTTPException(status_code=404, detail="Chat not found")
-    
+
+
+# ----------------------- DELETE ALL CHATS -----------------------
+@bizzbot.delete("/delete-all-chats")
+async def delete_all_chats(user_id: Annotated[str, Depends(get_current_user)]) -> dict[str, str]:
+    """
+    Delete all chats of the current user.
+
+    The chats disappear at once; their messages and summaries are removed in the background.
+
+    Args:
+        user_id (str): The ID of the user making the request.
+
+    Returns:
+        A dictionary with a single key "message" containing the number of chats deleted.
+    """
+    deleted = await delete_user_chats(user_id)
+
+    return {"message": f"{deleted} chats deleted successfully"}
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+from redis.exceptions import RedisError
+from auth.db_connection import get_redis_client, mark_redis_unavailable
+from config import SUMMARY_QUEUE_BACKEND, SUMMARY_WORKERS
+
+
+# Chat summaries are produced off the request path: the chat endpoints enqueue a chat id
+# and a worker started from the app lifespan writes the summary later.
+REDIS_QUEUE_KEY = "summary:queue"
+REDIS_PENDING_KEY = "summary:pending"
+REDIS_PENDING_TTL = 600  # a crashed worker can't block a chat's summaries for longer than this
+REDIS_POLL_INTERVAL = 0.5
+
+summary_queue: asyncio.Queue[tuple[str, float]] = asyncio.Queue()
+pending_chats: set[str] = set()
+workers: list[asyncio.Task] = []
+summary_job: Callable[[str], Awaitable[int]] | None = None
+
+stats = {
+    "enqueued": 0,
+    "completed": 0,
+    "failed": 0,
+    "summaries_written": 0,
+    "total_latency": 0.0,
+    "max_latency": 0.0,
+}
+
+
+# ----------------------- ENQUEUE -----------------------
+async def enqueue_summary(chat_id: str) -> bool:
+    """
+    Queue a chat for summarisation. A chat already waiting in the queue is not queued twice.
+
+    :return: True if the chat was queued, False if it was already pending.
+    """
+    job = (chat_id, time.time())
+
+    redis_client = get_redis_client() if SUMMARY_QUEUE_BACKEND == "redis" else None
+    if redis_client:
+        try:
+            if not await redis_client.set(f"{REDIS_PENDING_KEY}:{chat_id}", 1, nx=True, ex=REDIS_PENDING_TTL):
+                return False
+            await redis_client.lpush(REDIS_QUEUE_KEY, json.dumps(job))
+            stats["enqueued"] += 1
+            return True
+        except RedisError as e:
+            mark_redis_unavailable(e)
+
+    if chat_id in pending_chats:
+        return False
+
+    pending_chats.add(chat_id)
+    summary_queue.put_nowait(job)
+    stats["enqueued"] += 1
+    return True
+
+
+# ----------------------- WORKERS -----------------------
+async def _next_job() -> tuple[str, float, bool]:
+    """
+    Wait for the next job, preferring the Redis queue when it is enabled.
+
+    :return: (chat_id, enqueued_at, from_redis)
+    """
+    while True:
+        if not summary_queue.empty():
+            chat_id, enqueued_at = summary_queue.get_nowait()
+            return chat_id, enqueued_at, False
+
+        redis_client = get_redis_client() if SUMMARY_QUEUE_BACKEND == "redis" else None
+        if redis_client:
+            try:
+                raw = await redis_client.rpop(REDIS_QUEUE_KEY)
+            except RedisError as e:
+                mark_redis_unavailable(e)
+                raw = None
+
+            if raw:
+                chat_id, enqueued_at = json.loads(raw)
+                return chat_id, enqueued_at, True
+
+            try:
+                chat_id, enqueued_at = await asyncio.wait_for(summary_queue.get(), REDIS_POLL_INTERVAL)
+                return chat_id, enqueued_at, False
+            except TimeoutError:
+                continue
+
+        chat_id, enqueued_at = await summary_queue.get()
+        return chat_id, enqueued_at, False
+
+
+async def _release(chat_id: str, from_redis: bool) -> None:
+    if not from_redis:
+        pending_chats.discard(chat_id)
+        return
+
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            await redis_client.delete(f"{REDIS_PENDING_KEY}:{chat_id}")
+        except RedisError as e:
+            mark_redis_unavailable(e)
+
+
+async def _worker() -> None:
+    while True:
+        chat_id, enqueued_at, from_redis = await _next_job()
+        try:
+            stats["summaries_written"] += await summary_job(chat_id)
+            stats["completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"Summary job for chat {chat_id} failed: {e}")
+        finally:
+            # time from enqueue to done, i.e. how stale the summary the chat path sees can be
+            latency = time.time() - enqueued_at
+            stats["total_latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+            await _release(chat_id, from_redis)
+
+
+def start_summary_workers(job: Callable[[str], Awaitable[int]]) -> None:
+    """
+    Start the summary workers. `job` summarises one chat and returns the number of summaries written.
+    """
+    global summary_job
+
+    summary_job = job
+    for _ in range(SUMMARY_WORKERS):
+        workers.append(asyncio.create_task(_worker()))
+
+
+async def stop_summary_workers() -> None:
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    workers.clear()
+
+
+# ----------------------- METRICS -----------------------
+async def summary_queue_stats() -> dict[str, int | float]:
+    depth = summary_queue.qsize()
+
+    redis_client = get_redis_client() if SUMMARY_QUEUE_BACKEND == "redis" else None
+    if redis_client:
+        try:
+            depth += await redis_client.llen(REDIS_QUEUE_KEY)
+        except RedisError as e:
+            mark_redis_unavailable(e)
+
+    finished = stats["completed"] + stats["failed"]
+    return {
+        "depth": depth,
+        "enqueued": stats["enqueued"],
+        "completed": stats["completed"],
+        "failed": stats["failed"],
+        "summaries_written": stats["summaries_written"],
+        "avg_latency": round(stats["total_latency"] / finished, 3) if finished else 0.0,
+        "max_latency": round(stats["max_latency"], 3),
+    }
@@ -0,0 +1,132 @@
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Callable
+from redis.exceptions import RedisError
+from auth.db_connection import get_redis_client, mark_redis_unavailable
+
+
+class TTLCache:
+    """
+    In-process LRU cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    In-process TTLCache in front of Redis.
+
+    The local tier keeps a worker's hottest entries without a network hop, Redis
+    shares entries between workers. Values are stored in Redis as strings made by
+    `dumps` and turned back into objects with `loads`. When Redis is not
+    configured or unreachable the cache runs on the local tier alone.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int,
+        local_ttl: float,
+        redis_ttl: timedelta,
+        dumps: Callable[[Any], str],
+        loads: Callable[[str], Any],
+    ):
+        self.namespace = namespace
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Any | None:
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+
+        redis_client = get_redis_client()
+        if redis_client:
+            try:
+                raw = await redis_client.get(self._redis_key(key))
+            except RedisError as e:
+                mark_redis_unavailable(e)
+                raw = None
+
+            if raw is not None:
+                value = self.loads(raw)
+                self.local.set(key, value)
+                self.redis_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        self.local.set(key, value)
+
+        redis_client = get_redis_client()
+        if redis_client:
+            try:
+                await redis_client.set(self._redis_key(key), self.dumps(value), ex=self.redis_ttl)
+            except RedisError as e:
+                mark_redis_unavailable(e)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.local.delete(key)
+
+        redis_client = get_redis_client()
+        if redis_client and keys:
+            try:
+                await redis_client.delete(*[self._redis_key(key) for key in keys])
+            except RedisError as e:
+                mark_redis_unavailable(e)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "local_size": len(self.local),
+        }
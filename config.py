@@ -1,3 +1,4 @@
+import tempfile
 from datetime import timedelta
 from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -9,35 +10,140 @@ class Settings(BaseSettings):
     secret_key: str = ""
     algorithm: str = ""
     access_token_expire_minutes: int = 300
+    token_cache_max_size: int = 10000
+    stateless_auth: bool = False
+    revocation_sync_interval_seconds: float = 5.0
+    bcrypt_rounds: int = 12
+    password_hash_executor: str = "thread"  # "thread" or "process"
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64
     mongodb_connection_string: str = ""
+    mongo_transactions: bool = False
     redis_host: str = ""
     redis_port: int = 6379
     redis_password: str = ""
+    user_cache_max_size: int = 10000
+    user_cache_local_ttl_seconds: float = 30.0
     rag_api_url: str = ""
+    rag_timeout_seconds: float = 90.0
+    rag_connect_timeout_seconds: float = 5.0
+    rag_read_timeout_seconds: float = 60.0
+    rag_retry_attempts: int = 2
+    rag_retry_base_delay_seconds: float = 0.5
+    rag_retry_max_delay_seconds: float = 5.0
+    rag_hedge_percentile: float = 0.0
+    rag_breaker_failure_threshold: int = 5
+    rag_breaker_reset_seconds: float = 30.0
+    rag_max_in_flight: int = 32
+    rag_queue_timeout_seconds: float = 10.0
+    rag_max_connections: int = 100
+    rag_max_keepalive_connections: int = 20
+    rag_keepalive_expiry_seconds: float = 60.0
+    rag_http2: bool = False
+    rag_warmup_url: str = ""
+    rag_warmup_interval_seconds: float = 600.0
+    rag_cache_enabled: bool = True
+    rag_cache_max_size: int = 1000
+    rag_cache_multi_turn: bool = False
+    rag_coalesce_enabled: bool = True
+    user_max_concurrent_requests: int = 2
+    user_rate_limit_per_minute: float = 20.0
+    user_rate_limit_burst: int = 5
+    admission_queue_timeout_seconds: float = 5.0
+    summary_queue_backend: str = "memory"  # "memory" or "redis"
+    summary_workers: int = 1
+    chat_reaper_batch_size: int = 500
+    chat_reaper_batch_delay_seconds: float = 0.1
+    chat_reaper_interval_seconds: float = 60.0
+    metrics_dir: str = ""
+    metrics_write_interval_seconds: float = 5.0
+    server_timing: bool = True
+    timing_log: bool = False
+    profile_sample_interval_seconds: float = 0.005
+    profiles_kept: int = 20
 
     model_config = SettingsConfigDict(env_file=".env")
 
 @lru_cache
 def get_settings() -> Settings:
-    settings = Settings()
-    print(f"Loading settings for: {settings.env_name}")
-    print(f"BASE_URL: ", settings.base_url)
-    return settings
+    return Settings()
+
+
+# read once; the app prints which environment it loaded when it starts, see main.lifespan
+settings = get_settings()
 
 
 # --------------------------------------------- mongo connection string ---------------------------------------------
-mongodb_connection_string: str = get_settings().mongodb_connection_string
+mongodb_connection_string: str = settings.mongodb_connection_string
+MONGO_TRANSACTIONS = settings.mongo_transactions  # store each chat turn atomically, needs a replica set
 
 # --------------------------------------------- redis connection ---------------------------------------------
-REDIS_HOST = get_settings().redis_host
-REDIS_PORT = get_settings().redis_port
-REDIS_PASSWORD = get_settings().redis_password
+REDIS_HOST = settings.redis_host
+REDIS_PORT = settings.redis_port
+REDIS_PASSWORD = settings.redis_password
 REDIS_EXPIRE = timedelta(minutes=5)  # Cache expiration time
+USER_CACHE_MAX_SIZE = settings.user_cache_max_size
+USER_CACHE_LOCAL_TTL = settings.user_cache_local_ttl_seconds  # short, other workers' local tiers aren't invalidated
 
 # --------------------------------------------- jwt connection ---------------------------------------------
-SECRET_KEY = get_settings().secret_key
-ALGORITHM = get_settings().algorithm
-ACCESS_TOKEN_EXPIRE = get_settings().access_token_expire_minutes
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE = settings.access_token_expire_minutes
+TOKEN_CACHE_MAX_SIZE = settings.token_cache_max_size  # decoded tokens kept per worker
+STATELESS_AUTH = settings.stateless_auth  # trust signed id/is_active claims instead of looking the user up
+REVOCATION_SYNC_INTERVAL = settings.revocation_sync_interval_seconds  # how stale a worker's revocation set can be
+
+# --------------------------------------------- password hashing ---------------------------------------------
+BCRYPT_ROUNDS = settings.bcrypt_rounds  # changing this rehashes passwords on next login
+PASSWORD_HASH_EXECUTOR = settings.password_hash_executor
+PASSWORD_HASH_WORKERS = settings.password_hash_workers
+PASSWORD_HASH_MAX_PENDING = settings.password_hash_max_pending  # queued + running jobs before shedding with 503
 
 # --------------------------------------------- rag api connection ---------------------------------------------
-RAG_API_URL = get_settings().rag_api_url
\ No newline at end of file
+RAG_API_URL = settings.rag_api_url
+RAG_TIMEOUT = settings.rag_timeout_seconds  # total deadline for a call, retries and hedges included
+RAG_CONNECT_TIMEOUT = settings.rag_connect_timeout_seconds
+RAG_READ_TIMEOUT = settings.rag_read_timeout_seconds  # longest wait for the next bytes of a response
+RAG_RETRY_ATTEMPTS = settings.rag_retry_attempts  # retries after the first attempt, 0 disables retries
+RAG_RETRY_BASE_DELAY = settings.rag_retry_base_delay_seconds  # backoff doubles per retry, with full jitter
+RAG_RETRY_MAX_DELAY = settings.rag_retry_max_delay_seconds
+RAG_HEDGE_PERCENTILE = settings.rag_hedge_percentile  # e.g. 95: send a second request once the first is slower than p95, 0 disables
+RAG_BREAKER_FAILURE_THRESHOLD = settings.rag_breaker_failure_threshold  # consecutive failed calls that open the breaker, 0 disables
+RAG_BREAKER_RESET = settings.rag_breaker_reset_seconds  # how long the breaker stays open before a trial call
+RAG_MAX_IN_FLIGHT = settings.rag_max_in_flight  # RAG calls in flight per worker, more wait in a priority queue; 0 = no cap
+RAG_QUEUE_TIMEOUT = settings.rag_queue_timeout_seconds  # longest a call waits in the queue before it is shed
+RAG_MAX_CONNECTIONS = settings.rag_max_connections
+RAG_MAX_KEEPALIVE_CONNECTIONS = settings.rag_max_keepalive_connections
+RAG_KEEPALIVE_EXPIRY = settings.rag_keepalive_expiry_seconds
+RAG_HTTP2 = settings.rag_http2
+RAG_WARMUP_URL = settings.rag_warmup_url
+RAG_WARMUP_INTERVAL = settings.rag_warmup_interval_seconds  # 0 disables periodic warm-up
+RAG_CACHE_ENABLED = settings.rag_cache_enabled
+RAG_CACHE_MAX_SIZE = settings.rag_cache_max_size  # entries kept in each worker's local tier
+RAG_CACHE_MULTI_TURN = settings.rag_cache_multi_turn  # also cache prompts that carry chat history
+RAG_COALESCE_ENABLED = settings.rag_coalesce_enabled  # identical prompts in flight at once share one upstream call
+
+# --------------------------------------------- per-user admission ---------------------------------------------
+USER_MAX_CONCURRENT_REQUESTS = settings.user_max_concurrent_requests  # bot calls in flight per user, 0 = no limit
+USER_RATE_LIMIT_PER_MINUTE = settings.user_rate_limit_per_minute  # token bucket refill rate, 0 = no limit
+USER_RATE_LIMIT_BURST = settings.user_rate_limit_burst  # token bucket size
+ADMISSION_QUEUE_TIMEOUT = settings.admission_queue_timeout_seconds  # wait for a free slot before answering 429
+
+# --------------------------------------------- chat summaries ---------------------------------------------
+SUMMARY_QUEUE_BACKEND = settings.summary_queue_backend  # "redis" shares the queue between workers
+SUMMARY_WORKERS = settings.summary_workers
+
+# --------------------------------------------- chat deletion ---------------------------------------------
+CHAT_REAPER_BATCH_SIZE = settings.chat_reaper_batch_size  # messages or summaries deleted per batch
+CHAT_REAPER_BATCH_DELAY = settings.chat_reaper_batch_delay_seconds  # pause between batches, spreads write load
+CHAT_REAPER_INTERVAL = settings.chat_reaper_interval_seconds  # poll for deleted chats left by other workers
+
+# --------------------------------------------- metrics ---------------------------------------------
+METRICS_DIR = settings.metrics_dir or f"{tempfile.gettempdir()}/bizzbot-metrics"  # shared by the workers on a host
+METRICS_WRITE_INTERVAL = settings.metrics_write_interval_seconds  # how often each worker writes its snapshot
+
+# --------------------------------------------- request timing ---------------------------------------------
+SERVER_TIMING = settings.server_timing  # send each request's timing breakdown in a Server-Timing header
+TIMING_LOG = settings.timing_log  # also print it as one JSON line per request
+PROFILE_SAMPLE_INTERVAL = settings.profile_sample_interval_seconds  # stack sampling period of X-Profile requests
+PROFILES_KEPT = settings.profiles_kept  # slowest profiles kept per worker, see GET /profiles
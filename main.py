@@ -1,10 +1,185 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import settings, SERVER_TIMING
+from metrics import Counter, Histogram, exposition, register_stats, start_metrics_writer, stop_metrics_writer
+from timing import PROFILE_HEADER, RequestTiming, current_timing, finish_request, get_profiles
 from auth.auth import auth_route
 from bizzbot.router import bizzbot
+from bizzbot.dependencies import rag_cache, rag_flights, summarize_chat, topic_stats
+from bizzbot.summarizer import start_summary_workers, stop_summary_workers, summary_queue_stats
+from bizzbot.admission import admission_stats
+from bizzbot.reaper import start_chat_reaper, stop_chat_reaper, stats as reaper_stats
+from bizzbot.resilience import resilience_stats
+from bizzbot.governor import rag_governor
+from bizzbot.http_client import start_rag_client, close_rag_client
+from auth.db_connection import init_db, close_mongo_client, close_redis_client
+from auth.dependencies import get_current_admin, user_cache
+from auth.tokens import token_stats
+from auth.password_pool import shutdown_password_executor
+
+
+# ----------------------- STARTUP -----------------------
+# The server starts accepting connections straight away and the database bootstrap
+# (ping, collections, indexes) runs in the background; until it is done every route
+# except the ones below answers 503, see ReadinessMiddleware.
+UNGATED_PATHS = {"/", "/health", "/ready", "/metrics", "/docs", "/redoc", "/openapi.json"}
+BOOTSTRAP_RETRY_MAX = 30  # seconds between bootstrap attempts, at most
+
+started_at = time.monotonic()
+ready = False
+startup_stats = {"bootstrap_seconds": None, "bootstrap_attempts": 0}
+bootstrap_task: asyncio.Task | None = None
+
+
+async def bootstrap() -> None:
+    global ready
+
+    delay = 1
+    while True:
+        startup_stats["bootstrap_attempts"] += 1
+        try:
+            await init_db()
+            break
+        except Exception as e:
+            print(f"Database bootstrap failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, BOOTSTRAP_RETRY_MAX)
+
+    start_chat_reaper()
+    ready = True
+    startup_stats["bootstrap_seconds"] = round(time.monotonic() - started_at, 3)
+    print(f"Ready in {startup_stats['bootstrap_seconds']}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global bootstrap_task, ready
+
+    print(f"Loading settings for: {settings.env_name}")
+    print(f"BASE_URL: ", settings.base_url)
+
+    bootstrap_task = asyncio.create_task(bootstrap())
+    # shared, keep-alive pooled client for the RAG upstream
+    await start_rag_client()
+    start_summary_workers(summarize_chat)
+    start_metrics_writer()
+    yield
+    ready = False
+    bootstrap_task.cancel()
+    await asyncio.gather(bootstrap_task, return_exceptions=True)
+    await stop_metrics_writer()
+    await stop_chat_reaper()
+    await stop_summary_workers()
+    await close_rag_client()
+    shutdown_password_executor()
+    await close_redis_client()
+    await close_mongo_client()
+
+
+class ReadinessMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not ready and scope["path"] not in UNGATED_PATHS:
+            response = JSONResponse(
+                {"detail": "Service is starting, try again shortly"}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+# ----------------------- METRICS -----------------------
+http_request_seconds = Histogram(
+    "bizzbot_http_request_duration_seconds", "HTTP requests, until the last byte of the response", ("method", "route"))
+http_requests = Counter("bizzbot_http_requests_total", "HTTP responses by status", ("method", "route", "status"))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        status = 500  # unless a response is started
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the route's path template, so chat ids don't each get their own series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(time.monotonic() - started, method=scope["method"], route=route)
+            http_requests.inc(method=scope["method"], route=route, status=status)
+
+
+# ----------------------- REQUEST TIMING -----------------------
+class TimingMiddleware:
+    """
+    Collects the request's timing spans (see timing.py) and sends them in a Server-Timing
+    header. For streamed responses the header covers the time until the stream starts.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile_requested = any(
+            name == PROFILE_HEADER and value not in (b"", b"0", b"false") for name, value in scope["headers"])
+        timing = RequestTiming(profile_requested)
+        reset_token = current_timing.set(timing)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timing.reset(reset_token)
+            finish_request(timing, scope["method"], getattr(scope.get("route"), "path", "unmatched"), status)
+
+
+register_stats("user_cache", user_cache.stats)
+register_stats("token_cache", lambda: token_stats)
+register_stats("rag_cache", rag_cache.stats)
+register_stats("admission", admission_stats)
+register_stats("rag_upstream", resilience_stats)
+register_stats("rag_queue", rag_governor.queue_stats, label="priority")
+register_stats("rag_coalescing", rag_flights.stats)
+register_stats("summary_queue", summary_queue_stats)
+register_stats("topics", lambda: topic_stats)
+register_stats("chat_reaper", lambda: reaper_stats)
 
 
 app = FastAPI(
+        lifespan=lifespan,
         title="BizBot API",
         description="API for Business's FAQ's and Knowledge Base",
         version="1.0.0",
@@ -18,14 +193,23 @@ origins = [
     "http://127.0.0.1:3001"
 ]
 
+# added first so CORS headers are set on its 503s too
+app.add_middleware(ReadinessMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # pagination cursors, request timing
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "Server-Timing"],
 )
 
+# outermost, so the readiness 503s are counted too
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TimingMiddleware)
+
 app.include_router(auth_route)
 app.include_router(bizzbot)
 
@@ -47,11 +231,44 @@ async def home():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    if not ready:
+        return JSONResponse({"status": "starting", **startup_stats}, status_code=503, headers={"Retry-After": "1"})
+    return {"status": "ready", **startup_stats}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(await exposition(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/profiles")
+async def profiles(admin_id: Annotated[str, Depends(get_current_admin)]):
+    """
+    The slowest requests an admin profiled by sending an `X-Profile: 1` header, slowest first.
+    Each worker keeps its own, so this lists the ones of the worker answering.
+    """
+    return get_profiles()
+
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "ok",
-        "message": "API is healthy"
+        "message": "API is healthy",
+        "cache": {
+            "users": user_cache.stats(),
+            "tokens": token_stats,
+            "rag_responses": rag_cache.stats()
+        },
+        "admission": admission_stats(),
+        "rag_upstream": resilience_stats(),
+        "rag_queue": rag_governor.queue_stats(),
+        "rag_coalescing": rag_flights.stats(),
+        "summary_queue": await summary_queue_stats(),
+        "topics": topic_stats,
+        "chat_reaper": reaper_stats
     }
 
 
@@ -0,0 +1,304 @@
+import asyncio
+import fcntl
+import inspect
+import json
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator
+from config import METRICS_DIR, METRICS_WRITE_INTERVAL
+
+
+# Prometheus metrics, served in the text exposition format by GET /metrics.
+# Each worker keeps its own metrics and writes a snapshot of them to METRICS_DIR every
+# METRICS_WRITE_INTERVAL seconds. The worker answering a scrape merges the snapshots of
+# every live worker on the host: counters and histograms are summed, gauges get a
+# `worker` label. Snapshots not rewritten for STALE_AFTER seconds belong to workers that
+# are gone, as does the snapshot of a worker shutting down: their counters and histograms
+# are folded into the retired totals, so the merged series never go down (Prometheus would
+# take that for a counter reset), and their gauges are dropped.
+STALE_AFTER = 60
+WORKER = str(os.getpid())
+RETIRED = "retired"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+registry: list["Metric"] = []
+stats_sources: list[tuple[str, Callable[[], dict | Awaitable[dict]], str]] = []
+writer_task: asyncio.Task | None = None
+
+# (sample name, labels, value)
+Sample = tuple[str, dict[str, str], float]
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.append(self)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # per label set: [count per bucket, with +Inf last], sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> Iterator[Sample]:
+        for key, (counts, total) in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total[0]
+            yield f"{self.name}_count", labels, cumulative
+
+
+# ----------------------- STATS -----------------------
+def register_stats(group: str, source: Callable[[], dict | Awaitable[dict]], label: str = "key") -> None:
+    """
+    Export a stats dict, e.g. the one a module already reports on /health, as gauges named
+    bizzbot_<group>_<key>. Nested dicts become a `label` label on their values, strings a
+    `value` label on a gauge of 1, e.g. the circuit breaker's state.
+    """
+    stats_sources.append((group, source, label))
+
+
+def _stats_families(group: str, stats: dict, label: str) -> Iterator[tuple[str, str, str, list[Sample]]]:
+    samples: dict[str, list[Sample]] = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            for subkey, subvalue in value.items():
+                if isinstance(subvalue, (int, float)):
+                    name = f"bizzbot_{group}_{subkey}"
+                    samples.setdefault(name, []).append((name, {label: key}, subvalue))
+        elif isinstance(value, str):
+            name = f"bizzbot_{group}_{key}"
+            samples.setdefault(name, []).append((name, {"value": value}, 1))
+        elif isinstance(value, (int, float)):
+            name = f"bizzbot_{group}_{key}"
+            samples.setdefault(name, []).append((name, {}, value))
+
+    for name, family in samples.items():
+        yield name, "gauge", f"{group} stat, see /health", family
+
+
+# ----------------------- SNAPSHOTS -----------------------
+async def collect() -> list[tuple[str, str, str, list[Sample]]]:
+    """
+    This worker's metrics, as (name, type, help, samples) families.
+    """
+    families = [
+        (metric.name, metric.type, metric.documentation, list(metric.samples()))
+        for metric in registry
+    ]
+
+    for group, source, label in stats_sources:
+        stats = source()
+        if inspect.isawaitable(stats):
+            stats = await stats
+        families.extend(_stats_families(group, stats, label))
+
+    return families
+
+
+def _snapshot_path(worker: str) -> Path:
+    return Path(METRICS_DIR) / f"{worker}.json"
+
+
+async def write_snapshot() -> None:
+    snapshot = json.dumps({"worker": WORKER, "families": await collect()})
+
+    def write() -> None:
+        path = _snapshot_path(WORKER)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(snapshot)
+        tmp.replace(path)  # atomic, a scrape never reads a half-written snapshot
+
+    await asyncio.to_thread(write)
+
+
+def _retired_path() -> Path:
+    return Path(METRICS_DIR) / f"{RETIRED}.totals"
+
+
+def _retire(path: Path) -> None:
+    """
+    Fold the counters and histograms of a gone worker's snapshot into the retired totals
+    and remove the snapshot.
+    """
+    # renaming claims the snapshot, so only one worker folds it in
+    claimed = path.with_suffix(f".retiring-{WORKER}")
+    try:
+        path.rename(claimed)
+    except FileNotFoundError:
+        return
+
+    retired_path = _retired_path()
+    with open(retired_path.with_suffix(".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            snapshot = json.loads(claimed.read_text())
+            retired = {"worker": RETIRED, "families": []}
+            if retired_path.exists():
+                retired = json.loads(retired_path.read_text())
+            kept = [family for family in snapshot["families"] if family[1] != "gauge"]
+            retired["families"] = merge([retired, {"worker": RETIRED, "families": kept}])
+
+            tmp = retired_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(retired))
+            tmp.replace(retired_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Dropping metrics snapshot {path}: {e}")
+        finally:
+            claimed.unlink(missing_ok=True)
+
+
+def _read_snapshots() -> list[dict]:
+    snapshots = []
+    now = time.time()
+    for path in [*Path(METRICS_DIR).glob("*.json"), _retired_path()]:
+        try:
+            if path.suffix == ".json" and now - path.stat().st_mtime > STALE_AFTER:
+                _retire(path)
+                continue
+            snapshots.append(json.loads(path.read_text()))
+        except FileNotFoundError:
+            pass  # retired by another worker meanwhile, or nothing retired yet
+        except (OSError, ValueError) as e:
+            print(f"Skipping metrics snapshot {path}: {e}")
+    return snapshots
+
+
+def merge(snapshots: list[dict]) -> list[tuple[str, str, str, list[Sample]]]:
+    families: dict[str, tuple[str, str, dict[tuple, Sample]]] = {}
+
+    for snapshot in snapshots:
+        for name, kind, documentation, samples in snapshot["families"]:
+            merged = families.setdefault(name, (kind, documentation, {}))[2]
+            for sample_name, labels, value in samples:
+                if kind == "gauge":
+                    labels = {**labels, "worker": snapshot["worker"]}
+                key = (sample_name, tuple(sorted(labels.items())))
+                previous = merged.get(key)
+                merged[key] = (sample_name, labels, value + (previous[2] if previous else 0))
+
+    return [(name, kind, documentation, list(merged.values())) for name, (kind, documentation, merged) in families.items()]
+
+
+# ----------------------- EXPOSITION -----------------------
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(families: list[tuple[str, str, str, list[Sample]]]) -> str:
+    lines = []
+    for name, kind, documentation, samples in families:
+        lines.append(f"# HELP {name} {_escape(documentation)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+async def exposition() -> str:
+    """
+    The metrics of every live worker on this host, in the Prometheus text format.
+    """
+    try:
+        await write_snapshot()
+        snapshots = await asyncio.to_thread(_read_snapshots)
+    except OSError as e:
+        print(f"Error sharing metrics between workers, serving this worker's only: {e}")
+        snapshots = [{"worker": WORKER, "families": await collect()}]
+    return render(merge(snapshots))
+
+
+# ----------------------- WRITER -----------------------
+async def _writer() -> None:
+    while True:
+        await asyncio.sleep(METRICS_WRITE_INTERVAL)
+        try:
+            await write_snapshot()
+        except OSError as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+
+def start_metrics_writer() -> None:
+    global writer_task
+
+    writer_task = asyncio.create_task(_writer())
+
+
+async def stop_metrics_writer() -> None:
+    if writer_task:
+        writer_task.cancel()
+        await asyncio.gather(writer_task, return_exceptions=True)
+    try:
+        # hand this worker's totals, up to its last request, over to the retired totals
+        await write_snapshot()
+        await asyncio.to_thread(_retire, _snapshot_path(WORKER))
+    except OSError as e:
+        print(f"Error retiring metrics snapshot: {e}")
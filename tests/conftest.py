@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+# the settings are read on import; no database, Redis or RAG API is needed to import the app
+os.environ.setdefault("MONGODB_CONNECTION_STRING", "mongodb://127.0.0.1:27017/?serverSelectionTimeoutMS=500")
+os.environ.setdefault("RAG_API_URL", "http://rag.test/chat")
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="bizzbot-metrics-"))
+os.environ["REDIS_HOST"] = ""
+os.environ.setdefault("SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import PyMongoError
+
+TEST_DATABASE = "vit_test"
+mongo_unreachable: str | None = None  # why, once the first test found out
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """
+    The app without its lifespan (no database bootstrap or RAG client), marked ready.
+    """
+    import main
+
+    monkeypatch.setattr(main, "ready", True)
+    yield main.app
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def login(app):
+    """
+    Sign every request in as the given user id.
+    """
+    from auth.dependencies import get_current_user
+
+    def login_as(user_id: str) -> None:
+        app.dependency_overrides[get_current_user] = lambda: user_id
+
+    return login_as
+
+
+@pytest.fixture
+def client(app):
+    return TestClient(app, raise_server_exceptions=False)
+
+
+@pytest.fixture
+async def mongo(monkeypatch):
+    """
+    An empty test database with the app's indexes, on the MongoDB the connection string
+    names. Tests using it are skipped when no MongoDB is reachable.
+    """
+    from auth import db_connection
+    from auth.indexes import reconcile_indexes
+
+    global mongo_unreachable
+    if mongo_unreachable:
+        pytest.skip(mongo_unreachable)
+
+    monkeypatch.setattr(db_connection, "client", None)
+    monkeypatch.setattr(db_connection, "DATABASE_NAME", TEST_DATABASE)
+    client = db_connection.get_client()
+    try:
+        await client.admin.command("ping")
+        await client.drop_database(TEST_DATABASE)
+        await reconcile_indexes(db_connection.get_database())
+    except PyMongoError as e:
+        await db_connection.close_mongo_client()
+        mongo_unreachable = f"no MongoDB reachable: {e}"
+        pytest.skip(mongo_unreachable)
+
+    yield db_connection.get_database()
+
+    await client.drop_database(TEST_DATABASE)
+    await db_connection.close_mongo_client()
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+import pytest
+from bizzbot import admission, router
+
+
+@pytest.fixture
+def failing_stream(monkeypatch):
+    """
+    /stream whose turn fails to save after the answer was streamed.
+    """
+    async def prepare_chat_turn(prompt):
+        return SimpleNamespace(prompt_messages=[])
+
+    async def open_rag_stream(prompt):
+        return object()
+
+    async def iter_rag_stream(response):
+        yield "Hello"
+
+    async def close_rag_stream(response):
+        pass
+
+    async def save_chat_turn(prompt, response, turn):
+        raise RuntimeError("write failed")
+
+    for name, stub in locals().items():
+        if name != "monkeypatch":
+            monkeypatch.setattr(router, name, stub)
+
+
+def test_failed_stream_gives_the_slot_back(client, login, failing_stream):
+    login("stream-user")
+
+    for _ in range(admission.USER_MAX_CONCURRENT_REQUESTS + 1):
+        response = client.post("/api/v1/bizzbot/stream", json={"chat_id": "c1", "role": "user", "content": "hi"})
+        assert response.status_code == 200
+
+    assert "stream-user" not in admission.local_inflight
+
+
+@pytest.mark.anyio
+async def test_release_is_idempotent():
+    release = await admission.admit("twice-user")
+    await release()
+    await release()
+
+    assert "twice-user" not in admission.local_inflight
+
+
+class ExpiringRedis:
+    """
+    The in-flight counter commands on a dict, with expire() standing in for the TTL running out.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    async def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def decr(self, key):
+        self.values[key] = self.values.get(key, 0) - 1
+        return self.values[key]
+
+    async def eval(self, script, numkeys, key, *args):
+        assert script == admission.RELEASE_SCRIPT
+        if self.values.get(key, 0) <= 0:
+            return 0
+        return await self.decr(key)
+
+
+@pytest.mark.anyio
+async def test_release_after_the_slot_expired_does_not_go_negative(monkeypatch):
+    redis_client = ExpiringRedis()
+    monkeypatch.setattr(admission, "get_redis_client", lambda: redis_client)
+    key = f"{admission.REDIS_INFLIGHT_KEY}:slow-user"
+
+    release = await admission._try_acquire("slow-user")
+    del redis_client.values[key]  # the call outlived INFLIGHT_TTL
+    await release()
+
+    assert key not in redis_client.values
+    for _ in range(admission.USER_MAX_CONCURRENT_REQUESTS):
+        assert await admission._try_acquire("slow-user")
+    assert await admission._try_acquire("slow-user") is None
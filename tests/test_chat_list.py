@@ -0,0 +1,100 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+import httpx
+import pytest
+from bson import ObjectId
+from bizzbot import dependencies
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, limit):
+        # limit(0) is no limit in MongoDB
+        self.rows = self.rows[:limit] if limit else self.rows
+        return self
+
+    async def to_list(self):
+        return self.rows
+
+    async def __aiter__(self):
+        for row in await self.to_list():
+            yield row
+
+
+class FakeChats:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def find(self, query, projection=None):
+        return FakeCursor(list(self.rows))
+
+
+def test_page_size_must_be_positive(client, login):
+    login("000000000000000000000001")
+
+    response = client.get("/api/v1/bizzbot/my-chats", params={"page_size": -1})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.anyio
+async def test_a_page_without_rows_has_no_next_cursor(monkeypatch):
+    monkeypatch.setattr(dependencies, "chats_collection", FakeChats([]))
+
+    rows, next_cursor = await dependencies.get_user_chats_page("000000000000000000000001", limit=-1)
+
+    assert (rows, next_cursor) == ([], None)
+
+
+class SlowChats(FakeChats):
+    """
+    Answers like the database would after `delay` seconds, counting the queries in flight.
+    """
+
+    def __init__(self, rows, delay):
+        super().__init__(rows)
+        self.delay = delay
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def find(self, query, projection=None):
+        chats = self
+
+        class SlowCursor(FakeCursor):
+            async def to_list(self):
+                chats.in_flight += 1
+                chats.most_in_flight = max(chats.most_in_flight, chats.in_flight)
+                try:
+                    await asyncio.sleep(chats.delay)
+                    return self.rows
+                finally:
+                    chats.in_flight -= 1
+
+        return SlowCursor(list(self.rows))
+
+
+@pytest.mark.anyio
+async def test_parallel_chat_lists_overlap(app, login, monkeypatch):
+    requests, delay = 10, 0.2
+    now = datetime.now(timezone.utc)
+    row = {"_id": ObjectId(), "user_id": ObjectId(), "topic": "Tax", "created_at": now, "last_updated": now}
+    chats = SlowChats([row], delay)
+    monkeypatch.setattr(dependencies, "chats_collection", chats)
+    login("000000000000000000000001")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/api/v1/bizzbot/my-chats") for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    assert all(response.status_code == 200 for response in responses)
+    # one after another they would take requests * delay
+    assert chats.most_in_flight == requests
+    assert elapsed < requests * delay / 2
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from bizzbot import dependencies, router
+
+CHAT_ID = str(ObjectId())
+
+
+class FakeChats:
+    def __init__(self, chat: dict | None):
+        self.chat = chat
+
+    async def find_one(self, query, projection=None):
+        return self.chat
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("chat, state", [
+    (None, None),
+    ({"_id": ObjectId(CHAT_ID), "message_seq": 4}, "live"),
+    ({"_id": ObjectId(CHAT_ID)}, "backfilled"),
+])
+async def test_chat_state(monkeypatch, chat, state):
+    backfilled = []
+
+    async def backfill_chat_seq(chat_id):
+        backfilled.append(chat_id)
+        return 0
+
+    monkeypatch.setattr(dependencies, "chats_collection", FakeChats(chat))
+    monkeypatch.setattr(dependencies, "backfill_chat_seq", backfill_chat_seq)
+
+    assert await dependencies.get_chat_state(CHAT_ID) == state
+    assert bool(backfilled) == (state == "backfilled")
+
+
+def test_legacy_chat_messages_are_read_after_the_backfill(client, login, monkeypatch):
+    login("reader")
+    numbered = False
+    row = {"summary": None, "role": "user", "content": "hi"}
+
+    async def get_chat_state(chat_id):
+        nonlocal numbered
+        await asyncio.sleep(0)  # the page read runs first
+        numbered = True
+        return "backfilled"
+
+    async def fetch_chat_message_rows(chat_id, after_seq=0, limit=0):
+        # nothing has a seq until the backfill ran
+        return [row] if numbered else []
+
+    monkeypatch.setattr(router, "get_chat_state", get_chat_state)
+    monkeypatch.setattr(router, "fetch_chat_message_rows", fetch_chat_message_rows)
+
+    response = client.get(f"/api/v1/bizzbot/my-chats/messagess/{CHAT_ID}")
+
+    assert response.status_code == 200
+    assert response.json() == [row]
+
+
+@pytest.mark.parametrize("params", [
+    {"page_size": 0},
+    {"page_size": -1, "direction": "newer"},
+    {"page_size": 10_000},
+    {"page_number": 0},
+])
+def test_message_paging_must_be_bounded(client, login, params):
+    login("reader")
+
+    response = client.get(f"/api/v1/bizzbot/my-chats/messagess/{CHAT_ID}", params=params)
+
+    assert response.status_code == 422
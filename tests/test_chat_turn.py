@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+import pytest
+from bson import ObjectId
+from bizzbot import dependencies
+from bizzbot.models import Chats, Summaries
+from bizzbot.schemas import ClientChat
+
+CHAT_ID = str(ObjectId())
+
+
+def chat(message_seq: int) -> Chats:
+    now = datetime.now(timezone.utc)
+    return Chats(
+        _id=ObjectId(CHAT_ID), user_id=ObjectId(), topic="Tax", message_seq=message_seq,
+        created_at=now, last_updated=now
+    )
+
+
+def summary(to_msg: int) -> Summaries:
+    return Summaries(
+        _id=ObjectId(), chat_id=ObjectId(CHAT_ID), summary="so far", from_msg=1, to_msg=to_msg,
+        created_at=datetime.now(timezone.utc)
+    )
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("last_summary, message_seq, raw_seqs", [
+    (None, 10, range(1, 11)),
+    (summary(40), 50, range(41, 51)),
+    # the summary worker is behind: 20 messages at most, plus the incomplete window
+    (None, 90, range(61, 91)),
+    (summary(20), 100, range(81, 101)),
+])
+async def test_raw_history_is_capped_while_the_summary_lags(monkeypatch, last_summary, message_seq, raw_seqs):
+    # everything since the last summary, as an older window query would return it
+    after = last_summary.to_msg if last_summary else 0
+    window = [
+        {"seq": seq, "role": "user", "content": str(seq)} for seq in range(after + 1, message_seq + 1)
+    ]
+
+    async def load_chat_turn(chat_id):
+        return chat(message_seq), last_summary, window
+
+    async def enqueue_summary(chat_id):
+        pass
+
+    monkeypatch.setattr(dependencies, "load_chat_turn", load_chat_turn)
+    monkeypatch.setattr(dependencies, "enqueue_summary", enqueue_summary)
+
+    turn = await dependencies.prepare_chat_turn(ClientChat(chat_id=CHAT_ID, role="user", content="next"))
+
+    assert [message.content for message in turn.prompt_messages[:-1]] == [str(seq) for seq in raw_seqs]
+    assert turn.prompt_messages[-1].content == "next"
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+import pytest
+from bson import ObjectId
+from bizzbot import dependencies
+from bizzbot.schemas import ClientChat, MessageModel
+from timing import RequestTiming, current_timing
+
+pytestmark = pytest.mark.anyio
+
+
+async def make_chat(db, messages: int, summarised: int) -> str:
+    now = datetime.now(timezone.utc)
+    chat_id = ObjectId()
+    await db.chats.insert_one({
+        "_id": chat_id, "user_id": ObjectId(), "topic": "Tax", "total_conversations": messages // 2,
+        "summarised_messages": summarised, "message_seq": messages, "created_at": now, "last_updated": now,
+    })
+    await db.messages.insert_many([
+        {"chat_id": chat_id, "seq": seq, "role": "user" if seq % 2 else "assistant", "content": str(seq), "timestamp": now}
+        for seq in range(1, messages + 1)
+    ])
+    if summarised:
+        await db.summaries.insert_one({
+            "chat_id": chat_id, "summary": "so far", "from_msg": 1, "to_msg": summarised, "created_at": now,
+        })
+    return str(chat_id)
+
+
+async def test_a_chat_turn_takes_three_round_trips(mongo, monkeypatch):
+    monkeypatch.setattr(dependencies, "MONGO_TRANSACTIONS", False)
+    chat_id = await make_chat(mongo, messages=45, summarised=40)
+    prompt = ClientChat(chat_id=chat_id, role="user", content="next")
+
+    # the CommandMetrics listener adds every command to the request's "mongo" span
+    timing = RequestTiming()
+    token = current_timing.set(timing)
+    try:
+        turn = await dependencies.prepare_chat_turn(prompt)
+        stored = await dependencies.save_chat_turn(prompt, MessageModel(role="assistant", content="answer"), turn)
+    finally:
+        current_timing.reset(token)
+
+    # load the turn in one aggregate, then find_one_and_update and insert_many
+    assert timing.spans["mongo"][1] == 3
+    assert [message.content for message in turn.prompt_messages] == ["41", "42", "43", "44", "45", "next"]
+    assert stored[-1]["content"] == "answer"
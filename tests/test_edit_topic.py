@@ -0,0 +1,26 @@
+import pytest
+from bson import ObjectId
+from bizzbot import dependencies
+
+
+@pytest.mark.anyio
+async def test_editing_a_deleted_chat_finds_nothing(monkeypatch):
+    async def get_chat_by_id(chat_id):
+        return None  # tombstoned chats are hidden
+
+    monkeypatch.setattr(dependencies, "get_chat_by_id", get_chat_by_id)
+
+    assert await dependencies.edit_chat_topic(str(ObjectId()), "New topic") is False
+
+
+def test_editing_a_deleted_chat_is_a_404(client, login, monkeypatch):
+    login("editor")
+
+    async def get_chat_by_id(chat_id):
+        return None
+
+    monkeypatch.setattr(dependencies, "get_chat_by_id", get_chat_by_id)
+
+    response = client.put("/api/v1/bizzbot/edit-topic", params={"chat_id": str(ObjectId()), "topic": "New topic"})
+
+    assert response.status_code == 404
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from bizzbot import governor, resilience
+from bizzbot.governor import Governor, Priority, ShedError
+from bizzbot.resilience import LatencyWindow
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def no_latency_history(monkeypatch):
+    monkeypatch.setattr(resilience, "rag_latency", LatencyWindow(resilience.LATENCY_WINDOW))
+
+
+async def queue(gate: Governor, priority: Priority, granted: list[Priority]) -> None:
+    async with gate.slot(priority):
+        granted.append(priority)
+
+
+async def test_waiting_calls_are_granted_by_priority_then_arrival():
+    gate = Governor(limit=1)
+    granted = []
+    await gate.acquire(Priority.INTERACTIVE)
+
+    waiting = [
+        asyncio.create_task(queue(gate, priority, granted))
+        for priority in (Priority.SUMMARY, Priority.TOPIC, Priority.INTERACTIVE, Priority.TOPIC)
+    ]
+    await asyncio.sleep(0)
+    assert gate.queue_stats()["waiting"] == 4
+
+    gate.release()
+    await asyncio.gather(*waiting)
+
+    assert granted == [Priority.INTERACTIVE, Priority.TOPIC, Priority.TOPIC, Priority.SUMMARY]
+    assert gate.in_flight == 0
+
+
+async def test_calls_waiting_too_long_are_shed(monkeypatch):
+    monkeypatch.setattr(governor, "RAG_QUEUE_TIMEOUT", 0.05)
+    gate = Governor(limit=1)
+    await gate.acquire(Priority.INTERACTIVE)
+
+    with pytest.raises(ShedError):
+        await gate.acquire(Priority.SUMMARY)
+
+    assert gate.stats["summary"]["shed"] == 1
+    assert gate.queue_stats()["waiting"] == 0
+    gate.release()
+    assert gate.in_flight == 0
+
+
+async def test_queue_time_counts_against_the_deadline(monkeypatch):
+    monkeypatch.setattr(governor, "RAG_TIMEOUT", 1.0)
+    gate = Governor(limit=1)
+    assert await gate.acquire(Priority.INTERACTIVE) == 1.0
+
+    waiting = asyncio.create_task(gate.acquire(Priority.INTERACTIVE))
+    await asyncio.sleep(0.2)
+    gate.release()
+    remaining = await waiting
+
+    assert 0.5 < remaining <= 0.8
+
+
+async def test_calls_without_time_for_a_typical_call_are_shed(monkeypatch):
+    monkeypatch.setattr(governor, "RAG_TIMEOUT", 0.5)
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        resilience.rag_latency.add(0.4)  # median call: 0.4s
+    gate = Governor(limit=1)
+    await gate.acquire(Priority.INTERACTIVE)
+
+    waiting = asyncio.create_task(gate.acquire(Priority.TOPIC))
+    await asyncio.sleep(0.2)  # 0.3s of the deadline left
+    gate.release()
+
+    with pytest.raises(ShedError):
+        await waiting
+    assert gate.stats["topic"]["shed"] == 1
+    assert gate.in_flight == 0
+
+
+async def test_cancelled_waiters_give_up_their_place():
+    gate = Governor(limit=1)
+    granted = []
+    await gate.acquire(Priority.INTERACTIVE)
+
+    cancelled = asyncio.create_task(queue(gate, Priority.INTERACTIVE, granted))
+    waiting = asyncio.create_task(queue(gate, Priority.SUMMARY, granted))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+
+    gate.release()
+    await waiting
+
+    assert granted == [Priority.SUMMARY]
+    assert gate.in_flight == 0
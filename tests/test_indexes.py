@@ -0,0 +1,126 @@
+from datetime import datetime, timezone
+import pytest
+from bson import ObjectId
+from bizzbot import dependencies
+
+pytestmark = pytest.mark.anyio
+
+NOT_DELETED = dependencies.NOT_DELETED
+NOW = datetime.now(timezone.utc)
+USER_ID = ObjectId()
+CHAT_ID = ObjectId()
+EMAIL = "ada@example.com"
+
+
+# every query shape of bizzbot.dependencies (which router.py reads through), the chat
+# reaper and the user lookups, as the command explain() gets; the one-off migration scan
+# for unnumbered chats is left out
+QUERY_SHAPES = {
+    "existing_topics": {"find": "chats", "filter": {"user_id": USER_ID, "topic": {"$in": ["Tax"]}, **NOT_DELETED}},
+    "get_user_chats": {
+        "find": "chats", "filter": {"user_id": USER_ID, "last_updated": {"$gt": NOW}, **NOT_DELETED},
+        "sort": {"last_updated": -1, "_id": -1},
+    },
+    "get_user_chats_page": {
+        "find": "chats",
+        "filter": {"user_id": USER_ID, **NOT_DELETED, "$or": [
+            {"last_updated": {"$lt": NOW}}, {"last_updated": NOW, "_id": {"$lt": CHAT_ID}}
+        ]},
+        "sort": {"last_updated": -1, "_id": -1}, "limit": 21,
+    },
+    "get_chat_by_id": {"find": "chats", "filter": {"_id": CHAT_ID, **NOT_DELETED}, "limit": 1},
+    "finish_chat_topic": {"update": "chats", "updates": [
+        {"q": {"_id": CHAT_ID, "topic": "New chat"}, "u": {"$set": {"topic": "Tax"}}}
+    ]},
+    "delete_user_chats": {"update": "chats", "updates": [
+        {"q": {"user_id": USER_ID, **NOT_DELETED}, "u": {"$set": {"deleted_at": NOW}}, "multi": True}
+    ]},
+    "insert_existing_chats": {
+        "findAndModify": "chats", "query": {"_id": CHAT_ID, **NOT_DELETED}, "update": {"$inc": {"message_seq": 2}},
+    },
+    "get_chat_message_rows": {
+        "find": "messages", "filter": {"chat_id": CHAT_ID, "seq": {"$gt": 0, "$lte": 20}}, "sort": {"seq": 1},
+    },
+    "get_chat_messages_page": {
+        "find": "messages", "filter": {"chat_id": CHAT_ID, "seq": {"$exists": True}}, "sort": {"seq": -1}, "limit": 41,
+    },
+    "backfill_chat_seq": {"find": "messages", "filter": {"chat_id": CHAT_ID}, "sort": {"timestamp": 1, "_id": 1}},
+    "get_last_summary": {"find": "summaries", "filter": {"chat_id": CHAT_ID}, "sort": {"created_at": -1}, "limit": 1},
+    "reaper_claim": {
+        "findAndModify": "chats",
+        "query": {"deleted_at": {"$exists": True}, "$or": [
+            {"reap_lease": {"$exists": False}}, {"reap_lease": {"$lt": NOW}}
+        ]},
+        "update": {"$set": {"reap_lease": NOW}},
+    },
+    "reaper_batch": {"find": "messages", "filter": {"chat_id": CHAT_ID}, "projection": {"_id": 1}, "limit": 500},
+    "get_user": {"find": "users", "filter": {"email": EMAIL}, "limit": 1},
+    "deactivate_user": {
+        "findAndModify": "users", "query": {"email": EMAIL, "is_active": {"$ne": False}},
+        "update": {"$set": {"is_active": False}},
+    },
+}
+
+
+def plan_stages(explained) -> list[str]:
+    # the stages of the winning plans, wherever explain() nests them
+    if isinstance(explained, dict):
+        found = [explained["stage"]] if isinstance(explained.get("stage"), str) else []
+        for key, value in explained.items():
+            if key != "rejectedPlans":
+                found.extend(plan_stages(value))
+        return found
+    if isinstance(explained, list):
+        return [stage for value in explained for stage in plan_stages(value)]
+    return []
+
+
+def uses_index(stage: str) -> bool:
+    return "IXSCAN" in stage or stage == "IDHACK" or stage.startswith("EXPRESS")
+
+
+async def seed(db) -> None:
+    await db.users.insert_one({"email": EMAIL, "is_active": True})
+    await db.chats.insert_one({
+        "_id": CHAT_ID, "user_id": USER_ID, "topic": "Tax", "message_seq": 2, "created_at": NOW, "last_updated": NOW,
+    })
+    await db.messages.insert_many([
+        {"chat_id": CHAT_ID, "seq": seq, "role": "user", "content": str(seq), "timestamp": NOW} for seq in (1, 2)
+    ])
+    await db.summaries.insert_one({"chat_id": CHAT_ID, "summary": "so far", "from_msg": 1, "to_msg": 2, "created_at": NOW})
+
+
+@pytest.mark.parametrize("name", QUERY_SHAPES)
+async def test_query_shape_uses_an_index(mongo, name):
+    await seed(mongo)
+
+    explained = await mongo.command({"explain": QUERY_SHAPES[name], "verbosity": "queryPlanner"})
+    stages = plan_stages(explained["queryPlanner"])
+
+    assert "COLLSCAN" not in stages, stages
+    assert any(uses_index(stage) for stage in stages), stages
+
+
+async def test_chat_turn_lookups_use_indexes(mongo, monkeypatch):
+    await seed(mongo)
+    pipelines = []
+
+    class Capture:
+        async def aggregate(self, pipeline):
+            pipelines.append(pipeline)
+            raise LookupError  # only the pipeline is wanted
+
+    monkeypatch.setattr(dependencies, "chats_collection", Capture())
+    with pytest.raises(LookupError):
+        await dependencies.load_chat_turn(str(CHAT_ID))
+
+    # executionStats runs the pipeline, so the lookups report the indexes they used
+    explained = await mongo.command({
+        "explain": {"aggregate": "chats", "pipeline": pipelines[0], "cursor": {}}, "verbosity": "executionStats",
+    })
+    lookups = {stage["$lookup"]["from"]: stage for stage in explained["stages"] if "$lookup" in stage}
+
+    assert "COLLSCAN" not in plan_stages(explained["stages"][0])
+    assert lookups["summaries"]["collectionScans"] == 0
+    assert lookups["messages"]["collectionScans"] == 0
+    assert "messages_chat_seq" in lookups["messages"]["indexesUsed"]
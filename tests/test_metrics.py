@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import time
+import metrics
+
+
+def snapshot(worker: str, requests: float, in_flight: float) -> dict:
+    return {"worker": worker, "families": [
+        ["bizzbot_requests_total", "counter", "Requests", [["bizzbot_requests_total", {"route": "/chat"}, requests]]],
+        ["bizzbot_request_duration_seconds", "histogram", "Latency", [
+            ["bizzbot_request_duration_seconds_bucket", {"le": "1"}, requests],
+            ["bizzbot_request_duration_seconds_count", {}, requests],
+        ]],
+        ["bizzbot_in_flight", "gauge", "In flight", [["bizzbot_in_flight", {}, in_flight]]],
+    ]}
+
+
+def write(path, content: dict, age: float = 0) -> None:
+    path.write_text(json.dumps(content))
+    if age:
+        stale = time.time() - age
+        os.utime(path, (stale, stale))
+
+
+def series(snapshots: list[dict]) -> dict[tuple, float]:
+    return {
+        (sample_name, tuple(sorted(labels.items()))): value
+        for _, _, _, samples in metrics.merge(snapshots) for sample_name, labels, value in samples
+    }
+
+
+def test_counters_of_gone_workers_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    write(tmp_path / "1.json", snapshot("1", requests=5, in_flight=2))
+    write(tmp_path / "2.json", snapshot("2", requests=7, in_flight=3))
+    before = series(metrics._read_snapshots())
+
+    # worker 2 is gone, worker 1 carries on
+    write(tmp_path / "1.json", snapshot("1", requests=6, in_flight=1))
+    write(tmp_path / "2.json", snapshot("2", requests=7, in_flight=3), age=metrics.STALE_AFTER + 1)
+    after = series(metrics._read_snapshots())
+
+    assert before[("bizzbot_requests_total", (("route", "/chat"),))] == 12
+    assert after[("bizzbot_requests_total", (("route", "/chat"),))] == 13
+    assert after[("bizzbot_request_duration_seconds_count", ())] == 13
+    assert after[("bizzbot_request_duration_seconds_bucket", (("le", "1"),))] == 13
+    # the gone worker's gauges are dropped
+    assert ("bizzbot_in_flight", (("worker", "2"),)) not in after
+    assert after[("bizzbot_in_flight", (("worker", "1"),))] == 1
+    assert not (tmp_path / "2.json").exists()
+
+    # folded in once, not again on the next scrape
+    assert series(metrics._read_snapshots()) == after
+
+
+def test_a_worker_shutting_down_hands_its_totals_over(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "registry", [])
+    monkeypatch.setattr(metrics, "stats_sources", [])
+    requests = metrics.Counter("bizzbot_requests_total", "Requests", ("route",))
+    requests.inc(4, route="/chat")
+    write(tmp_path / "1.json", snapshot("1", requests=5, in_flight=2))
+
+    asyncio.run(metrics.stop_metrics_writer())
+
+    assert not (tmp_path / f"{metrics.WORKER}.json").exists()
+    assert series(metrics._read_snapshots())[("bizzbot_requests_total", (("route", "/chat"),))] == 9
@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from bizzbot import router
+from bizzbot.schemas import ClientChat
+
+
+@pytest.mark.anyio
+async def test_disconnect_during_save_keeps_the_topic(monkeypatch):
+    """
+    A client that disconnects while the new chat is being stored must not cancel the
+    topic the stored chat is waiting for.
+    """
+    topic_task = asyncio.get_running_loop().create_future()
+    saving = asyncio.Event()
+    saved = asyncio.Event()
+
+    async def open_rag_stream(prompt):
+        return object()
+
+    async def iter_rag_stream(response):
+        yield "Hello"
+
+    async def close_rag_stream(response):
+        pass
+
+    async def save_new_chat(prompt, user_id, task, response_text):
+        saving.set()
+        await saved.wait()
+        return False, None
+
+    monkeypatch.setattr(router, "start_chat_topic", lambda prompt, user_id: topic_task)
+    monkeypatch.setattr(router, "open_rag_stream", open_rag_stream)
+    monkeypatch.setattr(router, "iter_rag_stream", iter_rag_stream)
+    monkeypatch.setattr(router, "close_rag_stream", close_rag_stream)
+    monkeypatch.setattr(router, "save_new_chat", save_new_chat)
+
+    response = await router.stream_new_chat(ClientChat(role="user", content="hi"), "topic-user")
+    events = response.body_iterator
+    await anext(events)
+
+    # the client goes away while the chat is being written
+    reading = asyncio.create_task(anext(events))
+    await saving.wait()
+    reading.cancel()
+    await asyncio.gather(reading, return_exceptions=True)
+    await response.background()
+
+    assert not topic_task.cancelled()
+
+    saved.set()
+    await asyncio.sleep(0)
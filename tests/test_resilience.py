@@ -0,0 +1,156 @@
+import asyncio
+import time
+import httpx
+import pytest
+from bizzbot import resilience
+from bizzbot.resilience import CircuitBreaker, CircuitOpenError, LatencyWindow, call_rag
+
+pytestmark = pytest.mark.anyio
+
+
+class FaultyUpstream:
+    """
+    Answers the i-th request with faults[i], the status to return or the seconds to wait
+    before a 200, and with 200 once the faults run out.
+    """
+
+    def __init__(self, *faults: int | float):
+        self.faults = list(faults)
+        self.requests = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        fault = self.faults[self.requests] if self.requests < len(self.faults) else 200
+        self.requests += 1
+        if isinstance(fault, float):
+            await asyncio.sleep(fault)
+            fault = 200
+        return httpx.Response(fault, json={"message": {"role": "assistant", "content": "answer"}})
+
+    def send(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        return lambda: client.post("http://rag.test/chat", json={})
+
+
+@pytest.fixture(autouse=True)
+def fresh_resilience(monkeypatch):
+    """
+    A closed breaker, no latency history, no hedging and retries without backoff.
+    """
+    monkeypatch.setattr(resilience, "stats", dict.fromkeys(resilience.stats, 0))
+    monkeypatch.setattr(resilience, "rag_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    monkeypatch.setattr(resilience, "rag_latency", LatencyWindow(resilience.LATENCY_WINDOW))
+    monkeypatch.setattr(resilience, "RAG_RETRY_ATTEMPTS", 2)
+    monkeypatch.setattr(resilience, "RAG_HEDGE_PERCENTILE", 0)
+    monkeypatch.setattr(resilience, "RAG_TIMEOUT", 5)
+    monkeypatch.setattr(resilience, "backoff_delay", lambda retry: 0)
+
+
+async def test_retries_recover_from_transient_errors():
+    upstream = FaultyUpstream(503, 502)
+
+    response = await call_rag(upstream.send())
+
+    assert response.status_code == 200
+    assert upstream.requests == 3
+    assert resilience.stats["retries"] == 2
+    assert resilience.rag_breaker.state == "closed"
+
+
+async def test_client_errors_are_not_retried():
+    upstream = FaultyUpstream(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await call_rag(upstream.send())
+
+    assert upstream.requests == 1
+    assert resilience.rag_breaker.state == "closed"
+
+
+async def test_server_errors_open_the_breaker_without_being_retried():
+    upstream = FaultyUpstream(500, 501)
+    send = upstream.send()
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await call_rag(send)
+
+    assert upstream.requests == 2
+    assert resilience.stats["retries"] == 0
+    assert resilience.rag_breaker.state == "open"
+
+
+async def test_breaker_opens_then_half_opens_then_closes(monkeypatch):
+    monkeypatch.setattr(resilience, "RAG_RETRY_ATTEMPTS", 0)
+    upstream = FaultyUpstream(503, 503)
+    send = upstream.send()
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await call_rag(send)
+    assert resilience.rag_breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        await call_rag(send)
+    assert upstream.requests == 2  # rejected without a request
+
+    await asyncio.sleep(0.2)
+    assert resilience.rag_breaker.state == "half_open"
+
+    response = await call_rag(send)
+
+    assert response.status_code == 200
+    assert resilience.rag_breaker.state == "closed"
+
+
+async def test_failed_trial_reopens_the_breaker(monkeypatch):
+    monkeypatch.setattr(resilience, "RAG_RETRY_ATTEMPTS", 0)
+    upstream = FaultyUpstream(503, 503, 503)
+    send = upstream.send()
+
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            await call_rag(send)
+    await asyncio.sleep(0.2)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await call_rag(send)
+
+    assert resilience.rag_breaker.state == "open"
+
+
+async def test_hedge_wins_over_a_slow_request(monkeypatch):
+    monkeypatch.setattr(resilience, "RAG_HEDGE_PERCENTILE", 95)
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        resilience.rag_latency.add(0.01)
+    upstream = FaultyUpstream(2.0)  # the first request stalls, the hedge answers at once
+
+    started = time.perf_counter()
+    response = await call_rag(upstream.send())
+
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 1
+    assert upstream.requests == 2
+    assert resilience.stats["hedge_wins"] == 1
+
+
+async def test_total_deadline_covers_every_attempt(monkeypatch):
+    monkeypatch.setattr(resilience, "RAG_TIMEOUT", 0.2)
+    upstream = FaultyUpstream(503, 503, 2.0)
+
+    started = time.perf_counter()
+    with pytest.raises(httpx.TimeoutException):
+        await call_rag(upstream.send())
+
+    assert time.perf_counter() - started < 1
+    assert upstream.requests == 3
+    assert resilience.stats["deadline_exceeded"] == 1
+
+
+async def test_the_deadline_can_be_shortened_by_the_caller():
+    upstream = FaultyUpstream(2.0)
+
+    started = time.perf_counter()
+    with pytest.raises(httpx.TimeoutException):
+        await call_rag(upstream.send(), hedge=False, timeout=0.1)
+
+    assert time.perf_counter() - started < 0.5
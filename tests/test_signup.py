@@ -0,0 +1,24 @@
+from pymongo.errors import DuplicateKeyError
+from auth import auth
+
+SIGNUP = {"full_name": "Ada", "email": "ada@example.com", "phone_number": "0700000000", "password": "secret"}
+
+
+def test_concurrent_sign_ups_with_one_email_are_rejected(client, monkeypatch):
+    async def get_user(email):
+        return None  # both requests pass the check before either is stored
+
+    async def hash_password(password):
+        return "hashed"
+
+    async def create_user(user):
+        raise DuplicateKeyError("E11000 duplicate key error index: users_email_unique")
+
+    monkeypatch.setattr(auth, "get_user", get_user)
+    monkeypatch.setattr(auth, "hash_password", hash_password)
+    monkeypatch.setattr(auth, "create_user", create_user)
+
+    response = client.post("/api/v1/auth/signup", json=SIGNUP)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "User already exists"
@@ -0,0 +1,39 @@
+import copy
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+from auth import db_connection
+
+ROOT = Path(__file__).parent.parent
+IMPORT_BUDGET = 3.0  # seconds, measured at about 0.75 s
+
+
+def test_the_app_imports_within_budget_without_a_database():
+    env = {
+        **os.environ,
+        "MONGODB_CONNECTION_STRING": "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100",
+        "REDIS_HOST": "",
+    }
+    # a fresh interpreter, as a cold start; the warm-up run fills the bytecode cache
+    script = "import main, auth.db_connection as db; assert db.client is None"
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True)
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < IMPORT_BUDGET, f"importing the app took {elapsed:.2f}s"
+
+
+def test_introspecting_a_collection_does_not_create_the_client(monkeypatch):
+    monkeypatch.setattr(db_connection, "client", None)
+
+    # mock's autospec and copy look up private and dunder attributes on the proxy
+    with patch.object(db_connection, "chats_collection", autospec=True):
+        pass
+    copy.copy(db_connection.messages_collection)
+
+    assert db_connection.client is None
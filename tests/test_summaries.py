@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from bizzbot import dependencies
+from bizzbot.schemas import MessageModel
+
+pytestmark = pytest.mark.anyio
+
+CHAT_ID = str(ObjectId())
+
+
+class FakeChats:
+    """
+    A chat's summary lease, as the conditional updates of summarize_chat see it.
+    """
+
+    def __init__(self):
+        self.lease: dict | None = None
+
+    async def update_one(self, query, update, upsert=False):
+        if "$set" in update and "summary_lease" in update["$set"]:
+            lease = update["$set"]["summary_lease"]
+            free = (
+                self.lease is None or self.lease["until"] < datetime.now(timezone.utc)
+                or self.lease["holder"] == lease["holder"]
+            )
+            if free:
+                self.lease = lease
+            return SimpleNamespace(matched_count=int(free))
+        if "$unset" in update and self.lease and self.lease["holder"] == query["summary_lease.holder"]:
+            self.lease = None
+        return SimpleNamespace(matched_count=1)
+
+
+class FakeSummaries:
+    def __init__(self):
+        self.windows: list[int] = []
+
+    async def insert_one(self, document):
+        # the unique (chat_id, from_msg) index
+        if document["from_msg"] in self.windows:
+            raise DuplicateKeyError("summaries_chat_window")
+        self.windows.append(document["from_msg"])
+
+
+@pytest.fixture
+def chat_of_45_messages(monkeypatch):
+    summaries = FakeSummaries()
+    rag_calls = []
+
+    async def get_chat_by_id(chat_id):
+        return SimpleNamespace(message_seq=45)
+
+    async def get_last_summary(chat_id):
+        return SimpleNamespace(to_msg=max(summaries.windows) + 19) if summaries.windows else None
+
+    async def get_chat_messages(chat_id, after_seq=0, to_seq=None):
+        return [MessageModel(role="user", content=str(seq)) for seq in range(after_seq + 1, to_seq + 1)]
+
+    async def query_rag_api(prompt, use_cache=True, priority=None):
+        rag_calls.append(prompt[0].content)
+        await asyncio.sleep(0.05)
+        return MessageModel(role="assistant", content="summary")
+
+    for name, stub in [
+        ("get_chat_by_id", get_chat_by_id), ("get_last_summary", get_last_summary),
+        ("get_chat_messages", get_chat_messages), ("query_rag_api", query_rag_api),
+        ("chats_collection", FakeChats()), ("summaries_collection", summaries),
+    ]:
+        monkeypatch.setattr(dependencies, name, stub)
+
+    return summaries, rag_calls
+
+
+async def test_two_workers_summarise_each_window_once(chat_of_45_messages):
+    summaries, rag_calls = chat_of_45_messages
+
+    written = await asyncio.gather(dependencies.summarize_chat(CHAT_ID), dependencies.summarize_chat(CHAT_ID))
+
+    assert sorted(written) == [0, 2]
+    assert summaries.windows == [1, 21]
+    assert rag_calls == ["1", "21"]
+    assert dependencies.chats_collection.lease is None
+
+
+async def test_a_window_written_meanwhile_is_not_stored_twice(chat_of_45_messages, monkeypatch):
+    summaries, rag_calls = chat_of_45_messages
+    summaries.windows.append(1)  # by a worker whose claim expired
+
+    async def get_last_summary(chat_id):
+        return None  # read before the other worker's summary was stored
+
+    monkeypatch.setattr(dependencies, "get_last_summary", get_last_summary)
+
+    assert await dependencies.summarize_chat(CHAT_ID) == 1
+    assert summaries.windows == [1, 21]
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+from auth import dependencies
+from auth.schemas import CachedUser, GetUserResponse
+
+
+@pytest.mark.anyio
+async def test_cached_users_have_no_password_hash(monkeypatch):
+    stored = {}
+
+    async def get_user(email):
+        return GetUserResponse(
+            id="u1", email=email, full_name="Ada", is_active=True, role="admin", hashed_password="$2b$12$secret")
+
+    async def set_(key, value):
+        stored[key] = dependencies.user_cache.dumps(value)
+
+    monkeypatch.setattr(dependencies, "get_user", get_user)
+    monkeypatch.setattr(dependencies.user_cache, "set", set_)
+
+    user = await dependencies.get_cached_user("ada@example.com")
+
+    assert (user.id, user.is_active, user.role) == ("u1", True, "admin")
+    assert "hashed_password" not in stored["ada@example.com"]
+    assert "$2b$" not in stored["ada@example.com"]
+
+
+@pytest.mark.anyio
+async def test_deactivated_users_are_rejected_after_the_lookup(monkeypatch):
+    async def get_cached_user(email):
+        return CachedUser(id="u1", email=email, is_active=False)
+
+    monkeypatch.setattr(dependencies, "get_cached_user", get_cached_user)
+    # a token without the is_active claim always goes through the lookup
+    token = dependencies.create_access_token({"sub": "ada", "email": "ada@example.com", "id": "u1"})
+
+    with pytest.raises(HTTPException) as error:
+        await dependencies.authenticate_token(token)
+
+    assert error.value.status_code == 401
@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import FrameType
+from typing import Any, Iterator
+from config import TIMING_LOG, PROFILE_SAMPLE_INTERVAL, PROFILES_KEPT
+
+
+# Where a request's time goes. Code on the request path wraps its phases in span(),
+# e.g. `with span("rag"):`, and the time is added to the request's RequestTiming, which
+# main.TimingMiddleware sends back in the Server-Timing header. Outside of a request,
+# e.g. in the summary worker, spans cost nothing and record nothing.
+#
+# An admin can also ask for a profile of a request by sending the PROFILE_HEADER: a thread
+# samples the request's stack every PROFILE_SAMPLE_INTERVAL, running or suspended, and the
+# PROFILES_KEPT slowest profiled requests are kept per worker, see GET /profiles.
+PROFILE_HEADER = b"x-profile"
+PROFILE_MAX_DEPTH = 64
+PROFILE_TOP_STACKS = 50
+
+
+class RequestTiming:
+    def __init__(self, profile_requested: bool = False):
+        self.started = time.perf_counter()
+        self.spans: dict[str, list[float]] = {}  # name -> [seconds, times]
+        self.profile_requested = profile_requested
+        self.profiler: "Sampler | None" = None
+
+    def add(self, name: str, seconds: float) -> None:
+        entry = self.spans.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """
+        The spans in the Server-Timing header format, durations in milliseconds.
+        """
+        entries = [
+            f"{name};dur={seconds * 1000:.1f}" + (f';desc="{int(times)}x"' if times > 1 else "")
+            for name, (seconds, times) in self.spans.items()
+        ]
+        entries.append(f"total;dur={self.elapsed * 1000:.1f}")
+        return ", ".join(entries)
+
+
+current_timing: ContextVar[RequestTiming | None] = ContextVar("current_timing", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    Add time measured elsewhere, e.g. by a driver event, to the current request.
+    """
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+# ----------------------- PROFILER -----------------------
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _running_stack(frame: FrameType | None) -> list[str]:
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return labels[::-1]
+
+
+def _suspended_stack(coro: Any) -> list[str]:
+    # follow the chain of awaits down to where the task is suspended
+    labels = []
+    while coro is not None and len(labels) < PROFILE_MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+class Sampler(threading.Thread):
+    """
+    Samples one task's stack until stopped. Samples taken while the task runs on the event
+    loop are "cpu", the others "wait" and show what the task is awaiting.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.task = task
+        self.loop = task.get_loop()
+        self.loop_thread = threading.get_ident()  # created on the event loop's thread
+        self.interval = interval
+        self.stacks: dict[str, int] = {}
+        self.cpu = 0
+        self.wait = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            if self.task.done():
+                break
+            try:
+                self._sample()
+            except Exception:
+                pass  # the stack changed under us, skip this sample
+
+    def _sample(self) -> None:
+        if asyncio.current_task(self.loop) is self.task:
+            self.cpu += 1
+            stack = ["cpu", *_running_stack(sys._current_frames().get(self.loop_thread))]
+        else:
+            self.wait += 1
+            stack = ["wait", *_suspended_stack(self.task.get_coro())]
+
+        # the "folded" format flame graph tools read
+        folded = ";".join(stack)
+        self.stacks[folded] = self.stacks.get(folded, 0) + 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+slowest_profiles: list[tuple[float, int, dict]] = []  # min-heap on duration
+profile_ids = itertools.count(1)
+
+
+def start_profiler() -> None:
+    """
+    Start profiling the current request if it asked for a profile. Called once the
+    caller is known to be an admin.
+    """
+    timing = current_timing.get()
+    if timing is None or not timing.profile_requested or timing.profiler is not None:
+        return
+
+    timing.profiler = Sampler(asyncio.current_task(), PROFILE_SAMPLE_INTERVAL)
+    timing.profiler.start()
+
+
+def _keep_profile(timing: RequestTiming, method: str, route: str, status: int, duration: float) -> None:
+    profiler = timing.profiler
+    profiler.stop()
+
+    profile = {
+        "id": next(profile_ids),
+        "method": method,
+        "route": route,
+        "status": status,
+        "duration": round(duration, 3),
+        "spans": {name: round(seconds, 4) for name, (seconds, _) in timing.spans.items()},
+        "samples": {"cpu": profiler.cpu, "wait": profiler.wait, "interval": profiler.interval},
+        "stacks": [
+            {"stack": stack, "samples": samples}
+            for stack, samples in sorted(profiler.stacks.items(), key=lambda item: -item[1])[:PROFILE_TOP_STACKS]
+        ],
+    }
+
+    entry = (duration, profile["id"], profile)
+    if len(slowest_profiles) < PROFILES_KEPT:
+        heapq.heappush(slowest_profiles, entry)
+    elif duration > slowest_profiles[0][0]:
+        heapq.heapreplace(slowest_profiles, entry)
+
+
+def get_profiles() -> list[dict]:
+    """
+    The slowest profiled requests this worker served, slowest first.
+    """
+    return [profile for _, _, profile in sorted(slowest_profiles, reverse=True)]
+
+
+# ----------------------- REQUEST END -----------------------
+def finish_request(timing: RequestTiming, method: str, route: str, status: int) -> None:
+    duration = timing.elapsed
+
+    if timing.profiler is not None:
+        _keep_profile(timing, method, route, status, duration)
+
+    if TIMING_LOG:
+        # one JSON line per request, for log pipelines to parse
+        print(json.dumps({
+            "event": "request_timing",
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 1),
+            "spans_ms": {name: round(seconds * 1000, 1) for name, (seconds, _) in timing.spans.items()},
+        }))